@@ -1,89 +1,134 @@
-from typing import Optional
-from datetime import datetime
-from fastapi import APIRouter, Depends, Request
+from typing import Optional, List, Tuple
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from fastapi.templating import Jinja2Templates
-import os
+from sqlalchemy import select, func, and_, case
+from starlette.concurrency import run_in_threadpool
 
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import get_db, AsyncSessionLocal
+from app.db.monitoreo import pool_stats
 from app.models.vehiculo import Trazabilidad, VehiculoEstudio
+from app.services.http_clients import get_provider_client, get_pool_stats
+from app.services.resilience import get_breaker_states, OPEN
+from app.services.quota_scheduler import get_queue_stats
+from app.services.negative_cache import negative_cache
+from app.services.pdf_renderer import renderer_pool
+from app.services.plantillas import render_async
+from app.services.trazabilidad_buffer import trazabilidad_buffer
+from app.services.archivo_trazabilidad import leer_archivados
 
 router = APIRouter()
 
-# Get absolute path for templates
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# Answered lookups: 304 is a conditional poll of a study the client already has
+ESTADOS_OK = (200, 304)
 
-@router.get("", response_class=HTMLResponse)
-async def get_dashboard_ui(
-    request: Request,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
-):
+
+def _inicio_ultimos_dias(dias: Optional[int]) -> Optional[datetime]:
+    # Start of a window of the last `dias` days; None (whole history) for 0/None.
+    # fecha_consulta is naive UTC.
+    if not dias or dias <= 0:
+        return None
+    hoy = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return hoy - timedelta(days=dias)
+
+
+def _rango_fechas(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    dias: Optional[int] = None
+) -> Tuple[Optional[datetime], Optional[datetime]]:
     """
-    Renders the operational dashboard UI with optional date filtering.
+    Range from start_date/end_date (YYYY-MM-DD); without start_date, the last
+    `dias` days when given, otherwise the whole history.
     """
-    
-    # Base filter list (empty by default)
-    filters = []
-    
-    # Process dates if provided
+    sd = ed = None
     if start_date:
         try:
             sd = datetime.strptime(start_date, "%Y-%m-%d")
-            filters.append(Trazabilidad.fecha_consulta >= sd)
         except ValueError:
             pass
-            
+    if sd is None:
+        sd = _inicio_ultimos_dias(dias)
     if end_date:
         try:
             # End of day
             ed = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            filters.append(Trazabilidad.fecha_consulta <= ed)
         except ValueError:
             pass
+    return sd, ed
+
+
+def _ventana(sd: Optional[datetime], ed: Optional[datetime], limite: Optional[int] = None) -> dict:
+    # Effective range (and row cap) echoed in JSON answers; null = unbounded
+    ventana = {"desde": sd.isoformat() if sd else None, "hasta": ed.isoformat() if ed else None}
+    if limite is not None:
+        ventana["limite"] = limite
+    return ventana
+
+
+def _limite(limite: Optional[int]) -> Optional[int]:
+    return limite if limite else None
+
+
+def _filtros_fecha(sd: Optional[datetime], ed: Optional[datetime]) -> List:
+    # Range on the leading column of ix_trazabilidad_fecha_proveedor_status
+    # (and partition pruning on Postgres)
+    filters = []
+    if sd is not None:
+        filters.append(Trazabilidad.fecha_consulta >= sd)
+    if ed is not None:
+        filters.append(Trazabilidad.fecha_consulta <= ed)
+    return filters
+
+
+@router.get("", response_class=HTMLResponse)
+async def get_dashboard_ui(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Renders the operational dashboard UI with optional date filtering. Without
+    a start date it covers the last DASHBOARD_DIAS_POR_DEFECTO days (shown in
+    the date filter) and lists at most DASHBOARD_MAX_FILAS recent rows.
+    """
+    
+    sd, ed = _rango_fechas(start_date, end_date, settings.DASHBOARD_DIAS_POR_DEFECTO)
+    filters = _filtros_fecha(sd, ed)
             
     # Combine filters into a single AND condition if they exist
     where_clause = and_(*filters) if filters else True
 
-    # 1. Total Queries
-    stmt_total = select(func.count(Trazabilidad.id)).where(where_clause)
-    total_consultas = await db.scalar(stmt_total) or 0
-    
-    # 2. Queries with External Calls (Billed by provider)
-    stmt_external = select(func.count(Trazabilidad.id)).where(
-        and_(where_clause, Trazabilidad.llamada_externa == True)
-    )
-    consultas_externas = await db.scalar(stmt_external) or 0
-    
+    def contar(condicion):
+        return func.coalesce(func.sum(case((condicion, 1), else_=0)), 0)
+
+    # 1-4. Totals, external calls (billed by provider), errors (non-200/304) and
+    # provider counts for the Doughnut Chart, in one pass over the range
+    stmt_metricas = select(
+        func.count(Trazabilidad.id),
+        contar(Trazabilidad.llamada_externa == True),
+        contar(Trazabilidad.status_code.not_in(ESTADOS_OK)),
+        contar(Trazabilidad.proveedor == "Vincario"),
+        contar(Trazabilidad.proveedor == "VinAudit"),
+    ).where(where_clause)
+    total_consultas, consultas_externas, total_errores, count_vincario, count_vinaudit = (
+        await db.execute(stmt_metricas)
+    ).one()
+
     # 3. Queries from Cache (Reused/Free)
     consultas_cache = total_consultas - consultas_externas
     
-    # 4. Total Errors (Non-200)
-    stmt_errors = select(func.count(Trazabilidad.id)).where(
-        and_(where_clause, Trazabilidad.status_code != 200)
-    )
-    total_errores = await db.scalar(stmt_errors) or 0
-    
-    # Provider counts for Doughnut Chart
-    stmt_vincario = select(func.count(Trazabilidad.id)).where(
-        and_(where_clause, Trazabilidad.proveedor == "Vincario")
-    )
-    stmt_vinaudit = select(func.count(Trazabilidad.id)).where(
-        and_(where_clause, Trazabilidad.proveedor == "VinAudit")
-    )
-    count_vincario = await db.scalar(stmt_vincario) or 0
-    count_vinaudit = await db.scalar(stmt_vinaudit) or 0
-    
-    # 5. Recent Logs (All logs with joined VehiculoEstudio for PDF url)
+    # 5. Recent Logs (newest DASHBOARD_MAX_FILAS, with joined VehiculoEstudio for PDF url)
     stmt_logs = (
         select(Trazabilidad, VehiculoEstudio.url_pdf)
         .outerjoin(VehiculoEstudio, Trazabilidad.identificacion == VehiculoEstudio.identificacion)
         .where(where_clause)
         .order_by(Trazabilidad.fecha_consulta.desc())
+        .limit(_limite(settings.DASHBOARD_MAX_FILAS))
     )
     result_logs = await db.execute(stmt_logs)
     
@@ -103,10 +148,10 @@ async def get_dashboard_ui(
             "usuario": tz.usuario
         })
 
-    return templates.TemplateResponse(
+    # Shared (precompiled) template environment, rendered without blocking the loop
+    html = await render_async(
         "dashboard.html",
         {
-            "request": request,
             "metrics": {
                 "total": total_consultas,
                 "externas": consultas_externas,
@@ -116,60 +161,70 @@ async def get_dashboard_ui(
                 "vinaudit": count_vinaudit
             },
             "logs": recent_logs,
-            "current_start": start_date or "",
-            "current_end": end_date or ""
+            "current_start": sd.strftime("%Y-%m-%d") if sd else "",
+            "current_end": end_date or "",
+            "max_filas": settings.DASHBOARD_MAX_FILAS
         }
     )
+    return HTMLResponse(html)
 
 @router.get("/metrics")
-async def get_metrics_json(db: AsyncSession = Depends(get_db)):
+async def get_metrics_json(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    dias: Optional[int] = Query(None, ge=0, description="Solo los últimos N días (por defecto: todo el historial)"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Returns metrics as JSON for potential charting or external tracking.
+    Provider counts cover the whole history unless a range (start_date/end_date
+    or dias) is given; "ventana" reports the range used.
     """
-    # Simply reusing basic counts for now
-    stmt_vincario = select(func.count(Trazabilidad.id)).where(Trazabilidad.proveedor == "Vincario")
-    stmt_vinaudit = select(func.count(Trazabilidad.id)).where(Trazabilidad.proveedor == "VinAudit")
-    
-    vincario_calls = await db.scalar(stmt_vincario) or 0
-    vinaudit_calls = await db.scalar(stmt_vinaudit) or 0
+    sd, ed = _rango_fechas(start_date, end_date, dias)
+    stmt_providers = (
+        select(Trazabilidad.proveedor, func.count(Trazabilidad.id))
+        .where(and_(*_filtros_fecha(sd, ed), Trazabilidad.proveedor.in_(("Vincario", "VinAudit"))))
+        .group_by(Trazabilidad.proveedor)
+    )
+    por_proveedor = dict((await db.execute(stmt_providers)).all())
+    vincario_calls = por_proveedor.get("Vincario", 0)
+    vinaudit_calls = por_proveedor.get("VinAudit", 0)
 
     return {
         "providers": {
             "Vincario": vincario_calls,
             "VinAudit": vinaudit_calls
-        }
+        },
+        "ventana": _ventana(sd, ed),
+        "http_pools": get_pool_stats(),
+        "provider_queues": get_queue_stats(),
+        "negative_cache": negative_cache.stats(),
+        "pdf_renderer": renderer_pool.stats(),
+        "trazabilidad_buffer": trazabilidad_buffer.stats(),
+        "db_pool": pool_stats()
     }
 
 @router.get("/errors")
 async def get_dashboard_errors(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    dias: Optional[int] = Query(None, ge=0, description="Solo los últimos N días (por defecto: todo el historial)"),
+    limite: Optional[int] = Query(None, ge=0, description="Máximo de errores, los más recientes (por defecto: todos)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Returns a JSON list of detailed error logs (status != 200)
-    used to feed the SLAs dashboard modal dynamically.
+    Returns a JSON list of detailed error logs (status other than 200/304)
+    used to feed the SLAs dashboard modal dynamically. Every matching error
+    unless a range or limite is given; "ventana" reports the range and cap used.
     """
-    filters = [Trazabilidad.status_code != 200]
-    
-    if start_date:
-        try:
-            sd = datetime.strptime(start_date, "%Y-%m-%d")
-            filters.append(Trazabilidad.fecha_consulta >= sd)
-        except ValueError:
-            pass
-            
-    if end_date:
-        try:
-            ed = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            filters.append(Trazabilidad.fecha_consulta <= ed)
-        except ValueError:
-            pass
+    sd, ed = _rango_fechas(start_date, end_date, dias)
+    filters = [Trazabilidad.status_code.not_in(ESTADOS_OK), *_filtros_fecha(sd, ed)]
             
     stmt = (
         select(Trazabilidad)
         .where(and_(*filters))
         .order_by(Trazabilidad.fecha_consulta.desc())
+        .limit(_limite(limite))
     )
     result = await db.execute(stmt)
     errors = result.scalars().all()
@@ -187,84 +242,90 @@ async def get_dashboard_errors(
             "usuario": error.usuario
         })
         
-    return {"errors": error_list}
+    return {"errors": error_list, "ventana": _ventana(sd, ed, _limite(limite))}
     
 @router.get("/export")
 async def export_dashboard_csv(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    end_date: Optional[str] = None
 ):
     """
-    Exports the main Traceability table to a CSV file.
+    Exports the main Traceability table to a CSV file, streamed row batch by
+    row batch: first the rows still in the database, then the archived months
+    (app.jobs.archivar_trazabilidad) in the same range.
     """
     import io
     import csv
     from fastapi.responses import StreamingResponse
     
-    filters = []
-    
-    if start_date:
-        try:
-            sd = datetime.strptime(start_date, "%Y-%m-%d")
-            filters.append(Trazabilidad.fecha_consulta >= sd)
-        except ValueError:
-            pass
-            
-    if end_date:
-        try:
-            ed = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            filters.append(Trazabilidad.fecha_consulta <= ed)
-        except ValueError:
-            pass
-            
+    sd, ed = _rango_fechas(start_date, end_date)
+    filters = _filtros_fecha(sd, ed)
     where_clause = and_(*filters) if filters else True
+    tabla = Trazabilidad.__table__
 
     stmt = (
-        select(Trazabilidad)
+        select(tabla)
         .where(where_clause)
-        .order_by(Trazabilidad.fecha_consulta.desc())
+        .order_by(tabla.c.fecha_consulta.desc())
+        .execution_options(yield_per=1000)
     )
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
-
-    # Create an in-memory string buffer
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-
-    # Write headers
-    writer.writerow([
-        "Fecha UTC", 
-        "Criterio_Busqueda", 
-        "Origen_Datos", 
-        "Llamada_Externa", 
-        "Codigo_Http", 
-        "Usuario_B2B", 
-        "IP_Origen", 
-        "Endpoint", 
-        "Mensaje_Error"
-    ])
-
-    for log in logs:
-        fecha_str = log.fecha_consulta.strftime("%d/%m/%Y %H:%M:%S") if log.fecha_consulta else ""
+
+    def fila_csv(log) -> list:
+        fecha = log["fecha_consulta"]
+        return [
+            fecha.strftime("%d/%m/%Y %H:%M:%S") if fecha else "",
+            log["identificacion"] or "",
+            log["proveedor"] or "DATABASE",
+            "SI" if log["llamada_externa"] else "NO",
+            log["status_code"],
+            log["usuario"] or "N/A",
+            log["ip_origen"] or "N/A",
+            log["endpoint"] or "",
+            log["mensaje_error"] or ""
+        ]
+
+    async def stream():
+        # One small buffer reused per batch instead of the whole file in memory
+        output = io.StringIO()
+        writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+
+        def drenar() -> str:
+            datos = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            return datos
+
+        # Write headers
         writer.writerow([
-            fecha_str,
-            log.identificacion or "",
-            log.proveedor or "DATABASE",
-            "SI" if log.llamada_externa else "NO",
-            log.status_code,
-            log.usuario or "N/A",
-            log.ip_origen or "N/A",
-            log.endpoint or "",
-            log.mensaje_error or ""
+            "Fecha UTC", 
+            "Criterio_Busqueda", 
+            "Origen_Datos", 
+            "Llamada_Externa", 
+            "Codigo_Http", 
+            "Usuario_B2B", 
+            "IP_Origen", 
+            "Endpoint", 
+            "Mensaje_Error"
         ])
+        yield drenar()
+
+        # Own session: the request's one is not meant to outlive the handler
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt)
+            async for logs in result.mappings().partitions():
+                writer.writerows(fila_csv(log) for log in logs)
+                yield drenar()
 
-    output.seek(0)
+        # Archive files are read off the event loop, 1000 rows per hop
+        archivados = leer_archivados(sd, ed)
+        while logs := await run_in_threadpool(lambda: list(islice(archivados, 1000))):
+            writer.writerows(fila_csv(log) for log in logs)
+            yield drenar()
     
     filename = f"trazabilidad_racsa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        stream(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -275,7 +336,6 @@ async def get_system_health(db: AsyncSession = Depends(get_db)):
     Checks the status of the Database and External Providers.
     Returns: green (All Good), orange (Slow/Down Providers), red (DB Error).
     """
-    import httpx
     import asyncio
     
     status = "green"
@@ -287,23 +347,25 @@ async def get_system_health(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         return {"color": "red", "message": "Sistema Caído (BD)"}
         
-    # 2. Check Providers (Concurrent Pings)
-    vinaudit_url = "https://api.vinaudit.com"
-    vincario_url = "https://api.vincario.com"
-    
-    async def ping(url):
+    # 2. Check Providers (Concurrent Pings over the shared provider pools)
+    async def ping(provider):
         try:
-            async with httpx.AsyncClient(timeout=3.0) as client:
-                resp = await client.get(url)
-                # We just care that it responded, even a 403 or 401 is "up"
-                return True
+            client = get_provider_client(provider)
+            resp = await client.get("/", timeout=3.0)
+            # We just care that it responded, even a 403 or 401 is "up"
+            return True
         except:
             return False
 
-    results = await asyncio.gather(ping(vinaudit_url), ping(vincario_url))
+    results = await asyncio.gather(ping("VinAudit"), ping("Vincario"))
+    breakers = get_breaker_states()
     
     if not all(results):
         status = "orange"
         message = "Proveedores Lentos"
+
+    if any(b["state"] == OPEN for b in breakers.values()):
+        status = "orange"
+        message = "Proveedor Fuera de Servicio (Circuit Breaker Abierto)"
         
-    return {"color": status, "message": message}
+    return {"color": status, "message": message, "breakers": breakers}
@@ -1,16 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Any
+from sqlalchemy.orm import defer
+from typing import Any, Optional, Tuple, Union
+import asyncio
+import base64
 import datetime
+from urllib.parse import quote
+from loguru import logger
 
+from app.core.config import settings
 from app.db.session import get_db
-from app.models.vehiculo import VehiculoEstudio, Trazabilidad
-from app.schemas.vehiculo import EstudioBaseResponse, EstudioCompletoResponse, PdfInfo
+from app.models.vehiculo import VehiculoEstudio, EstudioJob
+from app.schemas.vehiculo import (
+    EstudioBaseResponse,
+    EstudioCompletoResponse,
+    PdfInfo,
+    EstudioLoteRequest,
+    EstudioLoteItem,
+    ExportacionPdfRequest,
+    EstudioJobRequest,
+    EstudioJobResponse,
+    EstudioProblemasItem,
+    EstudioProblemasResponse
+)
 from app.api.v1.endpoints.auth import verify_token
-from app.services.provider_client import orchestrate_vin_search
-from app.services.normalizer import normalize_provider_data
+from app.services.estudio_service import obtener_estudio_externo
+from app.services.quota_scheduler import Prioridad
+from app.services.job_worker import job_pool, nuevo_job_id, validar_webhook_url
 from app.core.limiter import limiter
+from app.core.exceptions import LookupInternalError, ProviderError, error_de_consulta
+from app.services.vin_validator import canonicalizar, preparar_identificacion
+from app.services.estudio_serializer import (
+    con_pdf, cuerpo_estudio, parsear_campos, pide, proyectar_estudio, TODOS_LOS_CAMPOS
+)
+from app.services.pdf_renderer import RenderSaturadoError, RenderTimeoutError
+from app.services.pdf_storage import almacen_pdf
+from app.services.trazabilidad_buffer import trazabilidad_buffer
+from app.services.exportacion_pdf import ExportacionZip, seleccionar_estudios
+from app.services.cache_http import cabeceras_cache, etag_estudio, no_modificado
+from app.services.problemas_bitmask import BITS_PROBLEMAS, detalle_con_problemas, mascara, nombres_activos
 
 router = APIRouter()
 
@@ -18,6 +48,7 @@ router = APIRouter()
 @limiter.limit("20/minute")
 async def check_estudio_existencia(
     request: Request,
+    response: Response,
     tipoIdentificacion: str = Query(..., description="VIN, CHASIS, SERIE"),
     identificacion: str = Query(..., description="El valor del VIN/chasis/número de serie"),
     db: AsyncSession = Depends(get_db),
@@ -25,29 +56,39 @@ async def check_estudio_existencia(
 ) -> Any:
     """
     Verify if a vehicle study exists internally without making external calls.
+    Existing studies carry ETag/Last-Modified and answer conditional polls with 304.
     """
     if tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="tipoIdentificacion must be VIN, CHASIS, or SERIE"
         )
-        
+
+    identificacion = canonicalizar(tipoIdentificacion, identificacion)
     stmt = select(VehiculoEstudio).where(VehiculoEstudio.identificacion == identificacion)
     result = await db.execute(stmt)
     estudio = result.scalar_one_or_none()
+
+    cabeceras = None
+    status_code = 200
+    if estudio:
+        cabeceras = cabeceras_cache(etag_estudio(estudio, "existencia"), estudio.ultima_fecha_estudio)
+        if no_modificado(request, cabeceras["ETag"], estudio.ultima_fecha_estudio):
+            status_code = 304
     
-    # Log the Traceability
-    trazabilidad = Trazabilidad(
+    # Log the Traceability (written behind, in batches)
+    await trazabilidad_buffer.registrar(
         identificacion=identificacion,
         endpoint="/api/v1/vehiculos/estudios/existencia",
-        status_code=200,
+        status_code=status_code,
         llamada_externa=False,
         proveedor="Cache" if estudio else None,
         ip_origen=request.client.host if request.client else None,
         usuario=token_data.get("sub")
     )
-    db.add(trazabilidad)
-    await db.commit()
+
+    if status_code == 304:
+        return Response(status_code=304, headers=cabeceras)
     
     if not estudio:
         # User requested 200 OK even if false for this specific endpoint
@@ -57,7 +98,8 @@ async def check_estudio_existencia(
             tieneEstudios=False,
             ultimaFechaEstudio=None
         )
-        
+
+    response.headers.update(cabeceras)
     return EstudioBaseResponse(
         tipoIdentificacion=estudio.tipo_identificacion,
         identificacion=estudio.identificacion,
@@ -65,118 +107,169 @@ async def check_estudio_existencia(
         ultimaFechaEstudio=estudio.ultima_fecha_estudio
     )
 
+@router.get("/problemas", response_model=EstudioProblemasResponse)
+@limiter.limit("20/minute")
+async def get_estudios_por_problemas(
+    request: Request,
+    flags: str = Query(
+        ...,
+        description="Campos de ComprobacionProblemas separados por coma, ej. registroDeDanosPorInundacion,registroDeSalvamentoRobado"
+    ),
+    modo: str = Query("alguno", pattern="^(alguno|todos)$", description="alguno: cualquiera de los flags; todos: todos"),
+    limite: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    Stored studies carrying the given problem flags, answered from the indexed
+    problemas_bitmask column with one bitwise AND (no JSON scanning).
+    """
+    nombres = [f.strip() for f in flags.split(",") if f.strip()]
+    desconocidos = [f for f in nombres if f not in BITS_PROBLEMAS]
+    if not nombres or desconocidos:
+        raise HTTPException(status_code=400, detail=f"Flags desconocidos: {', '.join(desconocidos) or flags}")
+    mask = mascara(nombres)
+
+    coincidencia = VehiculoEstudio.problemas_bitmask.op("&")(mask)
+    stmt = (
+        select(VehiculoEstudio.tipo_identificacion, VehiculoEstudio.identificacion, VehiculoEstudio.problemas_bitmask)
+        .where(coincidencia == mask if modo == "todos" else coincidencia != 0)
+        .order_by(VehiculoEstudio.id)
+        .limit(limite)
+    )
+    result = await db.execute(stmt)
+    return EstudioProblemasResponse(
+        mascara=mask,
+        modo=modo,
+        estudios=[
+            EstudioProblemasItem(
+                tipoIdentificacion=tipo,
+                identificacion=identificacion,
+                problemasBitmask=bits,
+                problemas=nombres_activos(bits)
+            )
+            for tipo, identificacion, bits in result.all()
+        ]
+    )
+
 @router.get("", response_model=EstudioCompletoResponse)
 @limiter.limit("10/minute")
 async def get_estudio_completo(
     request: Request,
     tipoIdentificacion: str = Query(..., description="VIN, CHASIS, SERIE"),
     identificacion: str = Query(..., description="El valor del VIN/chasis/número de serie"),
+    campos: Optional[str] = Query(
+        None,
+        description="Proyección, ej. especificaciones,detalle.registrosDeTitulos,pdf.hash (por defecto: todo)"
+    ),
+    problemas: str = Query(
+        "objeto",
+        pattern="^(objeto|bitmask)$",
+        description="bitmask: comprobacionDeProblemas solo viaja como el entero problemasBitmask"
+    ),
+    pdfInline: bool = Query(
+        False,
+        description="true: incluye el PDF en base64 en pdf.content (por defecto solo enlace, hash y tamaño)"
+    ),
     db: AsyncSession = Depends(get_db),
     token_data: dict = Depends(verify_token)
 ) -> Any:
     """
     Get full vehicle study. Fetches from DB cache or reaches out to external provider.
+    With campos= only the listed fields are returned, and the PDF is only rendered
+    (and the detail column only loaded) when the response needs them.
+    The PDF travels as a download link (pdf.url) unless pdfInline=true or
+    campos=pdf.content asks for the base64 content.
+    Cached studies honour If-None-Match/If-Modified-Since: a 304 skips the PDF
+    and the encoding (the lookup is still logged to Trazabilidad).
     """
     if tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
         raise HTTPException(status_code=400, detail="tipoIdentificacion must be VIN, CHASIS, or SERIE")
 
+    proyeccion = None
+    if campos:
+        try:
+            proyeccion = parsear_campos(campos)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    problemas_compactos = problemas == "bitmask"
+    if problemas_compactos and proyeccion is None:
+        proyeccion = TODOS_LOS_CAMPOS
+    quiere_pdf = pide(proyeccion, "pdf")
+    pdf_contenido = pdfInline or bool(proyeccion and proyeccion.get("pdf") and "content" in proyeccion["pdf"])
+
+    try:
+        identificacion = preparar_identificacion(tipoIdentificacion, identificacion)
+    except ProviderError as e:
+        raise await _fallo_consulta(request, token_data, identificacion, e)
+
     # 1. Check Internal Database
     stmt = select(VehiculoEstudio).where(VehiculoEstudio.identificacion == identificacion)
+    if proyeccion is not None:
+        # Projected answers are encoded from the columns; skip what they do not use
+        diferidas = [VehiculoEstudio.respuesta_serializada]
+        if not quiere_pdf and not pide(proyeccion, "detalleEstudio"):
+            diferidas.append(VehiculoEstudio.detalle_estudio)
+        if not quiere_pdf and not pide(proyeccion, "especificacionesVehiculo"):
+            diferidas.append(VehiculoEstudio.especificaciones_vehiculo)
+        stmt = stmt.options(*[defer(columna) for columna in diferidas])
     result = await db.execute(stmt)
     estudio_db = result.scalar_one_or_none()
 
     if_llamada_externa = False
     proveedor_usado = "Cache"
+    # Each (campos, problemas) combination is its own representation
+    variante = f"{campos or ''}|{problemas}|{pdf_contenido}"
 
-    if not estudio_db:
-        # 2. Not found locally, call External Provider
-        if_llamada_externa = True
-        try:
-            raw_data, proveedor_usado = await orchestrate_vin_search(identificacion)
-            
-            # Normalize Response
-            meta, detalle, es_sin_registros = normalize_provider_data(proveedor_usado, raw_data)
-            
-            # Create Database Record
-            now_utc = datetime.datetime.now(datetime.timezone.utc)
-            estudio_db = VehiculoEstudio(
-                tipo_identificacion=tipoIdentificacion,
+    if estudio_db:
+        cabeceras = cabeceras_cache(etag_estudio(estudio_db, variante), estudio_db.ultima_fecha_estudio)
+        if no_modificado(request, cabeceras["ETag"], estudio_db.ultima_fecha_estudio):
+            await trazabilidad_buffer.registrar(
                 identificacion=identificacion,
-                tiene_estudios=True,
-                es_estudio_sin_registros=es_sin_registros,
-                especificaciones_vehiculo=meta.model_dump(),
-                detalle_estudio=detalle.model_dump(),
-                url_pdf="local://blob_storage/" + identificacion + ".pdf",
-                pdf_hash="sha256:dummyhash123", 
-                pdf_size_bytes=0, # Updated after real generation
-                ultima_fecha_estudio=now_utc,
-                ya_facturado_previamente=True
-            )
-            db.add(estudio_db)
-            # Commit to ensure it's saved for future requests
-            await db.commit()
-            await db.refresh(estudio_db)
-
-        except Exception as e:
-            # Failed to fetch from external provider
-            trazabilidad = Trazabilidad(
-                identificacion=identificacion, endpoint="/api/v1/vehiculos/estudios",
-                status_code=502, llamada_externa=True, proveedor=proveedor_usado, mensaje_error=str(e),
+                endpoint="/api/v1/vehiculos/estudios",
+                status_code=304,
+                llamada_externa=False,
+                proveedor=proveedor_usado,
                 ip_origen=request.client.host if request.client else None,
                 usuario=token_data.get("sub")
             )
-            db.add(trazabilidad)
-            await db.commit()
-            raise HTTPException(status_code=502, detail={
-                "codigo": "ERROR_PROVEEDOR",
-                "mensaje": "Error en integracion con proveedor",
-                "detalle": str(e),
-                "correlationId": "TBD"
-            })
+            return Response(status_code=304, headers=cabeceras)
     else:
-        # If loaded from DB, extract meta, detalle, es_sin_registros for PDF generation
-        meta = estudio_db.especificaciones_vehiculo
-        detalle = estudio_db.detalle_estudio
-        es_sin_registros = estudio_db.es_estudio_sin_registros
-
-    # Generate real PDF using the new service
-    from app.services.pdf_generator import generate_racsa_pdf
-    import base64
-    
-    try:
-        # Generate the PDF file on disk
-        pdf_path, pdf_hash, pdf_size = await generate_racsa_pdf(
-            vin=identificacion,
-            meta=meta,
-            detalle=detalle,
-            es_sin_registros=es_sin_registros
-        )
-        
-        # S3 MOCK / Base64 Output
-        # In a real environment, we'd upload 'pdf_path' to S3 and return a URL.
-        # Here we encode the PDF in Base64 (or return a generic string to save space)
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-        
-        # Don't return full raw PDF in JSON due to size, just a placeholder or small Base64 head
-        # For Racsa we return the base64.
-        mock_base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-        
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
-        pdf_hash = "sha256:ERROR"
-        pdf_size = 0
-        mock_base64_pdf = "JVBERi0xLjQKJ_ERROR_GENERATING_PDF..."
+        # 2. Not found locally, call External Provider (once per VIN, shared by concurrent callers).
+        # Hand the pooled connection back first: followers may wait seconds on the
+        # leader, which needs a connection of its own to save the study.
+        await db.rollback()
+        try:
+            estudio_db, if_llamada_externa, proveedor_usado = await obtener_estudio_externo(
+                tipoIdentificacion, identificacion
+            )
+        except Exception as e:
+            # Failed to fetch from external provider. Nothing is saved, so the next request retries.
+            raise await _fallo_consulta(request, token_data, identificacion, e)
 
-    pdf_info = PdfInfo(
-        content=mock_base64_pdf,
-        tamañoBytes=pdf_size,
-        hash=pdf_hash,
-        fechaGeneracion=datetime.datetime.now(datetime.timezone.utc),
-        yaFacturadoPreviamente=estudio_db.ya_facturado_previamente if if_llamada_externa else True
-    )
+    pdf_info = None
+    if quiere_pdf:
+        try:
+            pdf_info = await _generar_pdf_info(
+                db,
+                estudio_db,
+                ya_facturado=estudio_db.ya_facturado_previamente if if_llamada_externa else True,
+                con_contenido=pdf_contenido
+            )
+        except Exception as e:
+            # The study is saved, so a retry only needs the PDF. Never a 200 with a
+            # placeholder PDF: its ETag comes from the study and would pin it in caches.
+            raise await _pdf_no_disponible(request, token_data, identificacion, if_llamada_externa, proveedor_usado, e)
 
-    trazabilidad = Trazabilidad(
+    # After the PDF step: a first render records pdf_hash, which is part of the ETag
+    cabeceras = cabeceras_cache(etag_estudio(estudio_db, variante), estudio_db.ultima_fecha_estudio)
+    # Pre-serialized study body + this request's PDF info; no response_model
+    # validation/encoding on the way out
+    if proyeccion is None:
+        cuerpo = con_pdf(cuerpo_estudio(estudio_db), pdf_info)
+    else:
+        cuerpo = proyectar_estudio(estudio_db, proyeccion, pdf_info, problemas_compactos)
+    await trazabilidad_buffer.registrar(
         identificacion=identificacion,
         endpoint="/api/v1/vehiculos/estudios",
         status_code=200,
@@ -185,9 +278,175 @@ async def get_estudio_completo(
         ip_origen=request.client.host if request.client else None,
         usuario=token_data.get("sub")
     )
-    db.add(trazabilidad)
+    # Persists a first PDF render or a lazily serialized body; nothing to write otherwise
     await db.commit()
 
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+
+@router.api_route("/{identificacion}/pdf", methods=["GET", "HEAD"], response_class=FileResponse)
+@limiter.limit("30/minute")
+async def get_estudio_pdf(
+    request: Request,
+    identificacion: str,
+    tipoIdentificacion: str = Query("VIN", description="VIN, CHASIS, SERIE"),
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    Streams the stored PDF of an existing study (never calls the provider).
+    Supports HEAD, Range requests and conditional GET: the ETag is the PDF's
+    sha256, so it only changes when the report content does.
+    """
+    if tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
+        raise HTTPException(status_code=400, detail="tipoIdentificacion must be VIN, CHASIS, or SERIE")
+    from app.services.pdf_generator import obtener_pdf_estudio
+
+    identificacion = canonicalizar(tipoIdentificacion, identificacion)
+    stmt = (
+        select(VehiculoEstudio)
+        .where(VehiculoEstudio.identificacion == identificacion)
+        .options(defer(VehiculoEstudio.respuesta_serializada))
+    )
+    estudio_db = (await db.execute(stmt)).scalar_one_or_none()
+    if estudio_db is None:
+        raise HTTPException(status_code=404, detail="Estudio no encontrado")
+
+    try:
+        # Stored artifact, or rendered now (first download after a re-normalization)
+        url_pdf, pdf_hash, pdf_size = await obtener_pdf_estudio(db, estudio_db)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"PDF no disponible: {e}", headers={"Retry-After": "5"})
+
+    cabeceras = cabeceras_cache(f'"{pdf_hash.removeprefix("sha256:")}"', estudio_db.ultima_fecha_estudio)
+    status_code = 304 if no_modificado(request, cabeceras["ETag"], estudio_db.ultima_fecha_estudio) else 200
+    await trazabilidad_buffer.registrar(
+        identificacion=identificacion,
+        endpoint="/api/v1/vehiculos/estudios/pdf",
+        status_code=status_code,
+        llamada_externa=False,
+        proveedor="Cache",
+        ip_origen=request.client.host if request.client else None,
+        usuario=token_data.get("sub")
+    )
+    # Persists a render made by this request
+    await db.commit()
+
+    if status_code == 304:
+        return Response(status_code=304, headers=cabeceras)
+    ruta = almacen_pdf.ruta_local(url_pdf)
+    if ruta is not None:
+        # Streamed from disk in chunks (Range/If-Range handled by FileResponse); no base64, no full read
+        return FileResponse(ruta, media_type="application/pdf", filename=f"{identificacion}.pdf", headers=cabeceras)
+
+    # Remote backend: relayed chunk by chunk from the object store, without Range support
+    cabeceras["Content-Length"] = str(pdf_size)
+    cabeceras["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(identificacion)}.pdf"
+    if request.method == "HEAD":
+        return Response(media_type="application/pdf", headers=cabeceras)
+    return StreamingResponse(almacen_pdf.leer(url_pdf), media_type="application/pdf", headers=cabeceras)
+
+
+async def _generar_pdf_info(
+    db: AsyncSession,
+    estudio_db: VehiculoEstudio,
+    ya_facturado: bool,
+    con_contenido: bool = True
+) -> PdfInfo:
+    """
+    The study's PDF: rendered on the first request and recorded on the study,
+    read back from storage afterwards. The base64 content is only built when the
+    client asked for it inline; otherwise the response links to the download.
+    Render and storage failures (RenderSaturadoError, RenderTimeoutError, ...) propagate.
+    """
+    from app.services.pdf_generator import obtener_pdf_estudio
+
+    url_pdf, pdf_hash, pdf_size = await obtener_pdf_estudio(db, estudio_db)
+
+    # Base64 Output (for Racsa), only when asked for inline
+    contenido = await _leer_base64(url_pdf) if con_contenido else None
+
+    return PdfInfo(
+        content=contenido,
+        url=_url_pdf(estudio_db.identificacion),
+        tamañoBytes=pdf_size,
+        hash=pdf_hash,
+        # Reports are dated with the study, so the stored PDF keeps its hash
+        fechaGeneracion=_fecha_emision(estudio_db.ultima_fecha_estudio),
+        yaFacturadoPreviamente=ya_facturado
+    )
+
+
+def _url_pdf(identificacion: str) -> str:
+    return f"{settings.API_V1_STR}/vehiculos/estudios/{quote(identificacion, safe='')}/pdf"
+
+
+async def _leer_base64(url_pdf: str) -> str:
+    # Read from the storage backend off the event loop, like the render itself
+    contenido = b"".join([chunk async for chunk in almacen_pdf.leer(url_pdf)])
+    return base64.b64encode(contenido).decode('utf-8')
+
+
+def _fecha_emision(fecha: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    # DateTime columns come back naive (UTC)
+    if fecha is not None and fecha.tzinfo is None:
+        return fecha.replace(tzinfo=datetime.timezone.utc)
+    return fecha
+
+
+async def _fallo_consulta(
+    request: Request,
+    token_data: dict,
+    identificacion: str,
+    e: Exception
+) -> HTTPException:
+    """
+    Logs a failed study lookup to Trazabilidad and builds the RACSA error response.
+    """
+    error = error_de_consulta(e)
+    if isinstance(error, LookupInternalError):
+        logger.opt(exception=e).error(f"Internal failure resolving {identificacion}")
+    await trazabilidad_buffer.registrar(
+        identificacion=identificacion, endpoint="/api/v1/vehiculos/estudios",
+        status_code=error.status_code,
+        # Invalid VINs, negative cache hits, an open breaker or exhausted quota never reach the provider
+        llamada_externa=error.llamada_externa,
+        proveedor=error.proveedor or "Cache", mensaje_error=str(e)[:500],
+        ip_origen=request.client.host if request.client else None,
+        usuario=token_data.get("sub")
+    )
+    headers = {"Retry-After": str(int(error.retry_after) + 1)} if error.retry_after is not None else None
+    return HTTPException(status_code=error.status_code, detail=error.to_detail(), headers=headers)
+
+
+async def _pdf_no_disponible(
+    request: Request,
+    token_data: dict,
+    identificacion: str,
+    llamada_externa: bool,
+    proveedor: str,
+    e: Exception
+) -> HTTPException:
+    """
+    Logs a study answer that failed at the PDF step and builds its 503: a busy or
+    timed-out renderer asks the client to retry, like the /pdf download does.
+    """
+    if isinstance(e, (RenderSaturadoError, RenderTimeoutError)):
+        logger.warning(f"PDF of {identificacion} not available: {e}")
+    else:
+        logger.opt(exception=e).error(f"PDF of {identificacion} failed")
+    await trazabilidad_buffer.registrar(
+        identificacion=identificacion, endpoint="/api/v1/vehiculos/estudios",
+        status_code=503,
+        llamada_externa=llamada_externa,
+        proveedor=proveedor, mensaje_error=f"PDF no disponible: {e}"[:500],
+        ip_origen=request.client.host if request.client else None,
+        usuario=token_data.get("sub")
+    )
+    return HTTPException(status_code=503, detail=f"PDF no disponible: {e}", headers={"Retry-After": "5"})
+
+
+def _estudio_a_respuesta(estudio_db: VehiculoEstudio, pdf_info: Optional[PdfInfo] = None) -> EstudioCompletoResponse:
     return EstudioCompletoResponse(
         tipoIdentificacion=estudio_db.tipo_identificacion,
         identificacion=estudio_db.identificacion,
@@ -195,6 +454,249 @@ async def get_estudio_completo(
         ultimaFechaEstudio=estudio_db.ultima_fecha_estudio,
         esEstudioSinRegistros=estudio_db.es_estudio_sin_registros,
         especificacionesVehiculo=estudio_db.especificaciones_vehiculo,
-        detalleEstudio=estudio_db.detalle_estudio,
+        detalleEstudio=detalle_con_problemas(estudio_db.detalle_estudio, estudio_db.problemas_bitmask),
+        problemasBitmask=estudio_db.problemas_bitmask,
         pdf=pdf_info
     )
+
+
+@router.post("/lote")
+@limiter.limit("5/minute")
+async def post_estudios_lote(
+    request: Request,
+    lote: EstudioLoteRequest,
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    Batch study lookup. Cache hits are answered from one IN query; misses are fetched
+    with bounded concurrency at batch priority. Results stream back as NDJSON, one
+    EstudioLoteItem per line, in completion order. PDFs are not rendered here.
+    """
+    if lote.tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
+        raise HTTPException(status_code=400, detail="tipoIdentificacion must be VIN, CHASIS, or SERIE")
+
+    # Deduplicate, keeping the client's order
+    identificaciones = list(dict.fromkeys(
+        canonicalizar(lote.tipoIdentificacion, i) for i in lote.identificaciones if i.strip()
+    ))
+    if len(identificaciones) > settings.LOTE_MAX_IDENTIFICACIONES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximo {settings.LOTE_MAX_IDENTIFICACIONES} identificaciones por lote"
+        )
+
+    stmt = select(VehiculoEstudio).where(VehiculoEstudio.identificacion.in_(identificaciones))
+    result = await db.execute(stmt)
+    en_cache = {e.identificacion: e for e in result.scalars()}
+    faltantes = [i for i in identificaciones if i not in en_cache]
+
+    ip_origen = request.client.host if request.client else None
+    usuario = token_data.get("sub")
+
+    def traza(identificacion: str, status_code: int, llamada_externa: bool, proveedor: Optional[str], error: Optional[str] = None) -> dict:
+        return {
+            "fecha_consulta": datetime.datetime.now(datetime.timezone.utc),
+            "identificacion": identificacion,
+            "endpoint": "/api/v1/vehiculos/estudios/lote",
+            "status_code": status_code,
+            "llamada_externa": llamada_externa,
+            "proveedor": proveedor,
+            "mensaje_error": error[:500] if error else None,
+            "ip_origen": ip_origen,
+            "usuario": usuario,
+        }
+
+    semaforo = asyncio.Semaphore(settings.LOTE_CONCURRENCIA)
+
+    async def resolver(identificacion: str) -> Tuple[Union[EstudioLoteItem, bytes], dict]:
+        async with semaforo:
+            try:
+                estudio, llamada_externa, proveedor = await obtener_estudio_externo(
+                    lote.tipoIdentificacion, identificacion, Prioridad.LOTE
+                )
+            except Exception as e:
+                error = error_de_consulta(e)
+                if isinstance(error, LookupInternalError):
+                    logger.opt(exception=e).error(f"Internal failure resolving {identificacion}")
+                item = EstudioLoteItem(identificacion=identificacion, estado="error", origen=error.proveedor, error=error.to_detail())
+                return item, traza(identificacion, error.status_code, error.llamada_externa, error.proveedor, str(e))
+        return _item_lote_ok(identificacion, proveedor, estudio), traza(identificacion, 200, llamada_externa, proveedor)
+
+    async def stream():
+        trazas = []
+        tareas = [asyncio.ensure_future(resolver(i)) for i in faltantes]
+        try:
+            for identificacion in identificaciones:
+                estudio = en_cache.get(identificacion)
+                if estudio is not None:
+                    trazas.append(traza(identificacion, 200, False, "Cache"))
+                    yield _item_lote_ok(identificacion, "Cache", estudio)
+
+            for siguiente in asyncio.as_completed(tareas):
+                item, registro = await siguiente
+                trazas.append(registro)
+                yield item if isinstance(item, bytes) else item.model_dump_json().encode("utf-8") + b"\n"
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            # Through the audit buffer (the request's session may already be
+            # closed while the body streams)
+            await trazabilidad_buffer.registrar_muchos(trazas)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _item_lote_ok(identificacion: str, origen: str, estudio: VehiculoEstudio) -> bytes:
+    """
+    NDJSON line of a found study, built around its stored body (same JSON as
+    EstudioLoteItem.model_dump_json()).
+    """
+    item = EstudioLoteItem(identificacion=identificacion, estado="ok", origen=origen)
+    cabecera = item.model_dump_json(exclude={"estudio", "error"}).encode("utf-8")
+    return cabecera[:-1] + b',"estudio":' + con_pdf(cuerpo_estudio(estudio), None) + b',"error":null}\n'
+
+
+@router.post("/exportacion")
+@limiter.limit("5/minute")
+async def post_exportacion_pdfs(
+    request: Request,
+    solicitud: ExportacionPdfRequest,
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    ZIP with the PDFs of existing studies (never calls the provider), selected by
+    identifier list and/or study date range, plus manifiesto.json with each PDF's
+    sha256. Stored PDFs are copied as is; missing ones are rendered on the way.
+    The archive is streamed while it is built.
+    """
+    if solicitud.tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
+        raise HTTPException(status_code=400, detail="tipoIdentificacion must be VIN, CHASIS, or SERIE")
+    if not solicitud.identificaciones and solicitud.desde is None and solicitud.hasta is None:
+        raise HTTPException(status_code=400, detail="Indique identificaciones o un rango desde/hasta")
+
+    identificaciones = list(dict.fromkeys(
+        canonicalizar(solicitud.tipoIdentificacion, i) for i in solicitud.identificaciones or [] if i.strip()
+    ))
+    estudios = await seleccionar_estudios(
+        db, identificaciones, solicitud.desde, solicitud.hasta, settings.EXPORTACION_MAX_ESTUDIOS
+    )
+    if len(estudios) > settings.EXPORTACION_MAX_ESTUDIOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximo {settings.EXPORTACION_MAX_ESTUDIOS} estudios por exportacion"
+        )
+    encontrados = {identificacion for _, identificacion in estudios}
+    exportacion = ExportacionZip(estudios, [i for i in identificaciones if i not in encontrados])
+
+    ip_origen = request.client.host if request.client else None
+    usuario = token_data.get("sub")
+    estados = {"ok": 200, "error": 503, "no_encontrado": 404}
+
+    async def stream():
+        try:
+            async for chunk in exportacion.stream():
+                yield chunk
+        finally:
+            # Through the audit buffer (see post_estudios_lote)
+            await trazabilidad_buffer.registrar_muchos([{
+                "fecha_consulta": datetime.datetime.now(datetime.timezone.utc),
+                "identificacion": entrada["identificacion"],
+                "endpoint": "/api/v1/vehiculos/estudios/exportacion",
+                "status_code": estados[entrada["estado"]],
+                "llamada_externa": False,
+                "proveedor": "Cache",
+                "mensaje_error": entrada.get("error"),
+                "ip_origen": ip_origen,
+                "usuario": usuario,
+            } for entrada in exportacion.manifiesto])
+
+    nombre = f"estudios_{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H%M%S}.zip"
+    return StreamingResponse(
+        stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+
+@router.post("/jobs", response_model=EstudioJobResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("30/minute")
+async def post_estudio_job(
+    request: Request,
+    solicitud: EstudioJobRequest,
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    Submit a study as a background job. Returns the job id at once; poll
+    GET /jobs/{jobId} or receive a signed POST on webhookUrl when it finishes.
+    """
+    if solicitud.tipoIdentificacion not in ["VIN", "CHASIS", "SERIE"]:
+        raise HTTPException(status_code=400, detail="tipoIdentificacion must be VIN, CHASIS, or SERIE")
+    if solicitud.webhookUrl:
+        try:
+            await validar_webhook_url(solicitud.webhookUrl)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        identificacion = preparar_identificacion(solicitud.tipoIdentificacion, solicitud.identificacion)
+    except ProviderError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.to_detail())
+
+    job = EstudioJob(
+        id=nuevo_job_id(),
+        estado="pendiente",
+        tipo_identificacion=solicitud.tipoIdentificacion,
+        identificacion=identificacion,
+        webhook_url=solicitud.webhookUrl,
+        usuario=token_data.get("sub"),
+        ip_origen=request.client.host if request.client else None,
+        fecha_creacion=datetime.datetime.now(datetime.timezone.utc)
+    )
+    db.add(job)
+    await db.commit()
+    job_pool.notificar()
+
+    return _job_a_respuesta(job)
+
+
+@router.get("/jobs/{job_id}", response_model=EstudioJobResponse)
+async def get_estudio_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    token_data: dict = Depends(verify_token)
+) -> Any:
+    """
+    Status of a study job; includes the study (without PDF content) once completed.
+    """
+    job = await db.get(EstudioJob, job_id)
+    if job is None or job.usuario != token_data.get("sub"):
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    estudio = None
+    if job.estado == "completado" and job.estudio_id is not None:
+        estudio_db = await db.get(VehiculoEstudio, job.estudio_id)
+        if estudio_db is not None:
+            pdf_info = PdfInfo(
+                url=_url_pdf(estudio_db.identificacion),
+                tamañoBytes=job.pdf_size_bytes,
+                hash=job.pdf_hash,
+                fechaGeneracion=job.fecha_fin,
+                yaFacturadoPreviamente=not job.llamada_externa
+            )
+            estudio = _estudio_a_respuesta(estudio_db, pdf_info)
+    return _job_a_respuesta(job, estudio)
+
+
+def _job_a_respuesta(job: EstudioJob, estudio: Optional[EstudioCompletoResponse] = None) -> EstudioJobResponse:
+    return EstudioJobResponse(
+        jobId=job.id,
+        estado=job.estado,
+        identificacion=job.identificacion,
+        fechaCreacion=job.fecha_creacion,
+        fechaFin=job.fecha_fin,
+        intentos=job.intentos or 0,
+        error={"codigo": job.codigo_error, "detalle": job.mensaje_error} if job.estado == "fallido" else None,
+        estudio=estudio
+    )
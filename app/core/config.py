@@ -10,6 +10,19 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./globalvin.db"
+
+    # Database connection pool (Postgres/asyncpg; SQLite uses the DB_SQLITE_* values below)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0 # seconds a checkout waits for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800 # seconds; reconnect before server/proxy idle timeouts
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100 # asyncpg prepared statements per connection; 0 behind PgBouncer in transaction mode
+    DB_STATEMENT_TIMEOUT_MS: int = 15000 # Postgres statement_timeout; 0 = none
+    DB_SQLITE_POOL_SIZE: int = 5
+    DB_SQLITE_MAX_OVERFLOW: int = 5 # SQLite has one writer at a time; more connections only queue on its lock
+    DB_SQLITE_BUSY_TIMEOUT_SECONDS: float = 5.0 # wait for the SQLite write lock before "database is locked"
+    DB_SLOW_QUERY_MS: float = 250.0 # statements slower than this are logged with the correlation id; 0 = off
     
     # Authentication JWT
     SECRET_KEY: str = "super_secret_key_for_development_only_12345"
@@ -21,6 +34,116 @@ class Settings(BaseSettings):
     VINAUDIT_PASS: str = ""
     VINCARIO_API_KEY: str = ""
     VINCARIO_SECRET_KEY: str = ""
+    VINAUDIT_BASE_URL: str = "https://api.vinaudit.com"
+    VINCARIO_BASE_URL: str = "https://api.vincario.com"
+    # Local provider simulator (python -m app.simulator). When set, both providers point here.
+    PROVIDER_SIMULATOR_URL: str = ""
+
+    # Provider response decoding
+    PROVIDER_MAX_BODY_BYTES: int = 25 * 1024 * 1024 # larger bodies are aborted while streaming
+    PROVIDER_DECODE_INCREMENTAL: bool = False # VinAudit: decode only the sections the normalizer reads (less memory, more CPU)
+
+    # Provider HTTP connection pools (one shared client per provider)
+    VINAUDIT_MAX_CONNECTIONS: int = 20
+    VINAUDIT_MAX_KEEPALIVE: int = 10
+    VINAUDIT_KEEPALIVE_EXPIRY: float = 30.0
+    VINAUDIT_CONNECT_TIMEOUT: float = 5.0
+    VINAUDIT_TIMEOUT: float = 15.0
+    VINAUDIT_HTTP2: bool = False
+    VINCARIO_MAX_CONNECTIONS: int = 10
+    VINCARIO_MAX_KEEPALIVE: int = 5
+    VINCARIO_KEEPALIVE_EXPIRY: float = 30.0
+    VINCARIO_CONNECT_TIMEOUT: float = 5.0
+    VINCARIO_TIMEOUT: float = 30.0
+    VINCARIO_HTTP2: bool = False
+
+    # Provider resilience (circuit breaker, retry budget, p99-driven timeouts)
+    PROVIDER_BREAKER_FAILURE_THRESHOLD: int = 5
+    PROVIDER_BREAKER_RESET_SECONDS: float = 30.0
+    PROVIDER_BREAKER_HALF_OPEN_CALLS: int = 1
+    PROVIDER_RETRY_MAX_ATTEMPTS: int = 3
+    PROVIDER_RETRY_BASE_DELAY: float = 0.2
+    PROVIDER_RETRY_MAX_DELAY: float = 2.0
+    PROVIDER_RETRY_BUDGET_RATIO: float = 0.2
+    PROVIDER_RETRY_BUDGET_MIN_PER_SECOND: float = 0.5
+    PROVIDER_LATENCY_WINDOW: int = 200
+    PROVIDER_TIMEOUT_P99_MULTIPLIER: float = 1.5
+    PROVIDER_TIMEOUT_MIN_SECONDS: float = 2.0
+
+    # Provider quota scheduler (token bucket + priority wait queue per provider)
+    VINAUDIT_RATE_PER_SECOND: float = 5.0
+    VINAUDIT_BURST: int = 10
+    VINAUDIT_QUEUE_MAX: int = 200
+    VINCARIO_RATE_PER_SECOND: float = 2.0
+    VINCARIO_BURST: int = 5
+    VINCARIO_QUEUE_MAX: int = 100
+    PROVIDER_DEADLINE_INTERACTIVA_SECONDS: float = 10.0
+    PROVIDER_DEADLINE_JOB_SECONDS: float = 60.0
+    PROVIDER_DEADLINE_LOTE_SECONDS: float = 300.0
+
+    # Batch studies (POST /vehiculos/estudios/lote)
+    LOTE_MAX_IDENTIFICACIONES: int = 500
+    LOTE_CONCURRENCIA: int = 8
+
+    # PDF ZIP export (POST /vehiculos/estudios/exportacion)
+    EXPORTACION_MAX_ESTUDIOS: int = 5000
+    EXPORTACION_LOTE: int = 50 # studies loaded (and missing PDFs rendered) per step
+    EXPORTACION_CONCURRENCIA: int = 2 # missing PDFs rendered at once by one export
+
+    # Asynchronous study jobs (POST /vehiculos/estudios/jobs)
+    JOBS_WORKERS_EN_PROCESO: int = 2 # 0 = only the separate worker (python -m app.worker) processes jobs
+    JOBS_POLL_SECONDS: float = 1.0
+    JOBS_LEASE_SECONDS: int = 300
+    JOBS_MAX_INTENTOS: int = 3
+    WEBHOOK_SECRET: str = "" # HMAC-SHA256 key for X-GlobalVIN-Signature; falls back to SECRET_KEY
+    WEBHOOK_TIMEOUT: float = 10.0
+    WEBHOOK_MAX_INTENTOS: int = 3
+
+    # Trazabilidad audit rows (write-behind buffer, bulk INSERT per batch)
+    TRAZABILIDAD_BUFFER_MAX: int = 10000 # pending rows per process
+    TRAZABILIDAD_FLUSH_LOTE: int = 200 # rows per INSERT; a full batch is written at once
+    TRAZABILIDAD_FLUSH_SEGUNDOS: float = 1.0 # max time a row waits for its batch
+    TRAZABILIDAD_DESBORDE: str = "esperar" # buffer full: "esperar" (request waits for the flush) or "descartar"
+
+    # Trazabilidad history: Postgres monthly partitions and archive (app.jobs.archivar_trazabilidad)
+    TRAZABILIDAD_MESES_EN_BD: int = 12 # older whole months are moved to the archive
+    TRAZABILIDAD_ARCHIVO_DIR: str = "" # default: storage/archivo_trazabilidad
+    TRAZABILIDAD_PARTICIONES_ADELANTE: int = 3 # monthly partitions created ahead of the current one
+
+    # Dashboard UI query limits (the JSON endpoints only narrow down when asked: dias=, limite=)
+    DASHBOARD_DIAS_POR_DEFECTO: int = 30 # UI range when no start_date is given; 0 = all history
+    DASHBOARD_MAX_FILAS: int = 500 # rows listed in the UI's recent-log table and errors modal; 0 = all
+
+    # Concurrent lookups of the same VIN (single-flight + cross-worker reservation)
+    ESTUDIO_RESERVA_TTL_SECONDS: int = 90
+    ESTUDIO_RESERVA_POLL_SECONDS: float = 0.25
+
+    # Offline re-normalization job (app.jobs.renormalizar)
+    RENORMALIZACION_LOTE: int = 200
+    RENORMALIZACION_WORKERS: int = 0 # 0 = one process per CPU
+
+    # Negative cache of provider misses/errors, keyed by canonical identifier (per process)
+    NEGATIVE_CACHE_MAX_ENTRIES: int = 10000
+    NEGATIVE_CACHE_NOT_FOUND_TTL_SECONDS: float = 21600.0 # "no records" answers
+    NEGATIVE_CACHE_ERROR_TTL_SECONDS: float = 120.0 # provider bodies over PROVIDER_MAX_BODY_BYTES
+
+    # PDF rendering (long-lived renderer processes, off the event loop)
+    PDF_RENDER_WORKERS: int = 2
+    PDF_RENDER_QUEUE_MAX: int = 16 # renders waiting for a free worker; beyond this they are rejected
+    PDF_RENDER_TIMEOUT_SECONDS: float = 30.0
+
+    # PDF storage: "local" (sharded directory) or "s3" (any S3-compatible service, needs boto3)
+    PDF_STORAGE_BACKEND: str = "local"
+    PDF_STORAGE_DIR: str = "" # local backend root; default: storage/pdfs
+    PDF_STORAGE_S3_BUCKET: str = ""
+    PDF_STORAGE_S3_PREFIX: str = "pdfs/"
+    PDF_STORAGE_S3_ENDPOINT_URL: str = "" # MinIO or another S3-compatible endpoint; empty = AWS
+    PDF_STORAGE_S3_REGION: str = ""
+    PDF_GC_GRACIA_HORAS: int = 24 # unreferenced renders younger than this are kept (may still be recorded)
+
+    # Jinja templates (compiled at startup, bytecode shared by all worker processes)
+    TEMPLATE_BYTECODE_CACHE_DIR: str = "" # default: storage/jinja_cache
+    TEMPLATE_AUTO_RELOAD: bool = False # True re-checks template files on every render (development)
 
     model_config = SettingsConfigDict(
         env_file=".env",
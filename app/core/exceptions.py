@@ -0,0 +1,128 @@
+from typing import Optional
+
+
+class ProviderError(Exception):
+    """
+    Failure while obtaining a study from an external provider.
+    Carries the RACSA error code and HTTP status the API should answer with.
+    """
+    codigo = "ERROR_PROVEEDOR"
+    mensaje = "Error en integracion con proveedor"
+    status_code = 502
+    # False when the error is raised before any provider call (nothing was paid for)
+    llamada_externa = True
+
+    def __init__(self, detalle: str, proveedor: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(detalle)
+        self.detalle = detalle
+        self.proveedor = proveedor
+        self.retry_after = retry_after
+
+    def to_detail(self) -> dict:
+        return {
+            "codigo": self.codigo,
+            "mensaje": self.mensaje,
+            "detalle": self.detalle,
+            "correlationId": "TBD"
+        }
+
+
+class ProviderUnavailableError(ProviderError):
+    """
+    The provider's circuit breaker is open: fail fast without calling it.
+    """
+    codigo = "ERROR_PROVEEDOR_NO_DISPONIBLE"
+    mensaje = "Proveedor temporalmente no disponible, intente mas tarde"
+    status_code = 503
+    llamada_externa = False
+
+
+class ProviderQuotaError(ProviderError):
+    """
+    The provider's rate quota cannot serve the request before its deadline
+    (or the wait queue is full): rejected without waiting.
+    """
+    codigo = "ERROR_CUOTA_PROVEEDOR"
+    mensaje = "Cuota del proveedor agotada temporalmente, intente mas tarde"
+    status_code = 429
+    llamada_externa = False
+
+
+class ProviderConfigError(ProviderError):
+    """
+    The provider's credentials are not configured: nothing was sent.
+    """
+    codigo = "ERROR_CONFIGURACION_PROVEEDOR"
+    mensaje = "Proveedor no configurado"
+    status_code = 503
+    llamada_externa = False
+
+
+class ProviderNotFoundError(ProviderError):
+    """
+    The provider answered but has no records for the identifier (or rejected it as a VIN).
+    """
+    codigo = "ERROR_VIN_SIN_REGISTROS"
+    mensaje = "El proveedor no tiene registros para la identificacion consultada"
+    status_code = 404
+
+
+class ProviderPayloadTooLargeError(ProviderError):
+    """
+    The provider's body exceeded PROVIDER_MAX_BODY_BYTES and was not read to the end.
+    """
+    codigo = "ERROR_RESPUESTA_PROVEEDOR_EXCEDE_LIMITE"
+    mensaje = "La respuesta del proveedor excede el tamano maximo permitido"
+    status_code = 502
+
+
+class InvalidVinError(ProviderError):
+    """
+    Malformed VIN (length, I/O/Q, check digit): rejected before reaching any provider.
+    """
+    codigo = "ERROR_VIN_INVALIDO"
+    mensaje = "La identificacion no es un VIN valido"
+    status_code = 400
+    llamada_externa = False
+
+
+class LookupInternalError(ProviderError):
+    """
+    The lookup failed inside GlobalVIN (database pool exhausted, timed out
+    waiting for another worker's lookup...), not at a provider: nothing was
+    paid for and nothing is negative-cached.
+    """
+    codigo = "ERROR_INTERNO_CONSULTA"
+    mensaje = "Error interno al resolver la consulta, intente mas tarde"
+    status_code = 503
+    llamada_externa = False
+
+
+def error_de_consulta(e: Exception) -> ProviderError:
+    """
+    The error a failed study lookup is answered and logged with: provider
+    errors as raised, anything else as a LookupInternalError.
+    """
+    if isinstance(e, ProviderError):
+        return e
+    return LookupInternalError(str(e) or type(e).__name__)
+
+
+class NegativeCacheError(ProviderError):
+    """
+    The same identifier failed at the provider recently: answered from the
+    negative cache with the original status, without paying for another call.
+    """
+    codigo = "ERROR_CONSULTA_NEGATIVA_EN_CACHE"
+    mensaje = "La identificacion fallo recientemente en el proveedor, intente mas tarde"
+    llamada_externa = False
+
+    def __init__(self, detalle: str, status_code: int, codigo_original: str, retry_after: Optional[float] = None):
+        super().__init__(detalle, proveedor="Cache", retry_after=retry_after)
+        self.status_code = status_code
+        self.codigo_original = codigo_original
+
+    def to_detail(self) -> dict:
+        detail = super().to_detail()
+        detail["codigoOriginal"] = self.codigo_original
+        return detail
@@ -1,5 +1,6 @@
 import uuid
 import logging
+from contextvars import ContextVar
 from loguru import logger
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
@@ -8,10 +9,16 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.exceptions import RequestValidationError
 import time
 
+# Correlation id of the request being handled, for logs written outside the
+# request objects (e.g. the slow-query hook in app.db.monitoreo)
+correlation_id_actual: ContextVar[str] = ContextVar("correlation_id", default="-")
+
 class CorrelationIDMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
         request.state.correlation_id = correlation_id
+        # Set before call_next: the endpoint task inherits a copy of this context
+        correlation_id_actual.set(correlation_id)
         
         start_time = time.time()
         
@@ -51,7 +58,7 @@ def setup_exception_handlers(app: FastAPI):
         error_response["correlationId"] = correlation_id
 
         logger.error(f"[{correlation_id}] HTTP {exc.status_code}: {error_response}")
-        return JSONResponse(status_code=exc.status_code, content=error_response)
+        return JSONResponse(status_code=exc.status_code, content=error_response, headers=getattr(exc, "headers", None))
 
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,91 @@
+"""
+Schema upgrade for databases created by an earlier version. create_all() only
+creates missing tables; actualizar_esquema() also adds the columns and indexes
+later versions added to existing tables (all nullable, so ADD COLUMN is
+enough) and backfills problemas_bitmask from the stored detalle JSON.
+Runs at startup right after create_all(); app.jobs.actualizar_esquema runs it
+(or prints its DDL) on its own.
+"""
+from typing import List, Tuple
+
+from loguru import logger
+from sqlalchemy import Column, Connection, Index, Table, bindparam, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateIndex
+
+from app.db.session import Base
+from app.models.vehiculo import VehiculoEstudio
+from app.services.problemas_bitmask import a_bitmask
+
+
+def _pendientes(conn: Connection) -> Tuple[List[Tuple[Table, Column]], List[Index]]:
+    """
+    Model columns and indexes missing from tables that already exist (tables
+    that do not exist yet are create_all()'s).
+    """
+    inspector = inspect(conn)
+    existentes = set(inspector.get_table_names())
+    columnas, indices = [], []
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.name not in existentes:
+            continue
+        en_bd = {c["name"] for c in inspector.get_columns(tabla.name)}
+        columnas += [(tabla, c) for c in tabla.columns if c.name not in en_bd]
+        indices_en_bd = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        indices += [i for i in tabla.indexes if i.name not in indices_en_bd]
+    return columnas, indices
+
+
+def _ddl(conn: Connection, columnas: List[Tuple[Table, Column]], indices: List[Index]) -> List[str]:
+    preparer = conn.dialect.identifier_preparer
+    sentencias = []
+    for tabla, columna in columnas:
+        if not columna.nullable and columna.server_default is None:
+            raise RuntimeError(f"{tabla.name}.{columna.name} is NOT NULL without a server default: add it by hand")
+        sentencias.append(
+            f"ALTER TABLE {preparer.format_table(tabla)} ADD COLUMN {preparer.format_column(columna)} "
+            f"{columna.type.compile(dialect=conn.dialect)}"
+        )
+    sentencias += [str(CreateIndex(indice).compile(dialect=conn.dialect)) for indice in indices]
+    return sentencias
+
+
+def ddl_pendiente(conn: Connection) -> List[str]:
+    return _ddl(conn, *_pendientes(conn))
+
+
+def _rellenar_bitmask(conn: Connection, lote: int = 1000) -> int:
+    """
+    problemas_bitmask of studies saved before the column existed, packed from
+    the comprobacionDeProblemas still in their detalle JSON.
+    """
+    tabla = VehiculoEstudio.__table__
+    filas = conn.execute(
+        select(tabla.c.id, tabla.c.detalle_estudio).where(tabla.c.detalle_estudio.is_not(None))
+    ).all()
+    valores = []
+    for id_, detalle in filas:
+        mask = a_bitmask((detalle or {}).get("comprobacionDeProblemas"))
+        if mask is not None:
+            valores.append({"id_": id_, "mask": mask})
+    stmt = update(tabla).where(tabla.c.id == bindparam("id_")).values(problemas_bitmask=bindparam("mask"))
+    for i in range(0, len(valores), lote):
+        conn.execute(stmt, valores[i:i + lote])
+    return len(valores)
+
+
+def _actualizar(conn: Connection) -> None:
+    columnas, indices = _pendientes(conn)
+    for sentencia in _ddl(conn, columnas, indices):
+        logger.info(f"Schema upgrade: {sentencia}")
+        conn.exec_driver_sql(sentencia)
+    if any(t.name == VehiculoEstudio.__tablename__ and c.name == "problemas_bitmask" for t, c in columnas):
+        logger.info(f"Schema upgrade: problemas_bitmask filled for {_rellenar_bitmask(conn)} studies")
+
+
+async def actualizar_esquema(conn: AsyncConnection) -> None:
+    """
+    Brings existing tables up to the models. Idempotent: nothing to do once
+    the schema matches.
+    """
+    await conn.run_sync(_actualizar)
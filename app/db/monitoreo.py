@@ -0,0 +1,95 @@
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.middleware import correlation_id_actual
+
+_esperas = deque(maxlen=500)
+_contadores = {"checkouts": 0, "timeouts": 0, "max_in_use": 0, "slow_queries": 0}
+_pool: Optional[AsyncAdaptedQueuePool] = None
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records how long each checkout waited for a
+    connection (including opening a new one) and how many timed out.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        global _pool
+        super().__init__(*args, **kwargs)
+        _pool = self
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            _contadores["timeouts"] += 1
+            raise
+        finally:
+            _esperas.append(time.perf_counter() - inicio)
+        _contadores["checkouts"] += 1
+        _contadores["max_in_use"] = max(_contadores["max_in_use"], self.checkedout())
+        return conexion
+
+
+def registrar_consultas_lentas(engine: Engine, umbral_ms: float) -> None:
+    """
+    Logs every statement slower than umbral_ms (parameters are not logged;
+    they carry VINs) with the correlation id of the request that ran it.
+    """
+    if umbral_ms <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        duracion_ms = (time.perf_counter() - conn.info["inicio_consulta"].pop()) * 1000
+        if duracion_ms >= umbral_ms:
+            _contadores["slow_queries"] += 1
+            sentencia = " ".join(statement.split())[:500]
+            logger.warning(
+                f"[{correlation_id_actual.get()}] Slow query ({duracion_ms:.0f} ms"
+                f"{', executemany' if executemany else ''}): {sentencia}"
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        # A failed statement never reaches after_cursor_execute
+        inicios = contexto.connection.info.get("inicio_consulta") if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+
+
+def pool_stats() -> Dict[str, Any]:
+    esperas = sorted(_esperas)
+    stats = {
+        "checkouts": _contadores["checkouts"],
+        "timeouts": _contadores["timeouts"],
+        "max_in_use": _contadores["max_in_use"],
+        "slow_queries": _contadores["slow_queries"],
+        "checkout_wait_avg_seconds": round(sum(esperas) / len(esperas), 4) if esperas else 0.0,
+        "checkout_wait_p95_seconds": round(esperas[int(0.95 * (len(esperas) - 1))], 4) if esperas else 0.0,
+        "checkout_wait_max_seconds": round(esperas[-1], 4) if esperas else 0.0,
+    }
+    if _pool is not None:
+        capacidad = _pool.size() + max(_pool._max_overflow, 0)
+        stats.update({
+            "size": _pool.size(),
+            "max_overflow": _pool._max_overflow,
+            "in_use": _pool.checkedout(),
+            "idle": _pool.checkedin(),
+            "overflow": max(_pool.overflow(), 0),
+            "saturation": round(_pool.checkedout() / capacidad, 3) if capacidad else 0.0,
+        })
+    return stats
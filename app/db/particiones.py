@@ -0,0 +1,140 @@
+"""
+Monthly range partitions of trazabilidad on Postgres. create_all() builds a
+plain table (the ORM keeps id as the only primary key, which SQLite needs);
+app.jobs.particionar_trazabilidad converts it once, and asegurar_particiones()
+keeps the coming months' partitions created.
+"""
+import datetime
+from typing import List, Tuple
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+TABLA = "trazabilidad"
+PARTICION_DEFECTO = "trazabilidad_default"
+
+
+def mes_siguiente(anio: int, mes: int) -> Tuple[int, int]:
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def sumar_meses(anio: int, mes: int, meses: int) -> Tuple[int, int]:
+    indice = anio * 12 + (mes - 1) + meses
+    return indice // 12, indice % 12 + 1
+
+
+def rango_mes(anio: int, mes: int) -> Tuple[datetime.datetime, datetime.datetime]:
+    # fecha_consulta is naive UTC
+    return datetime.datetime(anio, mes, 1), datetime.datetime(*mes_siguiente(anio, mes), 1)
+
+
+def nombre_particion(anio: int, mes: int) -> str:
+    return f"{TABLA}_y{anio:04d}m{mes:02d}"
+
+
+def _limites(anio: int, mes: int) -> str:
+    desde, hasta = rango_mes(anio, mes)
+    return f"FOR VALUES FROM ('{desde:%Y-%m-%d}') TO ('{hasta:%Y-%m-%d}')"
+
+
+def ddl_particion(anio: int, mes: int) -> str:
+    return f"CREATE TABLE IF NOT EXISTS {nombre_particion(anio, mes)} PARTITION OF {TABLA} {_limites(anio, mes)}"
+
+
+def ddl_conversion(desde: Tuple[int, int], hasta: Tuple[int, int]) -> List[str]:
+    """
+    Statements that turn the plain table into a partitioned one (run in a
+    single transaction, in a maintenance window: rows are copied). The primary
+    key becomes (id, fecha_consulta), as Postgres requires the partition key in
+    it; id keeps its sequence. Rows with no fecha_consulta go to the default
+    partition dated 1970-01-01.
+    """
+    sentencias = [
+        f"ALTER TABLE {TABLA} RENAME TO {TABLA}_sin_particionar",
+        f"ALTER INDEX IF EXISTS ix_{TABLA}_id RENAME TO ix_{TABLA}_sin_particionar_id",
+        f"ALTER INDEX IF EXISTS ix_{TABLA}_identificacion RENAME TO ix_{TABLA}_sin_particionar_identificacion",
+        f"ALTER INDEX IF EXISTS ix_{TABLA}_fecha_proveedor_status RENAME TO ix_{TABLA}_sin_particionar_fecha_proveedor_status",
+        f"""CREATE TABLE {TABLA} (
+            id INTEGER NOT NULL DEFAULT nextval('{TABLA}_id_seq'),
+            fecha_consulta TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            identificacion VARCHAR(50),
+            endpoint VARCHAR(100),
+            status_code INTEGER,
+            llamada_externa BOOLEAN,
+            proveedor VARCHAR(50),
+            mensaje_error VARCHAR(500),
+            ip_origen VARCHAR(50),
+            usuario VARCHAR(100),
+            PRIMARY KEY (id, fecha_consulta)
+        ) PARTITION BY RANGE (fecha_consulta)""",
+        f"CREATE INDEX ix_{TABLA}_identificacion ON {TABLA} (identificacion)",
+        f"CREATE INDEX ix_{TABLA}_fecha_proveedor_status ON {TABLA} (fecha_consulta, proveedor, status_code)",
+        f"CREATE TABLE {PARTICION_DEFECTO} PARTITION OF {TABLA} DEFAULT",
+    ]
+    anio, mes = desde
+    while (anio, mes) <= hasta:
+        sentencias.append(ddl_particion(anio, mes))
+        anio, mes = mes_siguiente(anio, mes)
+    sentencias += [
+        f"""INSERT INTO {TABLA} (id, fecha_consulta, identificacion, endpoint, status_code,
+                llamada_externa, proveedor, mensaje_error, ip_origen, usuario)
+            SELECT id, COALESCE(fecha_consulta, '1970-01-01'), identificacion, endpoint, status_code,
+                llamada_externa, proveedor, mensaje_error, ip_origen, usuario
+            FROM {TABLA}_sin_particionar""",
+        # Before the drop: the sequence belongs to the old table's column
+        f"ALTER SEQUENCE {TABLA}_id_seq OWNED BY {TABLA}.id",
+        f"DROP TABLE {TABLA}_sin_particionar",
+    ]
+    return sentencias
+
+
+async def es_particionada(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = await conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabla)"), {"tabla": TABLA})
+    return relkind == "p"
+
+
+async def _crear_particion(conn: AsyncConnection, anio: int, mes: int) -> None:
+    nombre = nombre_particion(anio, mes)
+    if await conn.scalar(text("SELECT to_regclass(:p) IS NOT NULL"), {"p": nombre}):
+        return
+    desde, hasta = rango_mes(anio, mes)
+    rango = {"desde": desde, "hasta": hasta}
+    filtro = "fecha_consulta >= :desde AND fecha_consulta < :hasta"
+    if not await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFECTO} WHERE {filtro})"), rango):
+        await conn.execute(text(ddl_particion(anio, mes)))
+        return
+
+    # Rows of this month already landed in the default partition, and Postgres
+    # refuses a new partition that would leave them there: build the table
+    # standalone, move them over, then attach it
+    await conn.execute(text(f"CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS)"))
+    movidas = await conn.execute(text(
+        f"WITH movidas AS (DELETE FROM {PARTICION_DEFECTO} WHERE {filtro} RETURNING *) "
+        f"INSERT INTO {nombre} SELECT * FROM movidas"
+    ), rango)
+    await conn.execute(text(f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} {_limites(anio, mes)}"))
+    logger.warning(f"Moved {movidas.rowcount} trazabilidad rows from {PARTICION_DEFECTO} into {nombre}")
+
+
+async def asegurar_particiones(conn: AsyncConnection, meses_adelante: int) -> None:
+    """
+    Creates the partitions of the current month and the next meses_adelante
+    ones (no-op unless the table is partitioned). Rows that arrive for a month
+    without partition land in the default one, and are moved into the month's
+    partition when it is created. A month that cannot be created is logged and
+    skipped (its rows stay in the default partition) rather than failing startup.
+    """
+    if not await es_particionada(conn):
+        return
+    hoy = datetime.datetime.now(datetime.timezone.utc)
+    for n in range(meses_adelante + 1):
+        anio, mes = sumar_meses(hoy.year, hoy.month, n)
+        try:
+            async with conn.begin_nested():
+                await _crear_particion(conn, anio, mes)
+        except Exception as e:
+            logger.error(f"Could not create partition {nombre_particion(anio, mes)}: {e}")
+    logger.info(f"Trazabilidad partitions ensured up to {meses_adelante} months ahead")
@@ -1,16 +1,61 @@
+from typing import Any, Dict
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
+from app.db.monitoreo import PoolMedido, registrar_consultas_lentas
+
+
+def _opciones_engine(url: str) -> Dict[str, Any]:
+    """
+    create_async_engine() arguments for the configured database: Postgres
+    (asyncpg) takes the DB_* pool, statement cache and timeout settings;
+    SQLite its own smaller pool and a busy timeout.
+    """
+    if url.startswith("sqlite"):
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite+aiosqlite:"):
+            # One shared connection: each new one would be a different empty database
+            return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        return {
+            "poolclass": PoolMedido,
+            "pool_size": settings.DB_SQLITE_POOL_SIZE,
+            "max_overflow": settings.DB_SQLITE_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "connect_args": {"check_same_thread": False, "timeout": settings.DB_SQLITE_BUSY_TIMEOUT_SECONDS},
+        }
+
+    connect_args: Dict[str, Any] = {}
+    if "asyncpg" in url:
+        connect_args = {
+            # SQLAlchemy's prepared statement cache and asyncpg's own one
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {
+                "application_name": settings.PROJECT_NAME,
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+            },
+        }
+    return {
+        "poolclass": PoolMedido,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
 
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    **_opciones_engine(settings.DATABASE_URL)
 )
+registrar_consultas_lentas(engine.sync_engine, settings.DB_SLOW_QUERY_MS)
 
 AsyncSessionLocal = async_sessionmaker(
-    engine, 
-    class_=AsyncSession, 
+    engine,
+    class_=AsyncSession,
     expire_on_commit=False
 )
 
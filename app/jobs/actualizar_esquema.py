@@ -0,0 +1,37 @@
+"""
+Brings a database created by an earlier version up to the current models:
+adds missing columns and indexes to existing tables and backfills derived
+columns (see app.db.migraciones). The API and app.worker run it at startup;
+this runs it on its own, e.g. before a rolling deploy.
+
+Usage: python -m app.jobs.actualizar_esquema [--sql]
+"""
+import argparse
+import asyncio
+from loguru import logger
+
+from app.db.migraciones import actualizar_esquema, ddl_pendiente
+from app.db.session import Base, engine
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Upgrade the database schema to the current models")
+    parser.add_argument("--sql", action="store_true", help="Print the pending DDL instead of running it")
+    args = parser.parse_args()
+
+    try:
+        if args.sql:
+            async with engine.connect() as conn:
+                sentencias = await conn.run_sync(ddl_pendiente)
+            print(";\n".join(sentencias) + ";" if sentencias else "-- schema is up to date")
+            return
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await actualizar_esquema(conn)
+        logger.info("Schema up to date")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
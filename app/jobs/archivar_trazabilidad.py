@@ -0,0 +1,184 @@
+"""
+Moves whole months of trazabilidad older than TRAZABILIDAD_MESES_EN_BD to the
+on-disk archive (zstd Parquet, written with pyarrow; see
+app.services.archivo_trazabilidad), then removes them from the database: on a
+partitioned Postgres table the month's partition is detached and dropped,
+elsewhere its rows are deleted. The dashboard CSV export still reads them.
+Also creates the coming months' partitions.
+
+Usage: python -m app.jobs.archivar_trazabilidad [--meses 12] [--lote 5000] [--dry-run]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import MetaData, Select, and_, delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.db.particiones import (
+    asegurar_particiones, es_particionada, mes_siguiente, nombre_particion, rango_mes, sumar_meses
+)
+from app.db.session import engine
+from app.models.vehiculo import Trazabilidad
+from app.services.archivo_trazabilidad import PYARROW_AVAILABLE, EscritorMes
+
+tabla = Trazabilidad.__table__
+
+
+async def _exportar(conn: AsyncConnection, anio: int, mes: int, stmt: Select, lote: int) -> Tuple[int, Optional[str]]:
+    """
+    Streams stmt's rows (server-side cursor, newest first: the order exports
+    read them back in) into a new archive part. Returns (rows, path); no file
+    when there were no rows.
+    """
+    escritor = EscritorMes(anio, mes)
+    try:
+        result = await conn.stream(
+            stmt.order_by(text("fecha_consulta DESC, id DESC")).execution_options(yield_per=lote)
+        )
+        async for filas in result.mappings().partitions(lote):
+            escritor.escribir([dict(f) for f in filas])
+    except BaseException:
+        escritor.descartar()
+        raise
+    if not escritor.filas:
+        escritor.descartar()
+        return 0, None
+    return escritor.filas, escritor.cerrar()
+
+
+async def _particiones_sueltas(conn: AsyncConnection) -> List[Tuple[int, int]]:
+    result = await conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND relname ~ :patron"
+    ), {"patron": f"^{tabla.name}_y[0-9]{{4}}m[0-9]{{2}}$"})
+    nombres = sorted(result.scalars())
+    return [(int(n[-7:-3]), int(n[-2:])) for n in nombres]
+
+
+async def _archivar_particion(anio: int, mes: int, lote: int) -> int:
+    """
+    Partitioned Postgres: the month's partition is detached first, so no row
+    can be added to it while it is exported, then dropped. A partition left
+    detached by an interrupted run is picked up as is.
+    """
+    particion = nombre_particion(anio, mes)
+    async with engine.begin() as conn:
+        adjunta = await conn.scalar(
+            text("SELECT relispartition FROM pg_class WHERE oid = to_regclass(:p)"), {"p": particion}
+        )
+        if adjunta is None:
+            return 0
+        if adjunta:
+            await conn.execute(text(f"ALTER TABLE {tabla.name} DETACH PARTITION {particion}"))
+
+    origen = tabla.to_metadata(MetaData(), name=particion)
+    async with engine.connect() as conn:
+        filas, ruta = await _exportar(conn, anio, mes, select(origen), lote)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE {particion}"))
+    if ruta:
+        logger.info(f"{anio:04d}-{mes:02d}: {filas} rows of {particion} archived to {ruta}")
+    return filas
+
+
+async def _archivar_rango(anio: int, mes: int, lote: int) -> int:
+    """
+    Unpartitioned table (or rows left in the default partition): export and
+    delete in one transaction, both bounded by the highest id present when it
+    started. On Postgres it runs at REPEATABLE READ, so the delete sees the
+    same snapshot the export read; SQLite serializes it anyway. Rows added
+    meanwhile (late audit flushes) stay for the next run.
+    """
+    inicio, fin = rango_mes(anio, mes)
+    en_mes = and_(tabla.c.fecha_consulta >= inicio, tabla.c.fecha_consulta < fin)
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            ultimo_id = await conn.scalar(select(func.max(tabla.c.id)).where(en_mes))
+            if ultimo_id is None:
+                return 0
+            condicion = and_(en_mes, tabla.c.id <= ultimo_id)
+            filas, ruta = await _exportar(conn, anio, mes, select(tabla).where(condicion), lote)
+            try:
+                # Only once the archive file is in place
+                await conn.execute(delete(tabla).where(condicion))
+            except BaseException:
+                # The rows stay in the database: drop the copy so they are not archived twice
+                if ruta:
+                    os.remove(ruta)
+                raise
+    if ruta:
+        logger.info(f"{anio:04d}-{mes:02d}: {filas} rows archived to {ruta}")
+    return filas
+
+
+async def archivar(meses_en_bd: int, lote: int = 5000, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Returns counters: meses, filas.
+    """
+    if not PYARROW_AVAILABLE and not dry_run:
+        # Nothing is deleted from the database unless it can be archived as Parquet
+        raise RuntimeError("Archiving trazabilidad needs pyarrow (pip install -r requirements.txt)")
+    contadores = {"meses": 0, "filas": 0}
+    hoy = datetime.datetime.now(datetime.timezone.utc)
+    corte = rango_mes(*sumar_meses(hoy.year, hoy.month, -meses_en_bd))[0]
+
+    async with engine.begin() as conn:
+        await asegurar_particiones(conn, settings.TRAZABILIDAD_PARTICIONES_ADELANTE)
+        particionada = await es_particionada(conn)
+        sueltas = await _particiones_sueltas(conn) if particionada else []
+        primera = await conn.scalar(select(func.min(tabla.c.fecha_consulta)).where(tabla.c.fecha_consulta < corte))
+
+    # Partitions detached by an interrupted run (no longer visible from the parent)
+    for anio, mes in sueltas:
+        if dry_run:
+            logger.info(f"{nombre_particion(anio, mes)}: detached partition would be archived")
+            continue
+        contadores["meses"] += 1
+        contadores["filas"] += await _archivar_particion(anio, mes, lote)
+
+    if primera is None:
+        logger.info(f"Nothing to archive before {corte:%Y-%m}")
+        return contadores
+
+    anio, mes = primera.year, primera.month
+    while rango_mes(anio, mes)[0] < corte:
+        inicio, fin = rango_mes(anio, mes)
+        async with engine.connect() as conn:
+            filas = await conn.scalar(
+                select(func.count()).select_from(tabla)
+                .where(tabla.c.fecha_consulta >= inicio, tabla.c.fecha_consulta < fin)
+            )
+        if filas:
+            if dry_run:
+                logger.info(f"{anio:04d}-{mes:02d}: {filas} rows would be archived")
+            else:
+                # Partition first: what is left on the parent afterwards sits in the default one
+                filas = await _archivar_particion(anio, mes, lote) if particionada else 0
+                filas += await _archivar_rango(anio, mes, lote)
+            contadores["meses"] += 1
+            contadores["filas"] += filas
+        anio, mes = mes_siguiente(anio, mes)
+    return contadores
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive old trazabilidad months to disk")
+    parser.add_argument("--meses", type=int, default=settings.TRAZABILIDAD_MESES_EN_BD, help="Months kept in the database")
+    parser.add_argument("--lote", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        contadores = await archivar(args.meses, args.lote, args.dry_run)
+        logger.info(f"Trazabilidad archive {'(dry run) ' if args.dry_run else ''}finished: {contadores}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Removes superseded PDF renders: stored objects no study's url_pdf points to
+any more (re-normalized studies, template changes, pre-sharding files), plus
+temporary files left by renders that timed out. Anything younger than the
+grace period is kept, since a render may not be recorded yet.
+
+Usage: python -m app.jobs.gc_pdfs [--gracia-horas 24] [--lote 500] [--dry-run]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+from typing import Dict, List
+from loguru import logger
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.models.vehiculo import VehiculoEstudio
+from app.services.pdf_storage import DIRECTORIO_RENDER, ObjetoPdf, almacen_pdf
+
+
+async def _referenciadas(urls: List[str]) -> set:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(VehiculoEstudio.url_pdf).where(VehiculoEstudio.url_pdf.in_(urls)))
+        return set(result.scalars())
+
+
+async def _barrer_lote(lote: List[ObjetoPdf], dry_run: bool, contadores: Dict[str, int]) -> None:
+    # One query per batch instead of loading every url_pdf in memory
+    referenciadas = await _referenciadas([o.url for o in lote])
+    for objeto in lote:
+        if objeto.url in referenciadas:
+            contadores["conservados"] += 1
+            continue
+        if not dry_run:
+            await almacen_pdf.eliminar(objeto.url)
+        contadores["eliminados"] += 1
+        contadores["bytes_liberados"] += objeto.tamaño_bytes
+
+
+def _limpiar_temporales(limite: datetime.datetime, dry_run: bool) -> int:
+    eliminados = 0
+    for archivo in os.listdir(DIRECTORIO_RENDER):
+        ruta = os.path.join(DIRECTORIO_RENDER, archivo)
+        modificado = datetime.datetime.fromtimestamp(os.path.getmtime(ruta), datetime.timezone.utc)
+        if modificado < limite:
+            if not dry_run:
+                os.remove(ruta)
+            eliminados += 1
+    return eliminados
+
+
+async def gc_pdfs(gracia_horas: int, lote: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Walks the storage backend once. Returns counters: eliminados, conservados,
+    recientes, bytes_liberados, temporales.
+    """
+    limite = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=gracia_horas)
+    contadores = {"eliminados": 0, "conservados": 0, "recientes": 0, "bytes_liberados": 0}
+
+    pendientes: List[ObjetoPdf] = []
+    async for objeto in almacen_pdf.listar():
+        if objeto.modificado >= limite:
+            contadores["recientes"] += 1
+            continue
+        pendientes.append(objeto)
+        if len(pendientes) >= lote:
+            await _barrer_lote(pendientes, dry_run, contadores)
+            pendientes = []
+    if pendientes:
+        await _barrer_lote(pendientes, dry_run, contadores)
+
+    contadores["temporales"] = await asyncio.to_thread(_limpiar_temporales, limite, dry_run)
+    return contadores
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Remove PDF renders no study references")
+    parser.add_argument("--gracia-horas", type=int, default=settings.PDF_GC_GRACIA_HORAS)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be removed")
+    args = parser.parse_args()
+
+    try:
+        contadores = await gc_pdfs(args.gracia_horas, args.lote, args.dry_run)
+        logger.info(f"PDF GC finished{' (dry run)' if args.dry_run else ''}: {contadores}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+One-off conversion of trazabilidad into a table partitioned by month
+(Postgres only), so date-range queries only touch the months they ask for and
+old months can be detached by app.jobs.archivar_trazabilidad.
+
+Usage: python -m app.jobs.particionar_trazabilidad [--meses-adelante 3] [--sql]
+"""
+import argparse
+import asyncio
+import datetime
+from loguru import logger
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.particiones import TABLA, ddl_conversion, es_particionada, sumar_meses
+from app.db.session import engine
+
+
+async def particionar(meses_adelante: int, solo_sql: bool = False) -> None:
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise RuntimeError("Trazabilidad partitioning needs Postgres")
+        if await es_particionada(conn):
+            logger.info("trazabilidad is already partitioned")
+            return
+
+        hoy = datetime.datetime.now(datetime.timezone.utc)
+        primera = await conn.scalar(text(f"SELECT min(fecha_consulta) FROM {TABLA}")) or hoy
+        sentencias = ddl_conversion(
+            (primera.year, primera.month),
+            sumar_meses(hoy.year, hoy.month, meses_adelante)
+        )
+        if solo_sql:
+            print(";\n\n".join(sentencias) + ";")
+            return
+        for sentencia in sentencias:
+            await conn.execute(text(sentencia))
+        logger.info(f"trazabilidad partitioned by month ({len(sentencias)} statements)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Partition trazabilidad by month (Postgres)")
+    parser.add_argument("--meses-adelante", type=int, default=settings.TRAZABILIDAD_PARTICIONES_ADELANTE)
+    parser.add_argument("--sql", action="store_true", help="Print the DDL instead of running it")
+    args = parser.parse_args()
+
+    try:
+        await particionar(args.meses_adelante, args.sql)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Re-normalizes studies stamped with an older NORMALIZER_VERSION from the raw
+payload archive. Never calls a provider.
+
+Usage: python -m app.jobs.renormalizar [--lote 200] [--workers 4] [--todos]
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import select, or_
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.models.vehiculo import VehiculoEstudio, PayloadProveedor
+from app.services.normalizer import normalize_provider_dicts, NORMALIZER_VERSION
+from app.services.payload_archive import descomprimir_payload
+from app.services.estudio_service import aplicar_normalizacion
+
+
+def _normalizar_payload(proveedor: str, codificacion: str, blob: bytes) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+    """
+    Runs in a worker process: decompress + normalize, returning plain dicts (picklable).
+    """
+    payload = descomprimir_payload(blob, codificacion)
+    return normalize_provider_dicts(proveedor, {"status": "success", "data": payload})
+
+
+async def _ultimos_payloads(db, identificaciones: List[str]) -> Dict[str, PayloadProveedor]:
+    """
+    Latest archived payload per VIN, in one query for the whole batch.
+    """
+    stmt = (
+        select(PayloadProveedor)
+        .where(PayloadProveedor.identificacion.in_(identificaciones))
+        .order_by(PayloadProveedor.fecha_obtencion.desc(), PayloadProveedor.id.desc())
+    )
+    result = await db.execute(stmt)
+    ultimos = {}
+    for payload in result.scalars():
+        ultimos.setdefault(payload.identificacion, payload)
+    return ultimos
+
+
+async def renormalizar_estudios(lote: int, workers: Optional[int] = None, todos: bool = False) -> Dict[str, int]:
+    """
+    Walks stale studies in id order, one batch per transaction.
+    Returns counters: actualizados, sin_payload, errores.
+    """
+    contadores = {"actualizados": 0, "sin_payload": 0, "errores": 0}
+    loop = asyncio.get_running_loop()
+    ultimo_id = 0
+
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        while True:
+            async with AsyncSessionLocal() as db:
+                stmt = select(VehiculoEstudio).where(VehiculoEstudio.id > ultimo_id)
+                if not todos:
+                    stmt = stmt.where(or_(
+                        VehiculoEstudio.version_normalizador.is_(None),
+                        VehiculoEstudio.version_normalizador != NORMALIZER_VERSION
+                    ))
+                estudios = (await db.execute(stmt.order_by(VehiculoEstudio.id).limit(lote))).scalars().all()
+                if not estudios:
+                    break
+                ultimo_id = estudios[-1].id
+
+                payloads = await _ultimos_payloads(db, [e.identificacion for e in estudios])
+                pendientes = []
+                for estudio in estudios:
+                    payload = payloads.get(estudio.identificacion)
+                    if payload is None:
+                        contadores["sin_payload"] += 1
+                        continue
+                    future = loop.run_in_executor(
+                        pool, _normalizar_payload, payload.proveedor, payload.codificacion, payload.payload
+                    )
+                    pendientes.append((estudio, future))
+
+                resultados = await asyncio.gather(*(f for _, f in pendientes), return_exceptions=True)
+                for (estudio, _), resultado in zip(pendientes, resultados):
+                    if isinstance(resultado, Exception):
+                        contadores["errores"] += 1
+                        logger.error(f"Re-normalization failed for {estudio.identificacion}: {resultado}")
+                        continue
+                    aplicar_normalizacion(estudio, *resultado)
+                    contadores["actualizados"] += 1
+
+                await db.commit()
+                logger.info(f"Re-normalized batch up to id {ultimo_id}: {contadores}")
+
+    return contadores
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-normalize stale studies from the raw payload archive")
+    parser.add_argument("--lote", type=int, default=settings.RENORMALIZACION_LOTE)
+    parser.add_argument("--workers", type=int, default=settings.RENORMALIZACION_WORKERS or os.cpu_count())
+    parser.add_argument("--todos", action="store_true", help="Re-normalize every study, not only stale ones")
+    args = parser.parse_args()
+
+    try:
+        contadores = await renormalizar_estudios(args.lote, args.workers, args.todos)
+        logger.info(f"Re-normalization finished (version {NORMALIZER_VERSION}): {contadores}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Float, JSON, LargeBinary, Index
 from datetime import datetime, timezone
 from app.db.session import Base
 
@@ -14,18 +14,51 @@ class VehiculoEstudio(Base):
     # Store dynamic metadata as JSON
     especificaciones_vehiculo = Column(JSON, nullable=True)
     detalle_estudio = Column(JSON, nullable=True)
+    # detalleEstudio.comprobacionDeProblemas packed by problemas_bitmask (the JSON keeps null);
+    # NULL when the provider returned no brand checks
+    problemas_bitmask = Column(BigInteger, nullable=True, index=True)
+    
+    # Version of normalizer.py that produced the JSON columns above (see NORMALIZER_VERSION)
+    version_normalizador = Column(String(20), nullable=True)
+    # EstudioCompletoResponse JSON without "pdf", encoded once when the columns above change
+    respuesta_serializada = Column(LargeBinary, nullable=True)
     
     # PDF storage references
     url_pdf = Column(String(500), nullable=True) # Could be S3 link or local path
     pdf_hash = Column(String(100), nullable=True)
     pdf_size_bytes = Column(Integer, nullable=True)
+    # pdf_generator.TEMPLATE_VERSION the stored PDF was rendered with
+    version_plantilla_pdf = Column(String(20), nullable=True)
     
     # Timestamps
     ultima_fecha_estudio = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     ya_facturado_previamente = Column(Boolean, default=False)
 
+class PayloadProveedor(Base):
+    """
+    Raw provider response (zlib-compressed JSON), kept so studies can be
+    re-normalized offline when a mapping changes.
+    """
+    __tablename__ = "payload_proveedor"
+    __table_args__ = (
+        Index("ix_payload_proveedor_vin_proveedor_fecha", "identificacion", "proveedor", "fecha_obtencion"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    identificacion = Column(String(50), nullable=False)
+    proveedor = Column(String(50), nullable=False) # VinAudit, Vincario
+    fecha_obtencion = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    codificacion = Column(String(20), default="zlib")
+    payload = Column(LargeBinary, nullable=False)
+    tamano_original = Column(Integer, nullable=True)
+
 class Trazabilidad(Base):
     __tablename__ = "trazabilidad"
+    # Every dashboard query is a fecha_consulta range, optionally by provider/status.
+    # On Postgres the table can be partitioned by month (app.jobs.particionar_trazabilidad).
+    __table_args__ = (
+        Index("ix_trazabilidad_fecha_proveedor_status", "fecha_consulta", "proveedor", "status_code"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     fecha_consulta = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -37,3 +70,51 @@ class Trazabilidad(Base):
     mensaje_error = Column(String(500), nullable=True)
     ip_origen = Column(String(50), nullable=True)
     usuario = Column(String(100), nullable=True)
+
+class ReservaEstudio(Base):
+    """
+    Cross-worker claim on a VIN whose study is being fetched from a provider.
+    The unique identificacion makes the INSERT the lock; rows are removed when the
+    study is saved or the fetch fails, and expire if the owner dies.
+    """
+    __tablename__ = "reserva_estudio"
+
+    identificacion = Column(String(50), primary_key=True)
+    propietario = Column(String(100), nullable=False) # host:pid of the worker holding the claim
+    fecha_reserva = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    fecha_expiracion = Column(DateTime, nullable=False)
+
+class EstudioJob(Base):
+    """
+    Asynchronous study request (POST /vehiculos/estudios/jobs), processed by the job workers.
+    """
+    __tablename__ = "estudio_job"
+    __table_args__ = (
+        Index("ix_estudio_job_estado_disponible", "estado", "bloqueado_hasta"),
+    )
+
+    id = Column(String(36), primary_key=True) # uuid4
+    estado = Column(String(20), nullable=False, default="pendiente") # pendiente, en_proceso, completado, fallido
+    tipo_identificacion = Column(String(20), nullable=False)
+    identificacion = Column(String(50), nullable=False, index=True)
+    webhook_url = Column(String(500), nullable=True)
+    usuario = Column(String(100), nullable=True)
+    ip_origen = Column(String(50), nullable=True)
+
+    # Lease / retry scheduling: the job is not picked up again before this instant
+    bloqueado_hasta = Column(DateTime, nullable=True)
+    intentos = Column(Integer, default=0)
+
+    # Outcome
+    estudio_id = Column(Integer, nullable=True)
+    llamada_externa = Column(Boolean, default=False)
+    proveedor = Column(String(50), nullable=True)
+    pdf_hash = Column(String(100), nullable=True)
+    pdf_size_bytes = Column(Integer, nullable=True)
+    codigo_error = Column(String(50), nullable=True)
+    mensaje_error = Column(String(500), nullable=True)
+    webhook_estado = Column(String(20), nullable=True) # enviado, fallido
+
+    fecha_creacion = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    fecha_inicio = Column(DateTime, nullable=True)
+    fecha_fin = Column(DateTime, nullable=True)
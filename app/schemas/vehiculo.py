@@ -148,7 +148,8 @@ class DetalleEstudio(BaseModel):
     model_config = ConfigDict(extra="allow")
 
 class PdfInfo(BaseModel):
-    content: Optional[str] = None
+    content: Optional[str] = Field(None, description="PDF en base64, solo con pdfInline=true o campos=pdf.content")
+    url: Optional[str] = Field(None, description="Descarga del PDF: GET /vehiculos/estudios/{identificacion}/pdf")
     tamañoBytes: Optional[int] = None
     hash: Optional[str] = None
     fechaGeneracion: Optional[datetime] = None
@@ -164,4 +165,56 @@ class EstudioCompletoResponse(EstudioBaseResponse):
     esEstudioSinRegistros: bool = False
     especificacionesVehiculo: Optional[EspecificacionesVehiculo] = None
     detalleEstudio: Optional[DetalleEstudio] = None
+    problemasBitmask: Optional[int] = Field(
+        None, description="comprobacionDeProblemas empaquetado, bit i = campo i de ComprobacionProblemas"
+    )
     pdf: Optional[PdfInfo] = None
+
+class EstudioLoteRequest(BaseModel):
+    tipoIdentificacion: str = Field(..., description="VIN, CHASIS, SERIE")
+    identificaciones: List[str] = Field(..., min_length=1, description="Lista de VINs/chasis/números de serie")
+
+class ExportacionPdfRequest(BaseModel):
+    """
+    Studies to export: a list of identifiers, a range of study dates, or both.
+    """
+    tipoIdentificacion: str = Field("VIN", description="VIN, CHASIS, SERIE")
+    identificaciones: Optional[List[str]] = Field(None, description="Lista de VINs/chasis/números de serie")
+    desde: Optional[datetime] = Field(None, description="ultimaFechaEstudio desde (inclusive)")
+    hasta: Optional[datetime] = Field(None, description="ultimaFechaEstudio hasta (exclusive)")
+
+class EstudioLoteItem(BaseModel):
+    """
+    One NDJSON line of the batch response.
+    """
+    identificacion: str
+    estado: str = Field(..., description="ok | error")
+    origen: Optional[str] = Field(None, description="Cache, VinAudit, Vincario")
+    estudio: Optional[EstudioCompletoResponse] = None
+    error: Optional[dict] = None
+
+class EstudioJobRequest(BaseModel):
+    tipoIdentificacion: str = Field(..., description="VIN, CHASIS, SERIE")
+    identificacion: str = Field(..., description="El valor del VIN/chasis/número de serie")
+    webhookUrl: Optional[str] = Field(None, description="URL que recibe un POST firmado al terminar el job")
+
+class EstudioJobResponse(BaseModel):
+    jobId: str
+    estado: str = Field(..., description="pendiente | en_proceso | completado | fallido")
+    identificacion: str
+    fechaCreacion: Optional[datetime] = None
+    fechaFin: Optional[datetime] = None
+    intentos: int = 0
+    error: Optional[dict] = None
+    estudio: Optional[EstudioCompletoResponse] = None
+
+class EstudioProblemasItem(BaseModel):
+    tipoIdentificacion: str
+    identificacion: str
+    problemasBitmask: int
+    problemas: List[str] = Field(..., description="Campos de ComprobacionProblemas activos")
+
+class EstudioProblemasResponse(BaseModel):
+    mascara: int
+    modo: str = Field(..., description="alguno | todos")
+    estudios: List[EstudioProblemasItem]
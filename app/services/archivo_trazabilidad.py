@@ -0,0 +1,147 @@
+import csv
+import datetime
+import gzip
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.db.particiones import rango_mes
+
+# pyarrow (in requirements.txt) writes the archive as Parquet (columnar, zstd).
+# Guarded so the API still starts without it; archiving refuses to run then.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ARCHIVO_DIR = settings.TRAZABILIDAD_ARCHIVO_DIR or os.path.join(BASE_DIR, "storage", "archivo_trazabilidad")
+
+COLUMNAS = [
+    "id", "fecha_consulta", "identificacion", "endpoint", "status_code", "llamada_externa",
+    "proveedor", "mensaje_error", "ip_origen", "usuario",
+]
+
+if PYARROW_AVAILABLE:
+    ESQUEMA = pa.schema([
+        ("id", pa.int64()),
+        ("fecha_consulta", pa.timestamp("us")),
+        ("identificacion", pa.string()),
+        ("endpoint", pa.string()),
+        ("status_code", pa.int32()),
+        ("llamada_externa", pa.bool_()),
+        ("proveedor", pa.string()),
+        ("mensaje_error", pa.string()),
+        ("ip_origen", pa.string()),
+        ("usuario", pa.string()),
+    ])
+
+
+def directorio_mes(anio: int, mes: int) -> str:
+    # Hive-style layout, readable as one dataset by DuckDB/Spark/pyarrow
+    return os.path.join(ARCHIVO_DIR, f"anio={anio:04d}", f"mes={mes:02d}")
+
+
+def meses_archivados() -> List[Tuple[int, int]]:
+    """
+    Archived months, newest first.
+    """
+    meses = []
+    if not os.path.isdir(ARCHIVO_DIR):
+        return meses
+    for anio_dir in os.listdir(ARCHIVO_DIR):
+        if not anio_dir.startswith("anio="):
+            continue
+        for mes_dir in os.listdir(os.path.join(ARCHIVO_DIR, anio_dir)):
+            if mes_dir.startswith("mes="):
+                meses.append((int(anio_dir[5:]), int(mes_dir[4:])))
+    return sorted(meses, reverse=True)
+
+
+class EscritorMes:
+    """
+    Writes one month of rows, batch by batch (Parquet row groups), to a temp
+    file that cerrar() moves into place. Nothing is visible to readers until then.
+    """
+
+    def __init__(self, anio: int, mes: int):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("Archiving trazabilidad needs pyarrow (pip install -r requirements.txt)")
+        directorio = directorio_mes(anio, mes)
+        os.makedirs(directorio, exist_ok=True)
+        # Several parts per month are possible (separate runs, partition + default rows)
+        parte = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self.ruta = os.path.join(directorio, f"trazabilidad-{parte}.parquet")
+        self._tmp = f"{self.ruta}.tmp"
+        self.filas = 0
+        self._writer = pq.ParquetWriter(self._tmp, ESQUEMA, compression="zstd")
+
+    def escribir(self, filas: List[Dict[str, Any]]) -> None:
+        if not filas:
+            return
+        self._writer.write_table(pa.Table.from_pylist(filas, schema=ESQUEMA))
+        self.filas += len(filas)
+
+    def cerrar(self) -> str:
+        self._writer.close()
+        os.replace(self._tmp, self.ruta)
+        return self.ruta
+
+    def descartar(self) -> None:
+        try:
+            self.cerrar()
+        finally:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+
+
+def _desde_csv(fila: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        **{c: (fila[c] or None) for c in COLUMNAS},
+        "id": int(fila["id"]),
+        "fecha_consulta": datetime.datetime.fromisoformat(fila["fecha_consulta"]) if fila["fecha_consulta"] else None,
+        "status_code": int(fila["status_code"]) if fila["status_code"] else None,
+        "llamada_externa": fila["llamada_externa"] == "True",
+    }
+
+
+def _leer_parte(ruta: str) -> Iterable[Dict[str, Any]]:
+    if ruta.endswith(".parquet"):
+        if not PYARROW_AVAILABLE:
+            logger.warning(f"Skipping {ruta}: reading Parquet archives needs pyarrow")
+            return
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=5000):
+            yield from lote.to_pylist()
+    elif ruta.endswith(".csv.gz"):
+        # Parts written by earlier versions, which fell back to gzip CSV without pyarrow
+        with gzip.open(ruta, "rt", encoding="utf-8", newline="") as f:
+            for fila in csv.DictReader(f):
+                yield _desde_csv(fila)
+
+
+def leer_archivados(
+    desde: Optional[datetime.datetime] = None,
+    hasta: Optional[datetime.datetime] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Archived rows with desde <= fecha_consulta <= hasta (naive UTC), newest
+    month first; within a month, in the order they were archived (newest first).
+    Streams part by part, so memory does not depend on the archive size.
+    """
+    for anio, mes in meses_archivados():
+        inicio, fin = rango_mes(anio, mes)
+        if (desde is not None and fin <= desde) or (hasta is not None and inicio > hasta):
+            continue
+        directorio = directorio_mes(anio, mes)
+        for parte in sorted(os.listdir(directorio), reverse=True):
+            for fila in _leer_parte(os.path.join(directorio, parte)):
+                fecha = fila["fecha_consulta"]
+                if desde is not None and fecha is not None and fecha < desde:
+                    continue
+                if hasta is not None and fecha is not None and fecha > hasta:
+                    continue
+                yield fila
@@ -0,0 +1,71 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request
+
+from app.models.vehiculo import VehiculoEstudio
+
+# Clients may keep the study but must revalidate before reusing it
+CACHE_CONTROL_ESTUDIOS = "private, no-cache"
+
+
+def _fecha_utc(fecha: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    # DateTime columns come back naive (UTC); freshly created rows still hold the aware default
+    if fecha is None:
+        return None
+    if fecha.tzinfo is None:
+        return fecha.replace(tzinfo=datetime.timezone.utc)
+    return fecha.astimezone(datetime.timezone.utc)
+
+
+def etag_estudio(estudio: VehiculoEstudio, variante: str = "") -> str:
+    """
+    Strong ETag of a study representation. Built from the content version
+    (normalizer version, fetch date, problem flags) and pdf_hash, so it is
+    computed from small columns without encoding or rendering anything.
+    variante tells apart representations of the same study (campos=, problemas=).
+    """
+    fecha = _fecha_utc(estudio.ultima_fecha_estudio)
+    version = "|".join((
+        estudio.identificacion,
+        estudio.version_normalizador or "",
+        fecha.isoformat() if fecha else "",
+        str(estudio.problemas_bitmask),
+        estudio.pdf_hash or "",
+        variante,
+    ))
+    return '"' + hashlib.blake2b(version.encode("utf-8"), digest_size=16).hexdigest() + '"'
+
+
+def cabeceras_cache(etag: str, fecha: Optional[datetime.datetime]) -> Dict[str, str]:
+    cabeceras = {"ETag": etag, "Cache-Control": CACHE_CONTROL_ESTUDIOS}
+    fecha = _fecha_utc(fecha)
+    if fecha is not None:
+        cabeceras["Last-Modified"] = format_datetime(fecha, usegmt=True)
+    return cabeceras
+
+
+def no_modificado(request: Request, etag: str, fecha: Optional[datetime.datetime]) -> bool:
+    """
+    Conditional GET evaluation (RFC 9110 13.2.2): If-None-Match wins over
+    If-Modified-Since, which is only checked when no If-None-Match was sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+        return "*" in etiquetas or etag in etiquetas
+
+    if_modified_since = request.headers.get("if-modified-since")
+    fecha = _fecha_utc(fecha)
+    if if_modified_since is None or fecha is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=datetime.timezone.utc)
+    # HTTP dates have second precision
+    return fecha.replace(microsecond=0) <= desde
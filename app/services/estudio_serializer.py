@@ -0,0 +1,166 @@
+import datetime
+import json
+from typing import Any, Dict, FrozenSet, Optional
+
+from app.models.vehiculo import VehiculoEstudio
+from app.schemas.vehiculo import (
+    EstudioCompletoResponse,
+    EspecificacionesVehiculo,
+    DetalleEstudio,
+    PdfInfo
+)
+from app.services.problemas_bitmask import detalle_con_problemas
+
+# Optional: orjson encodes the per-request fragment (PDF info) without going through Pydantic
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _fecha_utc(fecha: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """
+    Naive UTC, as the DateTime columns return it, so the stored body does not
+    depend on whether the study was serialized before or after a reload.
+    """
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def serializar_estudio(estudio: VehiculoEstudio) -> bytes:
+    """
+    The study's EstudioCompletoResponse JSON without the "pdf" field, validated
+    and encoded once. Stored in VehiculoEstudio.respuesta_serializada whenever
+    the normalized columns change.
+    """
+    respuesta = EstudioCompletoResponse(
+        tipoIdentificacion=estudio.tipo_identificacion,
+        identificacion=estudio.identificacion,
+        tieneEstudios=estudio.tiene_estudios,
+        ultimaFechaEstudio=_fecha_utc(estudio.ultima_fecha_estudio),
+        esEstudioSinRegistros=estudio.es_estudio_sin_registros,
+        especificacionesVehiculo=estudio.especificaciones_vehiculo,
+        detalleEstudio=detalle_con_problemas(estudio.detalle_estudio, estudio.problemas_bitmask),
+        problemasBitmask=estudio.problemas_bitmask
+    )
+    return respuesta.model_dump_json(exclude={"pdf"}).encode("utf-8")
+
+
+def cuerpo_estudio(estudio: VehiculoEstudio) -> bytes:
+    """
+    Stored body of a study, serialized on the fly (and kept on the row, so the
+    caller's commit persists it) for studies saved before the column existed.
+    """
+    if estudio.respuesta_serializada is None:
+        estudio.respuesta_serializada = serializar_estudio(estudio)
+    return estudio.respuesta_serializada
+
+
+def _dumps(valor: Dict[str, Any]) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(valor, option=orjson.OPT_UTC_Z)
+    return json.dumps(valor, default=lambda v: v.isoformat(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def con_pdf(cuerpo: bytes, pdf: Optional[PdfInfo]) -> bytes:
+    """
+    Splices the per-request "pdf" object into a stored body: '{...}' -> '{...,"pdf":{...}}'.
+    """
+    fragmento = _dumps(pdf.model_dump()) if pdf is not None else b"null"
+    return cuerpo[:-1] + b',"pdf":' + fragmento + b"}"
+
+
+# campos= projection: top-level field -> None (whole field) or the requested subfields
+Proyeccion = Dict[str, Optional[FrozenSet[str]]]
+
+ALIAS_CAMPOS = {
+    "especificaciones": "especificacionesVehiculo",
+    "detalle": "detalleEstudio",
+}
+SUBCAMPOS = {
+    "especificacionesVehiculo": frozenset(EspecificacionesVehiculo.model_fields),
+    "detalleEstudio": frozenset(DetalleEstudio.model_fields),
+    "pdf": frozenset(PdfInfo.model_fields),
+}
+# Always returned so projected answers stay self-describing
+CAMPOS_FIJOS = ("tipoIdentificacion", "identificacion")
+
+
+def parsear_campos(campos: str) -> Proyeccion:
+    """
+    "especificaciones,detalle.registrosDeTitulos,pdf.hash" -> projection.
+    Raises ValueError naming the first unknown field.
+    """
+    proyeccion: Dict[str, Optional[set]] = {}
+    for ruta in filter(None, (c.strip() for c in campos.split(","))):
+        campo, _, subcampo = ruta.partition(".")
+        campo = ALIAS_CAMPOS.get(campo, campo)
+        if campo not in EstudioCompletoResponse.model_fields:
+            raise ValueError(f"Campo desconocido: {ruta}")
+        if not subcampo:
+            proyeccion[campo] = None
+            continue
+        if subcampo not in SUBCAMPOS.get(campo, ()):
+            raise ValueError(f"Campo desconocido: {ruta}")
+        if campo not in proyeccion:
+            proyeccion[campo] = set()
+        if proyeccion[campo] is not None:
+            proyeccion[campo].add(subcampo)
+    return {campo: frozenset(sub) if sub is not None else None for campo, sub in proyeccion.items()}
+
+
+def pide(proyeccion: Optional[Proyeccion], campo: str, subcampo: Optional[str] = None) -> bool:
+    """
+    Whether a (sub)field is part of the response; no projection means everything.
+    """
+    if proyeccion is None:
+        return True
+    if campo not in proyeccion:
+        return False
+    return subcampo is None or proyeccion[campo] is None or subcampo in proyeccion[campo]
+
+
+def _recortar(valor: Optional[Dict[str, Any]], subcampos: Optional[FrozenSet[str]]) -> Optional[Dict[str, Any]]:
+    if valor is None or subcampos is None:
+        return valor
+    return {k: v for k, v in valor.items() if k in subcampos}
+
+
+# Projection of the whole response, for the compact problems form without campos=
+TODOS_LOS_CAMPOS: Proyeccion = dict.fromkeys(EstudioCompletoResponse.model_fields)
+
+
+def proyectar_estudio(
+    estudio: VehiculoEstudio,
+    proyeccion: Proyeccion,
+    pdf: Optional[PdfInfo],
+    problemas_compactos: bool = False
+) -> bytes:
+    """
+    Encodes only the projected fields, straight from the row's columns (already in
+    model_dump() shape). Columns that were not requested are never touched, so
+    the caller can leave them deferred. With problemas_compactos the problem flags
+    only travel as problemasBitmask (detalleEstudio.comprobacionDeProblemas is null).
+    """
+    columnas = {
+        "tipoIdentificacion": lambda: estudio.tipo_identificacion,
+        "identificacion": lambda: estudio.identificacion,
+        "tieneEstudios": lambda: estudio.tiene_estudios,
+        "ultimaFechaEstudio": lambda: _fecha_utc(estudio.ultima_fecha_estudio),
+        "esEstudioSinRegistros": lambda: estudio.es_estudio_sin_registros,
+        "especificacionesVehiculo": lambda: estudio.especificaciones_vehiculo,
+        "detalleEstudio": lambda: (
+            estudio.detalle_estudio if problemas_compactos
+            else detalle_con_problemas(estudio.detalle_estudio, estudio.problemas_bitmask)
+        ),
+        "problemasBitmask": lambda: estudio.problemas_bitmask,
+        "pdf": lambda: pdf.model_dump() if pdf is not None else None,
+    }
+    salida: Dict[str, Any] = {}
+    for campo, columna in columnas.items():
+        if campo in CAMPOS_FIJOS or campo in proyeccion:
+            valor = columna()
+            salida[campo] = _recortar(valor, proyeccion.get(campo)) if campo in SUBCAMPOS else valor
+    return _dumps(salida)
@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import os
+import socket
+from typing import Any, Awaitable, Dict, Optional, Tuple
+from loguru import logger
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.exceptions import ProviderError
+from app.db.session import AsyncSessionLocal
+from app.models.vehiculo import VehiculoEstudio, ReservaEstudio
+from app.services.provider_client import orchestrate_vin_search
+from app.services.normalizer import normalize_provider_dicts, NORMALIZER_VERSION
+from app.services.payload_archive import archivar_payload
+from app.services.singleflight import SingleFlight
+from app.services.quota_scheduler import Prioridad, PrioridadCompartida
+from app.services.negative_cache import negative_cache
+from app.services.vin_validator import preparar_identificacion
+from app.services.estudio_serializer import serializar_estudio
+from app.services.problemas_bitmask import a_bitmask
+
+# Followers inside this process await the leader's lookup
+_lookups = SingleFlight()
+# Priority of each lookup in flight, raised by more urgent followers
+_prioridades: Dict[str, PrioridadCompartida] = {}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def obtener_estudio_externo(
+    tipo_identificacion: str,
+    identificacion: str,
+    prioridad: Prioridad = Prioridad.INTERACTIVA
+) -> Tuple[VehiculoEstudio, bool, str]:
+    """
+    Resolves an uncached study with at most one provider call per VIN.
+    Returns: (estudio, llamada_externa, proveedor). Only the caller that paid the
+    provider gets llamada_externa=True; everyone else sees it as a cache hit.
+    Malformed VINs raise InvalidVinError and recent provider failures are replayed
+    from the negative cache (NegativeCacheError) without calling the provider.
+    """
+    identificacion = preparar_identificacion(tipo_identificacion, identificacion)
+    fallo = negative_cache.consultar(identificacion)
+    if fallo is not None:
+        raise fallo
+
+    en_curso = _prioridades.get(identificacion)
+    if en_curso is not None:
+        # Joining a lookup in flight: it is served at the most urgent caller's priority
+        en_curso.elevar(prioridad)
+
+    def liderar() -> Awaitable[Tuple[VehiculoEstudio, str, bool]]:
+        # Registered synchronously, before any follower can look for it
+        compartida = PrioridadCompartida(prioridad)
+        _prioridades[identificacion] = compartida
+        return _liderar(identificacion, _buscar_y_guardar(tipo_identificacion, identificacion, compartida))
+
+    (estudio, proveedor, pagado), compartido = await _lookups.do(identificacion, liderar)
+    if compartido or not pagado:
+        return estudio, False, "Cache"
+    return estudio, True, proveedor
+
+
+def aplicar_normalizacion(
+    estudio: VehiculoEstudio,
+    meta: Dict[str, Any],
+    detalle: Dict[str, Any],
+    es_sin_registros: bool
+) -> None:
+    """
+    Writes dumped normalizer output onto a study, stamps the normalizer version
+    and re-encodes the stored response body.
+    Shared by the live lookup and the offline re-normalization job.
+    """
+    estudio.es_estudio_sin_registros = es_sin_registros
+    estudio.especificaciones_vehiculo = meta
+    # Problem flags are stored packed in their own indexed column
+    estudio.problemas_bitmask = a_bitmask(detalle.get("comprobacionDeProblemas"))
+    estudio.detalle_estudio = {**detalle, "comprobacionDeProblemas": None}
+    estudio.version_normalizador = NORMALIZER_VERSION
+    estudio.respuesta_serializada = serializar_estudio(estudio)
+    # The stored PDF shows the old data; the next request renders (or finds) the new one
+    estudio.url_pdf = None
+    estudio.pdf_hash = None
+    estudio.pdf_size_bytes = None
+
+
+async def _liderar(identificacion: str, busqueda: Awaitable[Tuple[VehiculoEstudio, str, bool]]) -> Tuple[VehiculoEstudio, str, bool]:
+    try:
+        return await busqueda
+    finally:
+        _prioridades.pop(identificacion, None)
+
+
+async def _buscar_y_guardar(
+    tipo_identificacion: str,
+    identificacion: str,
+    prioridad: PrioridadCompartida
+) -> Tuple[VehiculoEstudio, str, bool]:
+    """
+    Leader path: claim the VIN across workers, call the provider, save the study.
+    Uses its own session so it outlives a cancelled leader request.
+    """
+    deadline = asyncio.get_running_loop().time() + settings.ESTUDIO_RESERVA_TTL_SECONDS
+
+    async with AsyncSessionLocal() as db:
+        while True:
+            if await _reclamar(db, identificacion):
+                break
+
+            # Another worker holds the claim: wait for its study to land
+            estudio = await _esperar_estudio(db, identificacion, deadline)
+            if estudio is not None:
+                return estudio, "Cache", False
+            if asyncio.get_running_loop().time() >= deadline:
+                raise TimeoutError(f"Timed out waiting for the in-flight lookup of {identificacion}")
+
+        try:
+            # The study may have been saved between the caller's cache check and our claim
+            estudio = await _buscar_estudio(db, identificacion)
+            if estudio is not None:
+                # Nothing to look up: drop the claim now, not when its TTL runs out
+                await _liberar(db, identificacion)
+                return estudio, "Cache", False
+            # No pooled connection held across the (slow) provider call
+            await db.rollback()
+
+            try:
+                raw_data, proveedor_usado = await orchestrate_vin_search(identificacion, prioridad)
+            except ProviderError as e:
+                negative_cache.registrar(identificacion, e)
+                raise
+            now_utc = datetime.datetime.now(datetime.timezone.utc)
+            if raw_data.get("status") == "success":
+                # Keep the raw body so mapping fixes can be replayed without paying again
+                archivar_payload(db, identificacion, proveedor_usado, raw_data.get("data", {}), now_utc)
+
+            estudio = VehiculoEstudio(
+                tipo_identificacion=tipo_identificacion,
+                identificacion=identificacion,
+                tiene_estudios=True,
+                # url_pdf/pdf_hash/pdf_size_bytes are recorded when the PDF is first rendered
+                ultima_fecha_estudio=now_utc,
+                ya_facturado_previamente=True
+            )
+            meta, detalle, es_sin_registros = normalize_provider_dicts(proveedor_usado, raw_data)
+            aplicar_normalizacion(estudio, meta, detalle, es_sin_registros)
+            db.add(estudio)
+            # Saving the study and releasing the claim is one transaction
+            await db.execute(delete(ReservaEstudio).where(ReservaEstudio.identificacion == identificacion))
+            await db.commit()
+            await db.refresh(estudio)
+            return estudio, proveedor_usado, True
+        except BaseException:
+            await db.rollback()
+            await _liberar(db, identificacion)
+            raise
+
+
+async def _buscar_estudio(db, identificacion: str) -> Optional[VehiculoEstudio]:
+    result = await db.execute(select(VehiculoEstudio).where(VehiculoEstudio.identificacion == identificacion))
+    return result.scalar_one_or_none()
+
+
+async def _reclamar(db, identificacion: str) -> bool:
+    """
+    INSERT-based reservation: succeeds for exactly one worker. Expired claims
+    (owner crashed mid-lookup) are removed and retried once.
+    """
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    for _ in range(2):
+        db.add(ReservaEstudio(
+            identificacion=identificacion,
+            propietario=WORKER_ID,
+            fecha_reserva=now_utc,
+            fecha_expiracion=now_utc + datetime.timedelta(seconds=settings.ESTUDIO_RESERVA_TTL_SECONDS)
+        ))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+
+        result = await db.execute(
+            delete(ReservaEstudio).where(
+                ReservaEstudio.identificacion == identificacion,
+                ReservaEstudio.fecha_expiracion < now_utc
+            )
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            return False
+        logger.warning(f"Reclaimed expired lookup reservation for {identificacion}")
+    return False
+
+
+async def _esperar_estudio(db, identificacion: str, deadline: float) -> Optional[VehiculoEstudio]:
+    """
+    Polls until the study appears, the other worker drops its claim (failure), or the deadline passes.
+    """
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        # Release the connection between polls
+        await db.rollback()
+        await asyncio.sleep(settings.ESTUDIO_RESERVA_POLL_SECONDS)
+        estudio = await _buscar_estudio(db, identificacion)
+        if estudio is not None:
+            return estudio
+        reserva = await db.get(ReservaEstudio, identificacion, populate_existing=True)
+        if reserva is None:
+            return None
+    return None
+
+
+async def _liberar(db, identificacion: str) -> None:
+    try:
+        await db.execute(
+            delete(ReservaEstudio).where(
+                ReservaEstudio.identificacion == identificacion,
+                ReservaEstudio.propietario == WORKER_ID
+            )
+        )
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Could not release lookup reservation for {identificacion}: {e}")
@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import re
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.vehiculo import VehiculoEstudio
+from app.services.pdf_generator import generate_racsa_pdf, pdf_vigente, registrar_pdf
+from app.services.pdf_storage import almacen_pdf
+
+MANIFIESTO = "manifiesto.json"
+
+
+class _Salida:
+    """
+    Write-only sink for zipfile: keeps what was written since the last drenar().
+    Without tell()/seek() zipfile writes a streamable archive (sizes and CRC in
+    data descriptors after each entry).
+    """
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, datos: bytes) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def drenar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _fecha_columna(fecha: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    # ultima_fecha_estudio is stored naive (UTC)
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def nombre_archivo(identificacion: str) -> str:
+    return "pdfs/" + re.sub(r"[^A-Za-z0-9_-]", "_", identificacion) + ".pdf"
+
+
+async def seleccionar_estudios(
+    db: AsyncSession,
+    identificaciones: Optional[List[str]],
+    desde: Optional[datetime.datetime],
+    hasta: Optional[datetime.datetime],
+    limite: int
+) -> List[Tuple[int, str]]:
+    """
+    (id, identificacion) of the studies to export, ordered by identifier. Only
+    these two columns are read; at most limite + 1 rows, so the caller can tell
+    when the selection is too large.
+    """
+    stmt = select(VehiculoEstudio.id, VehiculoEstudio.identificacion)
+    if identificaciones:
+        stmt = stmt.where(VehiculoEstudio.identificacion.in_(identificaciones))
+    if desde is not None:
+        stmt = stmt.where(VehiculoEstudio.ultima_fecha_estudio >= _fecha_columna(desde))
+    if hasta is not None:
+        stmt = stmt.where(VehiculoEstudio.ultima_fecha_estudio < _fecha_columna(hasta))
+    result = await db.execute(stmt.order_by(VehiculoEstudio.identificacion).limit(limite + 1))
+    return [(fila.id, fila.identificacion) for fila in result]
+
+
+class ExportacionZip:
+    """
+    ZIP of the stored PDFs of a set of studies, produced while it is sent.
+    Studies are loaded EXPORTACION_LOTE at a time; the missing PDFs of each step
+    are rendered through the renderer pool (at most EXPORTACION_CONCURRENCIA at
+    once) and recorded on their studies. Each PDF is copied from storage into
+    the archive chunk by chunk, so memory does not grow with the archive; only
+    the manifest (one small entry per study, written last) does.
+    """
+
+    def __init__(self, estudios: List[Tuple[int, str]], no_encontrados: List[str]):
+        self.estudios = estudios
+        self.no_encontrados = no_encontrados
+        self.manifiesto: List[Dict[str, Any]] = []
+        self._renders = asyncio.Semaphore(settings.EXPORTACION_CONCURRENCIA)
+
+    async def _render(self, estudio: VehiculoEstudio) -> Tuple[str, str, int]:
+        async with self._renders:
+            return await generate_racsa_pdf(
+                vin=estudio.identificacion,
+                meta=estudio.especificaciones_vehiculo,
+                detalle=estudio.detalle_estudio,
+                es_sin_registros=estudio.es_estudio_sin_registros,
+                fecha_generacion=estudio.ultima_fecha_estudio
+            )
+
+    async def _preparar_lote(self, ids: List[int]) -> List[Tuple[VehiculoEstudio, Any]]:
+        """
+        The step's studies with their PDF (url, hash, size) or the render error.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(VehiculoEstudio).where(VehiculoEstudio.id.in_(ids))
+                .options(defer(VehiculoEstudio.respuesta_serializada))
+            )
+            por_id = {e.id: e for e in result.scalars()}
+            estudios = [por_id[i] for i in ids if i in por_id]
+
+            pdfs = [await pdf_vigente(e) for e in estudios]
+            faltantes = [i for i, pdf in enumerate(pdfs) if pdf is None]
+            renders = await asyncio.gather(*(self._render(estudios[i]) for i in faltantes), return_exceptions=True)
+            for i, render in zip(faltantes, renders):
+                pdfs[i] = render
+                if not isinstance(render, BaseException):
+                    await registrar_pdf(db, estudios[i], *render)
+            if faltantes:
+                await db.commit()
+        # Session closed before the PDFs are streamed to a possibly slow client
+        return list(zip(estudios, pdfs))
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        salida = _Salida()
+        with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for inicio in range(0, len(self.estudios), settings.EXPORTACION_LOTE):
+                ids = [i for i, _ in self.estudios[inicio:inicio + settings.EXPORTACION_LOTE]]
+                for estudio, pdf in await self._preparar_lote(ids):
+                    entrada = {
+                        "identificacion": estudio.identificacion,
+                        "ultimaFechaEstudio": _fecha_iso(estudio.ultima_fecha_estudio),
+                    }
+                    if isinstance(pdf, BaseException):
+                        self.manifiesto.append({**entrada, "estado": "error", "error": str(pdf)[:500]})
+                        continue
+
+                    url_pdf, _, pdf_size = pdf
+                    digest = hashlib.sha256()
+                    info = zipfile.ZipInfo(nombre_archivo(estudio.identificacion), _fecha_zip(estudio.ultima_fecha_estudio))
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with zf.open(info, "w") as destino:
+                        async for chunk in almacen_pdf.leer(url_pdf):
+                            digest.update(chunk)
+                            destino.write(chunk)
+                            if datos := salida.drenar():
+                                yield datos
+                    if datos := salida.drenar():
+                        yield datos
+                    self.manifiesto.append({
+                        **entrada,
+                        "estado": "ok",
+                        "archivo": info.filename,
+                        "hash": f"sha256:{digest.hexdigest()}",
+                        "tamañoBytes": pdf_size,
+                    })
+
+            for identificacion in self.no_encontrados:
+                self.manifiesto.append({"identificacion": identificacion, "estado": "no_encontrado"})
+            zf.writestr(MANIFIESTO, json.dumps({
+                "generado": _fecha_iso(datetime.datetime.now(datetime.timezone.utc)),
+                "total": len(self.manifiesto),
+                "ok": sum(1 for e in self.manifiesto if e["estado"] == "ok"),
+                "estudios": self.manifiesto,
+            }, indent=2, ensure_ascii=False))
+        # Central directory, written when the archive is closed
+        yield salida.drenar()
+
+
+def _fecha_iso(fecha: Optional[datetime.datetime]) -> Optional[str]:
+    fecha = _fecha_columna(fecha)
+    return fecha.isoformat() + "Z" if fecha is not None else None
+
+
+def _fecha_zip(fecha: Optional[datetime.datetime]) -> Tuple[int, int, int, int, int, int]:
+    # ZIP timestamps start in 1980 and carry no zone; the study date (UTC) is used
+    fecha = _fecha_columna(fecha) or datetime.datetime(1980, 1, 1)
+    return max(fecha, datetime.datetime(1980, 1, 1)).timetuple()[:6]
@@ -0,0 +1,124 @@
+import httpx
+from typing import Dict, Any, Optional
+from loguru import logger
+from app.core.config import settings
+
+# One long-lived client per provider, opened and closed by main.py's lifespan.
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _provider_config(provider: str) -> Dict[str, Any]:
+    """
+    Reads the pool/timeout settings of a provider (VINAUDIT_* / VINCARIO_*).
+    """
+    prefix = provider.upper()
+    return {
+        "base_url": settings.PROVIDER_SIMULATOR_URL or getattr(settings, f"{prefix}_BASE_URL"),
+        "max_connections": getattr(settings, f"{prefix}_MAX_CONNECTIONS"),
+        "max_keepalive": getattr(settings, f"{prefix}_MAX_KEEPALIVE"),
+        "keepalive_expiry": getattr(settings, f"{prefix}_KEEPALIVE_EXPIRY"),
+        "connect_timeout": getattr(settings, f"{prefix}_CONNECT_TIMEOUT"),
+        "timeout": getattr(settings, f"{prefix}_TIMEOUT"),
+        "http2": getattr(settings, f"{prefix}_HTTP2"),
+    }
+
+
+def _build_client(provider: str) -> httpx.AsyncClient:
+    cfg = _provider_config(provider)
+
+    http2 = cfg["http2"]
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(f"HTTP/2 requested for {provider} but 'h2' is not installed. Using HTTP/1.1.")
+            http2 = False
+
+    return httpx.AsyncClient(
+        base_url=cfg["base_url"],
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_keepalive"],
+            keepalive_expiry=cfg["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(cfg["timeout"], connect=cfg["connect_timeout"]),
+    )
+
+
+async def init_provider_clients() -> None:
+    """
+    Creates the pooled clients for every provider. Called once on startup.
+    """
+    for provider in ("VinAudit", "Vincario"):
+        if provider not in _clients:
+            _clients[provider] = _build_client(provider)
+
+
+async def close_provider_clients() -> None:
+    """
+    Closes the pooled clients (and their keep-alive connections). Called on shutdown.
+    """
+    for provider, client in list(_clients.items()):
+        await client.aclose()
+        del _clients[provider]
+    global _webhook_client
+    if _webhook_client is not None:
+        await _webhook_client.aclose()
+        _webhook_client = None
+
+
+_webhook_client: Optional[httpx.AsyncClient] = None
+
+
+def get_webhook_client() -> httpx.AsyncClient:
+    """
+    Shared client for job completion callbacks (any host, so no base_url).
+    """
+    global _webhook_client
+    if _webhook_client is None or _webhook_client.is_closed:
+        _webhook_client = httpx.AsyncClient(timeout=settings.WEBHOOK_TIMEOUT)
+    return _webhook_client
+
+
+def get_provider_client(provider: str) -> httpx.AsyncClient:
+    """
+    Returns the shared client of a provider. Created lazily when the app lifespan
+    did not run (scripts, batch jobs).
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(provider)
+        _clients[provider] = client
+    return client
+
+
+def _llamar(objeto: Any, metodo: str) -> bool:
+    funcion = getattr(objeto, metodo, None)
+    return bool(funcion()) if callable(funcion) else False
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Snapshot of each provider pool: active/idle connections and requests waiting for one.
+    httpx/httpcore expose none of this publicly, so every internal attribute is
+    read defensively: after an upgrade that moves them, the counts read 0 (and
+    the limits fall back to our settings) instead of breaking /metrics.
+    """
+    stats = {}
+    for provider, client in _clients.items():
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is None:
+            continue
+        cfg = _provider_config(provider)
+        connections = list(getattr(pool, "connections", None) or [])
+        requests = list(getattr(pool, "_requests", None) or [])
+        idle = sum(1 for c in connections if _llamar(c, "is_idle"))
+        stats[provider] = {
+            "active": len(connections) - idle,
+            "idle": idle,
+            "waiting": sum(1 for r in requests if _llamar(r, "is_queued")),
+            "max_connections": getattr(pool, "_max_connections", cfg["max_connections"]),
+            "http2": getattr(pool, "_http2", cfg["http2"]),
+        }
+    return stats
@@ -0,0 +1,287 @@
+import asyncio
+import datetime
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import time
+import uuid
+from urllib.parse import urlsplit
+from typing import List, Optional
+from loguru import logger
+from sqlalchemy import ColumnElement, select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import LookupInternalError, ProviderUnavailableError, ProviderQuotaError, error_de_consulta
+from app.db.session import AsyncSessionLocal
+from app.models.vehiculo import EstudioJob, VehiculoEstudio
+from app.services.estudio_service import obtener_estudio_externo
+from app.services.http_clients import get_webhook_client
+from app.services.quota_scheduler import Prioridad
+from app.services.trazabilidad_buffer import trazabilidad_buffer
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+
+
+def _ahora() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def nuevo_job_id() -> str:
+    return str(uuid.uuid4())
+
+
+def firmar_webhook(body: bytes, timestamp: str) -> str:
+    """
+    HMAC-SHA256 over "<timestamp>.<body>", sent as X-GlobalVIN-Signature: sha256=<hex>.
+    Receivers recompute it with the shared secret and reject stale timestamps.
+    """
+    secret = (settings.WEBHOOK_SECRET or settings.SECRET_KEY).encode("utf-8")
+    mensaje = timestamp.encode("utf-8") + b"." + body
+    return "sha256=" + hmac.new(secret, mensaje, hashlib.sha256).hexdigest()
+
+
+async def validar_webhook_url(url: str) -> None:
+    """
+    Rejects webhook targets the server must not POST to: anything but http(s),
+    and hosts resolving to loopback, private (RFC 1918, ULA), link-local (cloud
+    metadata) or other non-public addresses. Raises ValueError.
+    """
+    partes = urlsplit(url)
+    if partes.scheme not in ("http", "https") or not partes.hostname:
+        raise ValueError("webhookUrl must be an http(s) URL")
+    try:
+        puerto = partes.port or (443 if partes.scheme == "https" else 80)
+        direcciones = await asyncio.get_running_loop().getaddrinfo(partes.hostname, puerto, type=socket.SOCK_STREAM)
+    except (ValueError, socket.gaierror) as e:
+        raise ValueError(f"webhookUrl host cannot be resolved: {e}")
+    for *_, sockaddr in direcciones:
+        ip = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            raise ValueError(f"webhookUrl host {partes.hostname} resolves to a non-public address ({ip})")
+
+
+class JobWorkerPool:
+    """
+    N asyncio workers draining the estudio_job table. Jobs are claimed with a
+    conditional UPDATE plus a lease, so several processes (API workers and
+    python -m app.worker) can share the table safely.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._despertar = asyncio.Event()
+        self._detener = False
+
+    def start(self) -> None:
+        self._detener = False
+        self._tasks = [asyncio.ensure_future(self._loop(n)) for n in range(self.workers)]
+        logger.info(f"Study job pool started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        self._detener = True
+        self._despertar.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notificar(self) -> None:
+        """
+        Wakes idle workers right away when a job is submitted in this process.
+        """
+        self._despertar.set()
+
+    async def _loop(self, n: int) -> None:
+        while not self._detener:
+            try:
+                job_id = await self._reclamar()
+            except Exception as e:
+                logger.error(f"Job worker {n}: claim failed: {e}")
+                job_id = None
+            if job_id is None:
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), timeout=settings.JOBS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._procesar(job_id)
+            except Exception as e:
+                # The lease expires and another worker retries the job
+                logger.exception(f"Job worker {n}: job {job_id} crashed: {e}")
+
+    async def _reclamar(self) -> Optional[str]:
+        now = _ahora()
+        libre = or_(EstudioJob.bloqueado_hasta.is_(None), EstudioJob.bloqueado_hasta < now)
+        disponible = and_(
+            EstudioJob.estado.in_([PENDIENTE, EN_PROCESO]),
+            libre,
+            EstudioJob.intentos < settings.JOBS_MAX_INTENTOS
+        )
+        # Lease expired on the last allowed attempt (the worker crashed or was killed)
+        agotado = and_(EstudioJob.estado == EN_PROCESO, libre, EstudioJob.intentos >= settings.JOBS_MAX_INTENTOS)
+        async with AsyncSessionLocal() as db:
+            agotados = (await db.execute(select(EstudioJob.id).where(agotado).limit(5))).scalars().all()
+            for job_id in agotados:
+                await self._agotar(db, job_id, agotado)
+
+            stmt = select(EstudioJob.id).where(disponible).order_by(EstudioJob.fecha_creacion).limit(5)
+            candidatos = (await db.execute(stmt)).scalars().all()
+            for job_id in candidatos:
+                result = await db.execute(
+                    update(EstudioJob)
+                    .where(EstudioJob.id == job_id, disponible)
+                    .values(
+                        estado=EN_PROCESO,
+                        bloqueado_hasta=now + datetime.timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+                        intentos=EstudioJob.intentos + 1,
+                        fecha_inicio=now
+                    )
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return job_id
+        return None
+
+    async def _agotar(self, db: AsyncSession, job_id: str, agotado: ColumnElement[bool]) -> None:
+        """
+        Fails a job whose every attempt ended without an outcome, so it is not
+        retried forever. Conditional like a claim: one worker closes it.
+        """
+        result = await db.execute(
+            update(EstudioJob)
+            .where(EstudioJob.id == job_id, agotado)
+            .values(
+                estado=FALLIDO,
+                codigo_error="ERROR_JOB_INTENTOS_AGOTADOS",
+                mensaje_error=f"Job abandonado tras {settings.JOBS_MAX_INTENTOS} intentos sin resultado",
+                fecha_fin=_ahora(),
+                bloqueado_hasta=None
+            )
+        )
+        await db.commit()
+        if result.rowcount != 1:
+            return
+        job = await db.get(EstudioJob, job_id)
+        logger.error(f"Job {job_id}: failed after {job.intentos} attempts without an outcome")
+        await trazabilidad_buffer.registrar(
+            identificacion=job.identificacion,
+            endpoint="/api/v1/vehiculos/estudios/jobs",
+            status_code=500,
+            llamada_externa=False,
+            proveedor=job.proveedor,
+            mensaje_error=job.mensaje_error,
+            ip_origen=job.ip_origen,
+            usuario=job.usuario
+        )
+        if job.webhook_url:
+            job.webhook_estado = await self._enviar_webhook(job)
+            await db.commit()
+
+    async def _procesar(self, job_id: str) -> None:
+        from app.services.pdf_generator import obtener_pdf_estudio
+
+        async with AsyncSessionLocal() as db:
+            job = await db.get(EstudioJob, job_id)
+            llamada_externa, proveedor = False, "Cache"
+            try:
+                stmt = select(VehiculoEstudio).where(VehiculoEstudio.identificacion == job.identificacion)
+                estudio = (await db.execute(stmt)).scalar_one_or_none()
+                if estudio is None:
+                    estudio, llamada_externa, proveedor = await obtener_estudio_externo(
+                        job.tipo_identificacion, job.identificacion, Prioridad.JOB
+                    )
+
+                _, pdf_hash, pdf_size = await obtener_pdf_estudio(db, estudio)
+            except Exception as e:
+                error = error_de_consulta(e)
+                if isinstance(error, LookupInternalError):
+                    logger.opt(exception=e).error(f"Job {job_id}: internal failure resolving {job.identificacion}")
+                transitorio = isinstance(error, (ProviderUnavailableError, ProviderQuotaError, LookupInternalError))
+                if transitorio and job.intentos < settings.JOBS_MAX_INTENTOS:
+                    # Provider saturated or our own side failed: put it back, not before the advertised retry time
+                    espera = max(error.retry_after or 0, settings.JOBS_POLL_SECONDS)
+                    job.estado = PENDIENTE
+                    job.bloqueado_hasta = _ahora() + datetime.timedelta(seconds=espera)
+                    job.mensaje_error = str(e)[:500]
+                    await db.commit()
+                    return
+                job.estado = FALLIDO
+                job.codigo_error = error.codigo
+                job.mensaje_error = str(e)[:500]
+                job.proveedor = error.proveedor
+                status_code = error.status_code
+                externa = error.llamada_externa
+            else:
+                job.estado = COMPLETADO
+                job.estudio_id = estudio.id
+                job.llamada_externa = llamada_externa
+                job.proveedor = proveedor
+                job.pdf_hash = pdf_hash
+                job.pdf_size_bytes = pdf_size
+                status_code, externa = 200, llamada_externa
+
+            job.fecha_fin = _ahora()
+            job.bloqueado_hasta = None
+            await db.commit()
+            await trazabilidad_buffer.registrar(
+                identificacion=job.identificacion,
+                endpoint="/api/v1/vehiculos/estudios/jobs",
+                status_code=status_code,
+                llamada_externa=externa,
+                proveedor=job.proveedor,
+                mensaje_error=job.mensaje_error if job.estado == FALLIDO else None,
+                ip_origen=job.ip_origen,
+                usuario=job.usuario
+            )
+
+            if job.webhook_url:
+                job.webhook_estado = await self._enviar_webhook(job)
+                await db.commit()
+
+    async def _enviar_webhook(self, job: EstudioJob) -> str:
+        payload = {
+            "jobId": job.id,
+            "estado": job.estado,
+            "identificacion": job.identificacion,
+            "estudioId": job.estudio_id,
+            "pdfHash": job.pdf_hash,
+            "error": {"codigo": job.codigo_error, "detalle": job.mensaje_error} if job.estado == FALLIDO else None,
+            "fechaFin": job.fecha_fin.isoformat() if job.fecha_fin else None,
+        }
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        client = get_webhook_client()
+
+        for intento in range(1, settings.WEBHOOK_MAX_INTENTOS + 1):
+            timestamp = str(int(time.time()))
+            headers = {
+                "Content-Type": "application/json",
+                "X-GlobalVIN-Timestamp": timestamp,
+                "X-GlobalVIN-Signature": firmar_webhook(body, timestamp),
+                "X-GlobalVIN-Job-Id": job.id,
+            }
+            try:
+                # Checked again at delivery: the host may resolve elsewhere by now
+                await validar_webhook_url(job.webhook_url)
+                response = await client.post(job.webhook_url, content=body, headers=headers)
+                if response.status_code < 300:
+                    return "enviado"
+                logger.warning(f"Webhook for job {job.id} answered {response.status_code} (attempt {intento})")
+            except Exception as e:
+                logger.warning(f"Webhook for job {job.id} failed: {e} (attempt {intento})")
+            if intento < settings.WEBHOOK_MAX_INTENTOS:
+                await asyncio.sleep(2 ** intento)
+        return "fallido"
+
+
+job_pool = JobWorkerPool(settings.JOBS_WORKERS_EN_PROCESO)
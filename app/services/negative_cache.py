@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import (
+    ProviderError,
+    ProviderNotFoundError,
+    ProviderPayloadTooLargeError,
+    NegativeCacheError
+)
+
+# Answers that will not change if the same identifier is asked again soon.
+# Anything else (5xx/timeouts after retries, auth/config errors, breaker,
+# quota, internal failures) may succeed on the next try.
+DEFINITIVOS = (ProviderNotFoundError, ProviderPayloadTooLargeError)
+
+
+class NegativeCache:
+    """
+    LRU of recent provider failures with a per-entry TTL. Repeated lookups of an
+    identifier the provider just rejected are answered from here instead of
+    paying for the same failure again.
+    """
+
+    def __init__(self, max_entries: int, ttl_not_found: float, ttl_error: float):
+        self.max_entries = max_entries
+        self.ttl_not_found = ttl_not_found
+        self.ttl_error = ttl_error
+        self._entries: "OrderedDict[str, Tuple[float, int, str, str]]" = OrderedDict()
+        self._hits = 0
+        self._stored = 0
+
+    def registrar(self, identificacion: str, error: ProviderError) -> None:
+        """
+        Remembers a definitive failure (see DEFINITIVOS); any other error is
+        ignored.
+        """
+        if not isinstance(error, DEFINITIVOS) or not error.llamada_externa:
+            return
+        ttl = self.ttl_not_found if isinstance(error, ProviderNotFoundError) else self.ttl_error
+        if ttl <= 0:
+            return
+        self._entries[identificacion] = (time.monotonic() + ttl, error.status_code, error.codigo, error.detalle)
+        self._entries.move_to_end(identificacion)
+        self._stored += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def consultar(self, identificacion: str) -> Optional[NegativeCacheError]:
+        """
+        The cached failure as a NegativeCacheError, or None when absent/expired.
+        """
+        entrada = self._entries.get(identificacion)
+        if entrada is None:
+            return None
+        expira, status_code, codigo, detalle = entrada
+        restante = expira - time.monotonic()
+        if restante <= 0:
+            del self._entries[identificacion]
+            return None
+        self._hits += 1
+        return NegativeCacheError(detalle, status_code=status_code, codigo_original=codigo, retry_after=restante)
+
+    def invalidar(self, identificacion: str) -> None:
+        self._entries.pop(identificacion, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self._hits, "stored": self._stored}
+
+
+negative_cache = NegativeCache(
+    settings.NEGATIVE_CACHE_MAX_ENTRIES,
+    settings.NEGATIVE_CACHE_NOT_FOUND_TTL_SECONDS,
+    settings.NEGATIVE_CACHE_ERROR_TTL_SECONDS,
+)
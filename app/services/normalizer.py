@@ -1,4 +1,5 @@
-from typing import Dict, Any, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, get_args
+from pydantic import BaseModel
 from app.schemas.vehiculo import (
     EspecificacionesVehiculo,
     DetalleEstudio,
@@ -10,112 +11,331 @@ from app.schemas.vehiculo import (
     ComprobacionProblemas
 )
 
-def normalize_vinaudit_response(raw_data: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio, bool]:
+# Bump whenever a mapping below changes: studies stamped with an older version
+# are re-normalized from the payload archive by app.jobs.renormalizar.
+NORMALIZER_VERSION = "3"
+
+# A field spec is the provider key to read, a tuple of keys tried in order
+# (first one present wins, the last element being the default when none is),
+# or a callable taking the whole source record.
+Origen = Union[str, Tuple[Any, ...], Callable[[Dict[str, Any]], Any]]
+
+
+def _texto(v: Any) -> Optional[str]:
+    return v if v is None or type(v) is str else str(v)
+
+
+def _entero(v: Any) -> Optional[int]:
+    if v is None or type(v) is int:
+        return v
+    try:
+        return int(str(v).strip())
+    except ValueError:
+        return None
+
+
+def _booleano(v: Any) -> Optional[bool]:
+    if v is None or type(v) is bool:
+        return v
+    return str(v).strip().lower() in ("true", "yes", "si", "1")
+
+
+_CONVERSORES = {str: _texto, int: _entero, bool: _booleano}
+
+
+def _conversor(modelo: Type[BaseModel], campo: str) -> Callable[[Any], Any]:
+    tipos = [t for t in get_args(modelo.model_fields[campo].annotation) if t is not type(None)]
+    return _CONVERSORES.get(tipos[0] if tipos else modelo.model_fields[campo].annotation, _texto)
+
+
+def compilar_extractor(modelo: Type[BaseModel], campos: Dict[str, Origen]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
     """
-    Transforms VinAudit JSON into the required format.
-    Returns: (EspecificacionesVehiculo, DetalleEstudio, es_estudio_sin_registros)
+    Compiles a declarative field mapping into one generated function that returns
+    the model's model_dump() shape (every field, in declaration order) straight
+    from a provider record: no per-field loop and no Pydantic validation. Values
+    are coerced to the field's type (str/int/bool) the way Pydantic would accept them.
+    """
+    namespace: Dict[str, Any] = {}
+    lineas = []
+    for n, (nombre, field) in enumerate(modelo.model_fields.items()):
+        origen = campos.get(nombre)
+        if origen is None:
+            namespace[f"_d{n}"] = field.default
+            lineas.append(f"{nombre!r}: _d{n}")
+            continue
+        namespace[f"_c{n}"] = _conversor(modelo, nombre)
+        if callable(origen):
+            namespace[f"_f{n}"] = origen
+            expr = f"_f{n}(r)"
+        elif isinstance(origen, tuple):
+            *claves, defecto = origen
+            namespace[f"_d{n}"] = defecto
+            expr = f"_d{n}"
+            for clave in reversed(claves):
+                expr = f"r.get({clave!r}, {expr})"
+        else:
+            expr = f"r.get({origen!r})"
+        lineas.append(f"{nombre!r}: _c{n}({expr})")
+
+    codigo = "def extraer(r):\n    return {" + ", ".join(lineas) + "}\n"
+    exec(compile(codigo, f"<extractor {modelo.__name__}>", "exec"), namespace)
+    return namespace["extraer"]
+
+
+def _vendedor(sale: Dict[str, Any]) -> str:
+    return f"{sale.get('seller_type', '')} - {sale.get('seller_name', '')}".strip() or "N/A"
+
+
+def _kilometraje_venta(sale: Dict[str, Any]) -> Any:
+    # The template shows city/state with the mileage when the seller's city is known
+    if sale.get("seller_city"):
+        return f"{sale.get('seller_city', '')}, {sale.get('seller_state', '')} | {sale.get('vehicle_mileage', 'N/A')}"
+    return sale.get("vehicle_mileage", "N/A")
+
+
+def _motor_vincario(d: Dict[str, Any]) -> str:
+    return f"{d.get('Engine Displacement (ccm)', '')}cc {d.get('Fuel Type - Primary', '')}".strip()
+
+
+# --- VinAudit (pullreport JSON) ---
+
+VINAUDIT_META = compilar_extractor(EspecificacionesVehiculo, {
+    "marca": "make",
+    "modelo": "model",
+    "anio": "year",
+    "categoria": "trim",
+    "fabricacion": ("made_in", "country", None),
+    "motor": "engine",
+    "estilo": ("style", "body_style", None),
+})
+
+# (source section, DetalleEstudio list, record extractor)
+VINAUDIT_SECCIONES: List[Tuple[str, str, Callable]] = [
+    ("accidents", "registrosDeAccidentes", compilar_extractor(RegistroAccidente, {
+        "fecha": ("date", "N/A"),
+        "entidadInformante": ("source_name", "N/A"),
+    })),
+    ("salvage", "chatarraSalvamentoSeguros", compilar_extractor(RegistroSeguro, {
+        "fecha": ("date", "N/A"),
+        "tipoDeDano": ("primary_damage", "Salvage"),
+        "entidadInformante": ("sale_document", "Insurance"),
+    })),
+    ("jsi", "chatarraSalvamentoSeguros", compilar_extractor(RegistroSeguro, {
+        "fecha": ("date", "N/A"),
+        "tipoDeDano": ("record_type", "Junk/Salvage"),
+        "entidadInformante": ("brander_name", "N/A"),
+    })),
+    ("thefts", "registrosDeRobos", compilar_extractor(RegistroRobo, {
+        "tipoDeRegistro": ("record_type", "Theft"),
+        "fechaDeRobo": ("date", "N/A"),
+    })),
+    ("titles", "registrosDeTitulos", compilar_extractor(RegistroTitulo, {
+        "fecha": ("date", "N/A"),
+        "estadoProvincia": ("state", "N/A"),
+        "kilometraje": ("meter", "N/A"),
+        "vin": ("meter_unit", "M"), # using vin field temporarily to hold meter_unit "M" or "KM"
+    })),
+    ("sales", "registrosDeVenta", compilar_extractor(RegistroVenta, {
+        "fecha": ("date", "N/A"),
+        "vendedor": _vendedor,
+        "precioDeListado": ("listing_price", "N/A"),
+        "kilometrajeDelVehiculo": _kilometraje_venta,
+    })),
+]
+
+# NMVTIS brand titles (VinAudit "checks"[].brand_title) -> ComprobacionProblemas flag.
+# Titles are compared lower-cased with punctuation and spaces removed.
+VINAUDIT_MARCAS_NMVTIS = {
+    "Flood Damage": "registroDeDanosPorInundacion",
+    "Fire Damage": "registroDeDanosPorIncendio",
+    "Hail Damage": "registroDeDanosPorGranizo",
+    "Salt Water Damage": "registroDeDanosPorAguaSalada",
+    "Vandalism": "registroDeVandalismo",
+    "Kit": "registroDelVehiculoKit",
+    "Dismantled": "registroDeDesmantelado",
+    "Junk": "registroDeBasura",
+    "Reconstructed": "registroDeReconstruccion",
+    "Rebuilt": "registroDeReconstruido",
+    "Salvage: Damage or Not Specified": "registroDeSalvamentoDenoONoEspecificado",
+    "Test Vehicle": "registroDelVehiculoDePrueba",
+    "Refurbished": "registroDeReacondicionado",
+    "Collision": "registroDeVehiculoDeColision",
+    "Salvage Retention": "registroDeRetencionDeSalvamento",
+    "Taxi": "registroDelVehiculoDeTaxi",
+    "Police": "registroDelVehiculoPolicial",
+    "Original Taxi": "registroDelVehiculoDeTaxiOriginal",
+    "Original Police": "registroDelVehiculoPolicialOriginal",
+    "Remanufactured Vehicle": "registroDelVehiculoRemanufacturado",
+    "Warranty Return": "registroDeDevolucionDeLaGarantia",
+    "Antique": "registroDeAntiguedades",
+    "Classic": "registroDeClasico",
+    "Agricultural Vehicle": "registroDelVehiculoAgricola",
+    "Logging Vehicle": "registroDelVehiculoDeRegistro",
+    "Street Rod": "registroDeStreetRod",
+    "Vehicle Contains Reissued VIN": "elVehiculoContieneVinReemitido",
+    "Replica": "registroDeReplica",
+    "Totaled": "registroDeTotalizado",
+    "Owner Retained": "registroDelPropietarioRetenido",
+    "Bond Posted": "registroDeBonosPublicados",
+    "Memorandum Copy": "registroDeCopiaDeMemorando",
+    "Parts Only": "registroDePiezasUnicamente",
+    "Recovered Theft": "registroDeRoboRecuperado",
+    "Undisclosed Lien": "registroDeGravamenNoRevelado",
+    "Prior Owner Retained": "registroDePropietarioAnteriorDetenido",
+    "Vehicle Non-Conformity Uncorrected": "registroDeNoConformidadDelVehiculoSinCorregir",
+    "Vehicle Non-Conformity Corrected": "registroDeNoConformidadDelVehiculoCorregido",
+    "Vehicle Safety Defect Uncorrected": "registroDelDefectoDeSeguridadDelVehiculoSinCorregir",
+    "Vehicle Safety Defect Corrected": "registroDeDefectoDeSeguridadDelVehiculoCorregido",
+    "VIN Replaced": "registroDeVinReemplazado",
+    "Manufacturer Buyback": "registroDeRecompraDelFabricante",
+    "Former Rental": "registroDelAntiguoVehiculoDeAlquiler",
+    "Salvage - Stolen": "registroDeSalvamentoRobado",
+    "Salvage - Reasons Other Than Damage or Stolen": "registroDeSalvamentoRazonesQueNoSeanDanosORobo",
+    "Damage Disclosure": "registroDeDanosRevelados",
+    "Previous Non-Repairable Repaired": "registroDeNoReparableReparadoAnterior",
+    "Crushed": "registroDeAplastado",
+    "Odometer Actual": "registroDelOdometroReal",
+    "Odometer Not Actual": "registroDelOdometroNoActual",
+    "Odometer Tampering Verified": "registroDelOdometroManipulacionVerificada",
+    "Exempt from Odometer Disclosure": "registroDelOdometroExentoDeDiuvolgacion",
+    "Odometer Exceeds Mechanical Limits": "registroDelOdometroExcedeLimitesMecanicos",
+    "Odometer May Be Altered": "registroDelOdometroPuedeModificarse",
+    "Odometer Replaced": "registroDelOdometroReemplazado",
+    "Odometer Reading at Time of Renewal": "registroDelOdometroLecturaEnMomentoDeRenovacion",
+    "Odometer Discrepancy": "registroDeOdometroDiscrepancia",
+    "Odometer Title Brand": "registroDelOdometroTituloDeLaDivisionDeLlamadas",
+    "Odometer Exceeds Mechanical Limits - Rectified": "registroDelOdometroExcedeLosLimitesMecanicosRectificados",
+}
+
+
+# brand_code fallback for checks that come without a title (codes documented in
+# docs/vinaudit_reference.md; extend as new ones show up in archived payloads)
+VINAUDIT_CODIGOS_MARCA = {
+    "09": "registroDeReconstruido",
+    "11": "registroDeSalvamentoDenoONoEspecificado",
+}
+
+
+def _clave_marca(titulo: Any) -> str:
+    return "".join(c for c in str(titulo).lower() if c.isalnum())
+
+
+_MARCAS = {_clave_marca(titulo): campo for titulo, campo in VINAUDIT_MARCAS_NMVTIS.items()}
+_SIN_PROBLEMAS = dict.fromkeys(ComprobacionProblemas.model_fields, False)
+
+
+def _comprobacion_problemas(checks: Any) -> Optional[Dict[str, bool]]:
+    """
+    ComprobacionProblemas (dump shape) from the brand checks; None without a checks section.
+    """
+    if not isinstance(checks, list):
+        return None
+    comprobacion = dict(_SIN_PROBLEMAS)
+    for check in checks:
+        if not isinstance(check, dict):
+            continue
+        campo = _MARCAS.get(_clave_marca(check.get("brand_title", ""))) or VINAUDIT_CODIGOS_MARCA.get(
+            str(check.get("brand_code", "")).zfill(2)
+        )
+        if campo is not None:
+            comprobacion[campo] = True
+    return comprobacion
+
+
+# Every top-level key of the VinAudit report the mappings above read
+VINAUDIT_CLAVES_USADAS = ("attributes", *dict.fromkeys(s for s, _, _ in VINAUDIT_SECCIONES), "lien", "checks")
+
+# Sections whose presence means the vehicle has a problem record
+VINAUDIT_SECCIONES_CON_PROBLEMAS = ("accidents", "salvage", "jsi", "thefts", "lien")
+
+# --- Vincario (decode endpoint: list of {"label", "value"}) ---
+
+VINCARIO_META = compilar_extractor(EspecificacionesVehiculo, {
+    "marca": "Make",
+    "modelo": "Model",
+    "anio": "Model Year",
+    "fabricacion": ("Plant Country", "Manufacturer Address", None),
+    "motor": _motor_vincario,
+    "categoria": "Body",
+    "estilo": "Transmission",
+})
+
+
+_DETALLE_VACIO = DetalleEstudio().model_dump()
+
+
+def _detalle_vacio() -> Dict[str, Any]:
+    return {nombre: [] if isinstance(valor, list) else valor for nombre, valor in _DETALLE_VACIO.items()}
+
+
+def normalize_vinaudit_dicts(raw_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+    """
+    VinAudit JSON -> (especificacionesVehiculo, detalleEstudio, es_estudio_sin_registros)
+    as plain dicts, in the same shape as the models' model_dump().
     """
     data = raw_data.get("data", {})
-    attributes = data.get("attributes", {})
-
-    meta = EspecificacionesVehiculo(
-        marca=attributes.get("make"),
-        modelo=attributes.get("model"),
-        anio=attributes.get("year"),
-        categoria=attributes.get("trim"),
-        fabricacion=attributes.get("made_in", attributes.get("country")),
-        motor=attributes.get("engine"),
-        estilo=attributes.get("style", attributes.get("body_style")),
-    )
-
-    detalle = DetalleEstudio()
-    
-    for acc in data.get("accidents", []):
-        detalle.registrosDeAccidentes.append(RegistroAccidente(
-            fecha=acc.get("date", "N/A"),
-            entidadInformante=acc.get("source_name", "N/A")
-        ))
-        
-    for salv in data.get("salvage", []):
-        detalle.chatarraSalvamentoSeguros.append(RegistroSeguro(
-            fecha=salv.get("date", "N/A"),
-            tipoDeDano=salv.get("primary_damage", "Salvage"),
-            entidadInformante=salv.get("sale_document", "Insurance")
-        ))
-        
-    for jsi in data.get("jsi", []):
-        detalle.chatarraSalvamentoSeguros.append(RegistroSeguro(
-            fecha=jsi.get("date", "N/A"),
-            tipoDeDano=jsi.get("record_type", "Junk/Salvage"),
-            entidadInformante=jsi.get("brander_name", "N/A")
-        ))
-        
-    for theft in data.get("thefts", []):
-        detalle.registrosDeRobos.append(RegistroRobo(
-            tipoDeRegistro=theft.get("record_type", "Theft"),
-            fechaDeRobo=theft.get("date", "N/A")
-        ))
-        
-    for title in data.get("titles", []):
-        detalle.registrosDeTitulos.append(RegistroTitulo(
-            fecha=title.get("date", "N/A"),
-            estadoProvincia=title.get("state", "N/A"),
-            kilometraje=title.get("meter", "N/A"),
-            vin=title.get("meter_unit", "M"), # using vin field temporarily to hold meter_unit "M" or "KM"
-            current=title.get("current", False)  # This will be processed via Pydantic extra kwargs since we allowed them
-        ))
-        
-    for sale in data.get("sales", []):
-        detalle.registrosDeVenta.append(RegistroVenta(
-            fecha=sale.get("date", "N/A"),
-            vendedor=f"{sale.get('seller_type', '')} - {sale.get('seller_name', '')}".strip() or "N/A",
-            precioDeListado=sale.get("listing_price", "N/A"),
-            kilometrajeDelVehiculo=sale.get("vehicle_mileage", "N/A")
-            # The template uses kilometrajeDelVehiculo for location temporarily, so let's append it
-        ))
-        # Optional: Add city to seller if present to match the UI better
-        if sale.get("seller_city") and detalle.registrosDeVenta:
-             detalle.registrosDeVenta[-1].kilometrajeDelVehiculo = f"{sale.get('seller_city', '')}, {sale.get('seller_state', '')} | {sale.get('vehicle_mileage', 'N/A')}"
+    meta = VINAUDIT_META(data.get("attributes") or {})
 
-    # Determine if it's a completely clean record
-    es_sin_registros = not (
-        len(detalle.registrosDeAccidentes) > 0 or 
-        len(detalle.chatarraSalvamentoSeguros) > 0 or 
-        len(detalle.registrosDeRobos) > 0 or
-        len(data.get("lien", [])) > 0
-    )
+    detalle = _detalle_vacio()
+    for seccion, destino, extraer in VINAUDIT_SECCIONES:
+        registros = data.get(seccion)
+        if registros:
+            detalle[destino].extend([extraer(r) for r in registros])
+    detalle["comprobacionDeProblemas"] = _comprobacion_problemas(data.get("checks"))
 
+    # Determine if it's a completely clean record
+    es_sin_registros = not any(data.get(seccion) for seccion in VINAUDIT_SECCIONES_CON_PROBLEMAS)
     return meta, detalle, es_sin_registros
 
-def normalize_vincario_response(raw_data: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio, bool]:
+
+def normalize_vincario_dicts(raw_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
     """
-    Transforms Vincario (Korea/Intl) JSON into the required format.
-    The data comes in a 'Decode' array with 'label' and 'value'.
+    Vincario JSON -> plain dicts. The data comes in a "decode" array (older
+    payloads: "Decode") with 'label' and 'value'.
     """
     data = raw_data.get("data", {})
-    decode_list = data.get("Decode", [])
-    
-    # Convert list of dicts to a fast lookup dict
+    decode_list = data.get("decode") or data.get("Decode") or []
     decode_dict = {item.get("label", ""): item.get("value", "") for item in decode_list if isinstance(item, dict)}
 
-    meta = EspecificacionesVehiculo(
-        marca=decode_dict.get("Make"),
-        modelo=decode_dict.get("Model"),
-        anio=decode_dict.get("Model Year"),
-        fabricacion=decode_dict.get("Plant Country", decode_dict.get("Manufacturer Address")),
-        motor=f"{decode_dict.get('Engine Displacement (ccm)', '')}cc {decode_dict.get('Fuel Type - Primary', '')}".strip(),
-        categoria=decode_dict.get("Body"),
-        estilo=decode_dict.get("Transmission")
-    )
-
-    detalle = DetalleEstudio()
-    
-    # Vincario's basic decode endpoint might not bring full accident history
-    # If using their advanced endpoints, map them here later
-    # For now, initialize empty lists
-    es_sin_registros = True
+    # Vincario's basic decode endpoint does not bring accident history:
+    # if the advanced endpoints are used, map them here later
+    return VINCARIO_META(decode_dict), _detalle_vacio(), True
+
+
+def normalize_provider_dicts(provider: str, raw_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+    """
+    Fast path used when storing studies: the output is trusted, so no models are built.
+    """
+    if provider == "Vincario":
+        return normalize_vincario_dicts(raw_data)
+    return normalize_vinaudit_dicts(raw_data)
+
+
+def _a_modelos(meta: Dict[str, Any], detalle: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio]:
+    """
+    Wraps extractor output in models with one batched model_validate per object:
+    pydantic-core validates the whole record lists faster than model_construct
+    can build them record by record in Python.
+    """
+    return EspecificacionesVehiculo.model_validate(meta), DetalleEstudio.model_validate(detalle)
+
+
+def normalize_vinaudit_response(raw_data: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio, bool]:
+    """
+    Transforms VinAudit JSON into the required format.
+    Returns: (EspecificacionesVehiculo, DetalleEstudio, es_estudio_sin_registros)
+    """
+    meta, detalle, es_sin_registros = normalize_vinaudit_dicts(raw_data)
+    return (*_a_modelos(meta, detalle), es_sin_registros)
+
+
+def normalize_vincario_response(raw_data: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio, bool]:
+    """
+    Transforms Vincario (Korea/Intl) JSON into the required format.
+    """
+    meta, detalle, es_sin_registros = normalize_vincario_dicts(raw_data)
+    return (*_a_modelos(meta, detalle), es_sin_registros)
 
-    return meta, detalle, es_sin_registros
 
 def normalize_provider_data(provider: str, raw_data: Dict[str, Any]) -> Tuple[EspecificacionesVehiculo, DetalleEstudio, bool]:
     if provider == "Vincario":
@@ -0,0 +1,58 @@
+import json
+import zlib
+import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.vehiculo import PayloadProveedor
+
+COMPRESSION_LEVEL = 6
+
+
+def comprimir_payload(payload: Dict[str, Any]) -> Tuple[bytes, int]:
+    """
+    Returns: (compressed_bytes, original_size)
+    """
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def descomprimir_payload(blob: bytes, codificacion: str = "zlib") -> Dict[str, Any]:
+    if codificacion != "zlib":
+        raise ValueError(f"Unsupported payload encoding: {codificacion}")
+    return json.loads(zlib.decompress(blob))
+
+
+def archivar_payload(
+    db: AsyncSession,
+    identificacion: str,
+    proveedor: str,
+    payload: Dict[str, Any],
+    fecha_obtencion: Optional[datetime.datetime] = None
+) -> PayloadProveedor:
+    """
+    Adds the raw provider body to the session; it commits together with the study.
+    """
+    blob, size = comprimir_payload(payload)
+    registro = PayloadProveedor(
+        identificacion=identificacion,
+        proveedor=proveedor,
+        fecha_obtencion=fecha_obtencion or datetime.datetime.now(datetime.timezone.utc),
+        codificacion="zlib",
+        payload=blob,
+        tamano_original=size
+    )
+    db.add(registro)
+    return registro
+
+
+async def cargar_ultimo_payload(db: AsyncSession, identificacion: str) -> Optional[PayloadProveedor]:
+    stmt = (
+        select(PayloadProveedor)
+        .where(PayloadProveedor.identificacion == identificacion)
+        .order_by(PayloadProveedor.fecha_obtencion.desc(), PayloadProveedor.id.desc())
+        .limit(1)
+    )
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
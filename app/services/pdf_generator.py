@@ -1,9 +1,18 @@
 import os
+import json
 import hashlib
+import uuid
 from datetime import datetime, timezone
-from jinja2 import Environment, FileSystemLoader
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.vehiculo import VehiculoEstudio
 from app.schemas.vehiculo import EspecificacionesVehiculo, DetalleEstudio
+from app.services.pdf_renderer import renderer_pool
+from app.services.pdf_storage import DIRECTORIO_RENDER, almacen_pdf
+from app.services.plantillas import fragmentos_estaticos, render, version_plantillas
+from app.services.singleflight import SingleFlight
 
 # Optional: Import pdfkit if installed, otherwise we'll create a mock for local dev
 try:
@@ -12,50 +21,60 @@ try:
 except ImportError:
     PDFKIT_AVAILABLE = False
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-TEMPLATES_DIR = os.path.join(BASE_DIR, "app/templates")
+REPORT_TEMPLATE = "reporte_base.html"
 
-# Ensure storage directory exists
-STORAGE_DIR = os.path.join(BASE_DIR, "storage", "pdfs")
-os.makedirs(STORAGE_DIR, exist_ok=True)
+# Hash of the report template and its static fragments. It is part of the PDF
+# content address, so editing the template re-renders stored PDFs on next use.
+TEMPLATE_VERSION = version_plantillas([REPORT_TEMPLATE])
 
-# Jinja2 setup
-env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
+# Renders in flight by content address: concurrent requests for the same PDF
+# wait for one render instead of each queueing their own in the pool
+_renders = SingleFlight()
 
-async def generate_racsa_pdf(
-    vin: str, 
-    meta: 'EspecificacionesVehiculo', 
-    detalle: 'DetalleEstudio', 
-    es_sin_registros: bool
-) -> Tuple[str, str, int]:
+
+def clave_pdf(
+    vin: str,
+    meta: Optional[Dict[str, Any]],
+    detalle: Optional[Dict[str, Any]],
+    es_sin_registros: bool,
+    fecha_generacion: str
+) -> str:
     """
-    Generates a PDF report meeting RACSA's requirements.
-    Returns: (pdf_path, pdf_hash, size_in_bytes)
-    """
-    
-    # 1. Render HTML Template
-    template = env.get_template("reporte_base.html")
-    
-    html_out = template.render(
-        vin=vin,
-        meta=meta,
-        detalle=detalle,
-        es_sin_registros=es_sin_registros,
-        fecha_generacion=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    Content address of a report: sha256 of everything the template renders plus
+    the template version. Same inputs, same file.
+    """
+    contenido = json.dumps(
+        [TEMPLATE_VERSION, vin, meta, detalle, es_sin_registros, fecha_generacion],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
     )
-    
-    filename = f"{vin}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    filepath = os.path.join(STORAGE_DIR, filename)
-    
-    # 2. Convert HTML to PDF
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _fecha_emision(fecha: Optional[datetime]) -> str:
+    """
+    Date printed on the report. It comes from the study (not the clock) so the
+    rendered PDF, and therefore its hash, is reproducible.
+    """
+    if fecha is None:
+        return ""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc)
+    return fecha.strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def _render_pdf(html_out: str, filepath: str) -> bytes:
+    """
+    Converts the HTML and writes the PDF to filepath (a fresh file under
+    DIRECTORIO_RENDER; the storage backend publishes it afterwards).
+    """
     if PDFKIT_AVAILABLE:
         try:
             # Requires wkhtmltopdf installed on the system
             pdfkit.from_string(html_out, filepath, options={"enable-local-file-access": ""})
-            
+
             with open(filepath, "rb") as f:
                 pdf_bytes = f.read()
-                
+
         except Exception as e:
             # Fallback for local development if wkhtmltopdf is missing
             print(f"Warning: PDF generation failed ({e}). Mocking PDF.")
@@ -67,11 +86,139 @@ async def generate_racsa_pdf(
         pdf_bytes = b"%PDF-1.4\n%MOCK_DEVELOPMENT_PDF\n"
         with open(filepath, "wb") as f:
             f.write(pdf_bytes)
-            
+    return pdf_bytes
+
+
+def generar_pdf_en_worker(
+    vin: str,
+    meta: Optional[Dict[str, Any]],
+    detalle: Optional[Dict[str, Any]],
+    es_sin_registros: bool,
+    fecha: str
+) -> Tuple[str, str, int]:
+    """
+    Blocking part of generate_racsa_pdf; runs inside a renderer process.
+    Returns (temporary file, hash, size); the caller stores the file.
+    """
+    filepath = os.path.join(DIRECTORIO_RENDER, f"{uuid.uuid4().hex}.pdf")
+
+    # 1. Render HTML Template (static fragments are passed pre-built)
+    html_out = render(REPORT_TEMPLATE, {
+        "vin": vin,
+        "meta": meta,
+        "detalle": detalle,
+        "es_sin_registros": es_sin_registros,
+        "fecha_generacion": fecha,
+        "fragmentos": fragmentos_estaticos(),
+    })
+
+    # 2. Convert HTML to PDF
+    pdf_bytes = _render_pdf(html_out, filepath)
+
     # Calculate Hash and Size
     pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
-    size_bytes = len(pdf_bytes)
-    
-    # Normally we would upload to S3 here and return the S3 URL.
-    # For now, we return the local URL/Path.
-    return filepath, f"sha256:{pdf_hash}", size_bytes
+    return filepath, f"sha256:{pdf_hash}", len(pdf_bytes)
+
+
+async def generate_racsa_pdf(
+    vin: str, 
+    meta: 'EspecificacionesVehiculo', 
+    detalle: 'DetalleEstudio', 
+    es_sin_registros: bool,
+    fecha_generacion: Optional[datetime] = None
+) -> Tuple[str, str, int]:
+    """
+    Generates a PDF report meeting RACSA's requirements, stored under its
+    content address (clave_pdf) in the configured PdfStorage. A stored object
+    for the same content is reused without rendering, and concurrent calls for
+    the same content share one render. The render runs in the renderer pool,
+    so it may raise RenderSaturadoError or RenderTimeoutError.
+    Returns: (url_pdf, pdf_hash, size_in_bytes)
+    """
+    fecha = _fecha_emision(fecha_generacion or datetime.now(timezone.utc))
+    clave = clave_pdf(vin, meta, detalle, es_sin_registros, fecha)
+    resultado, _ = await _renders.do(
+        clave, lambda: _renderizar_y_guardar(clave, vin, meta, detalle, es_sin_registros, fecha)
+    )
+    return resultado
+
+
+async def _renderizar_y_guardar(
+    clave: str,
+    vin: str,
+    meta: Optional[Dict[str, Any]],
+    detalle: Optional[Dict[str, Any]],
+    es_sin_registros: bool,
+    fecha: str
+) -> Tuple[str, str, int]:
+    existente = await almacen_pdf.buscar(clave)
+    if existente is not None:
+        return existente
+
+    ruta_tmp, pdf_hash, pdf_size = await renderer_pool.render(
+        generar_pdf_en_worker, vin, meta, detalle, es_sin_registros, fecha
+    )
+    try:
+        url = await almacen_pdf.guardar(clave, ruta_tmp, pdf_hash)
+    except Exception:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+        raise
+    return url, pdf_hash, pdf_size
+
+
+async def pdf_vigente(estudio: VehiculoEstudio) -> Optional[Tuple[str, str, int]]:
+    """
+    The study's recorded PDF (url, hash, size) if it was rendered with the
+    current template into the current backend and the object is still there;
+    None when it must be rendered.
+    """
+    if (
+        estudio.pdf_hash is None
+        or estudio.version_plantilla_pdf != TEMPLATE_VERSION
+        or not almacen_pdf.es_propia(estudio.url_pdf)
+        or not await almacen_pdf.existe(estudio.url_pdf)
+    ):
+        return None
+    return estudio.url_pdf, estudio.pdf_hash, estudio.pdf_size_bytes
+
+
+async def obtener_pdf_estudio(db: AsyncSession, estudio: VehiculoEstudio) -> Tuple[str, str, int]:
+    """
+    PDF of a study, rendered at most once per content version: the stored
+    artifact is returned as is, otherwise it is generated and recorded on the
+    study (url_pdf, pdf_hash, pdf_size_bytes). The caller commits.
+    Returns (url_pdf, pdf_hash, size); read it through almacen_pdf.
+    """
+    vigente = await pdf_vigente(estudio)
+    if vigente is not None:
+        return vigente
+
+    url_pdf, pdf_hash, pdf_size = await generate_racsa_pdf(
+        vin=estudio.identificacion,
+        meta=estudio.especificaciones_vehiculo,
+        detalle=estudio.detalle_estudio,
+        es_sin_registros=estudio.es_estudio_sin_registros,
+        fecha_generacion=estudio.ultima_fecha_estudio
+    )
+    await registrar_pdf(db, estudio, url_pdf, pdf_hash, pdf_size)
+    return url_pdf, pdf_hash, pdf_size
+
+
+async def registrar_pdf(db: AsyncSession, estudio: VehiculoEstudio, url_pdf: str, pdf_hash: str, pdf_size: int) -> None:
+    """
+    Records a render of the current template on the study. The caller commits.
+    """
+    valores = {
+        "url_pdf": url_pdf,
+        "pdf_hash": pdf_hash,
+        "pdf_size_bytes": pdf_size,
+        "version_plantilla_pdf": TEMPLATE_VERSION,
+    }
+    # Explicit UPDATE: the study may come from another session (the lookup leader's)
+    await db.execute(
+        update(VehiculoEstudio).where(VehiculoEstudio.id == estudio.id).values(**valores)
+        .execution_options(synchronize_session=False)
+    )
+    for columna, valor in valores.items():
+        set_committed_value(estudio, columna, valor)
@@ -0,0 +1,166 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class RenderSaturadoError(RuntimeError):
+    """
+    Every renderer is busy and the wait queue is full: rejected without waiting.
+    """
+
+
+class RenderTimeoutError(RuntimeError):
+    """
+    A render did not finish within PDF_RENDER_TIMEOUT_SECONDS.
+    """
+
+
+def _calentar_worker() -> None:
+    # Runs once per renderer process: imports pdfkit/Jinja and loads the compiled templates
+    from app.services import pdf_generator  # noqa: F401
+    from app.services.plantillas import precompilar
+    precompilar()
+
+
+def _listo() -> bool:
+    return True
+
+
+class PdfRendererPool:
+    """
+    Long-lived renderer processes, so the blocking part of a render (template,
+    wkhtmltopdf subprocess, file I/O) never runs on the event loop.
+    At most `workers` renders run at once and `max_cola` more wait for a slot;
+    anything beyond that raises RenderSaturadoError immediately.
+    A render that exceeds `timeout` raises RenderTimeoutError; its process
+    finishes it in the background, keeping its slot until then (so nothing
+    queues unseen inside the executor), and its temporary file is left for the
+    PDF GC job (app.jobs.gc_pdfs) to remove.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_cola: int,
+        timeout: float,
+        initializer: Optional[Callable[[], None]] = _calentar_worker
+    ):
+        self.workers = max(1, workers)
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self._initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._en_cola = 0
+        self._en_render = 0
+        self._waits = deque(maxlen=500)
+        self._renders = deque(maxlen=500)
+        self._completados = 0
+        self._rechazados = 0
+        self._timeouts = 0
+        self._errores = 0
+
+    async def start(self) -> None:
+        """
+        Spawns the renderer processes and waits until each one is warm.
+        Safe to call twice; render() also starts the pool lazily.
+        """
+        if self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # Not fork: the parent holds an event loop, DB pool and open sockets
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self._initializer
+        )
+        self._slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _listo) for _ in range(self.workers)))
+        logger.info(f"PDF renderer pool started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def render(self, funcion: Callable[..., Any], *args: Any) -> Any:
+        """
+        Runs funcion(*args) (a picklable, module-level callable) in a renderer process.
+        """
+        if self._en_cola + self._en_render >= self.workers + self.max_cola:
+            self._rechazados += 1
+            raise RenderSaturadoError(
+                f"PDF renderer saturated ({self._en_render} rendering, {self._en_cola} queued)"
+            )
+        await self.start()
+
+        self._en_cola += 1
+        encolado = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._en_cola -= 1
+        self._waits.append(time.monotonic() - encolado)
+
+        self._en_render += 1
+        inicio = time.monotonic()
+        liberar = functools.partial(self._liberar_slot, self._slots)
+        try:
+            futuro = asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+        except BaseException:
+            liberar()
+            raise
+        # The slot follows the process, not this caller: a timed-out or
+        # cancelled render still occupies its worker until it finishes
+        futuro.add_done_callback(liberar)
+        try:
+            resultado = await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise RenderTimeoutError(f"PDF render exceeded {self.timeout}s")
+        except Exception:
+            self._errores += 1
+            raise
+        self._renders.append(time.monotonic() - inicio)
+        self._completados += 1
+        return resultado
+
+    def _liberar_slot(self, slots: asyncio.Semaphore, futuro: Optional[asyncio.Future] = None) -> None:
+        self._en_render -= 1
+        slots.release()
+        # Nobody awaits a timed-out render's outcome any more
+        if futuro is not None and not futuro.cancelled():
+            futuro.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        renders = sorted(self._renders)
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "rendering": self._en_render,
+            "queue_depth": self._en_cola,
+            "queue_max": self.max_cola,
+            "completed": self._completados,
+            "rejected": self._rechazados,
+            "timeouts": self._timeouts,
+            "errors": self._errores,
+            "queue_wait_avg_seconds": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "queue_wait_p95_seconds": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+            "render_avg_seconds": round(sum(renders) / len(renders), 4) if renders else 0.0,
+            "render_p95_seconds": round(renders[int(0.95 * (len(renders) - 1))], 4) if renders else 0.0,
+        }
+
+
+renderer_pool = PdfRendererPool(
+    settings.PDF_RENDER_WORKERS, settings.PDF_RENDER_QUEUE_MAX, settings.PDF_RENDER_TIMEOUT_SECONDS
+)
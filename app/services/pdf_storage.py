@@ -0,0 +1,276 @@
+import asyncio
+import datetime
+import hashlib
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+# Optional: boto3 is only needed for the S3 backend
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Renderer processes write here first; guardar() then moves or uploads the file
+DIRECTORIO_RENDER = os.path.join(BASE_DIR, "storage", "render_tmp")
+os.makedirs(DIRECTORIO_RENDER, exist_ok=True)
+
+CHUNK_BYTES = 64 * 1024
+
+
+class ObjetoPdf(NamedTuple):
+    url: str
+    tamaño_bytes: int
+    modificado: datetime.datetime
+
+
+class PdfStorage(ABC):
+    """
+    Where rendered reports live. Writes are addressed by clave_pdf (content
+    address); reads, listing and deletes by the url recorded in
+    VehiculoEstudio.url_pdf, so a row keeps pointing at the exact object it was
+    rendered into.
+    """
+
+    @abstractmethod
+    def url(self, clave: str) -> str:
+        ...
+
+    @abstractmethod
+    def es_propia(self, url: Optional[str]) -> bool:
+        """
+        True if url points into this backend (otherwise the PDF is rendered again).
+        """
+
+    @abstractmethod
+    async def guardar(self, clave: str, ruta_origen: str, pdf_hash: str) -> str:
+        """
+        Stores the rendered file at ruta_origen (consumed) and returns its url.
+        """
+
+    @abstractmethod
+    async def buscar(self, clave: str) -> Optional[Tuple[str, str, int]]:
+        """
+        (url, hash, size) of an already stored render of clave, or None.
+        """
+
+    @abstractmethod
+    async def existe(self, url: str) -> bool:
+        ...
+
+    @abstractmethod
+    def leer(self, url: str) -> AsyncIterator[bytes]:
+        """
+        The object's bytes in chunks of CHUNK_BYTES.
+        """
+
+    @abstractmethod
+    async def eliminar(self, url: str) -> None:
+        ...
+
+    @abstractmethod
+    def listar(self) -> AsyncIterator[ObjetoPdf]:
+        ...
+
+    def ruta_local(self, url: str) -> Optional[str]:
+        """
+        Path on this host, when the backend has one (served with sendfile and Range).
+        """
+        return None
+
+
+def _shard(clave: str) -> str:
+    # Two levels of 256 directories: no directory grows past a few thousand files
+    return f"{clave[:2]}/{clave[2:4]}/{clave}.pdf"
+
+
+def _sha256_archivo(ruta: str) -> str:
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+class AlmacenLocal(PdfStorage):
+    """
+    Sharded directory: <raiz>/ab/cd/<clave>.pdf, url local://pdfs/ab/cd/<clave>.pdf.
+    Files written before sharding (local://pdfs/<clave>.pdf) are still served.
+    """
+    PREFIJO = "local://pdfs/"
+
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+        os.makedirs(raiz, exist_ok=True)
+
+    def url(self, clave: str) -> str:
+        return self.PREFIJO + _shard(clave)
+
+    def es_propia(self, url: Optional[str]) -> bool:
+        return bool(url) and url.startswith(self.PREFIJO)
+
+    def ruta_local(self, url: str) -> Optional[str]:
+        relativa = os.path.normpath(url[len(self.PREFIJO):])
+        if relativa.startswith("..") or os.path.isabs(relativa):
+            return None
+        return os.path.join(self.raiz, relativa)
+
+    def _guardar(self, ruta_origen: str, destino: str) -> None:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            # Same filesystem as DIRECTORIO_RENDER (the default): atomic rename, no copy
+            os.replace(ruta_origen, destino)
+        except OSError:
+            tmp = f"{destino}.{os.getpid()}.tmp"
+            with open(ruta_origen, "rb") as origen, open(tmp, "wb") as f:
+                for chunk in iter(lambda: origen.read(CHUNK_BYTES), b""):
+                    f.write(chunk)
+            os.replace(tmp, destino)
+            os.remove(ruta_origen)
+
+    async def guardar(self, clave: str, ruta_origen: str, pdf_hash: str) -> str:
+        url = self.url(clave)
+        await asyncio.to_thread(self._guardar, ruta_origen, self.ruta_local(url))
+        return url
+
+    async def buscar(self, clave: str) -> Optional[Tuple[str, str, int]]:
+        url = self.url(clave)
+        ruta = self.ruta_local(url)
+        if not os.path.exists(ruta):
+            return None
+        pdf_hash = await asyncio.to_thread(_sha256_archivo, ruta)
+        return url, pdf_hash, os.path.getsize(ruta)
+
+    async def existe(self, url: str) -> bool:
+        ruta = self.ruta_local(url)
+        return ruta is not None and os.path.exists(ruta)
+
+    async def leer(self, url: str) -> AsyncIterator[bytes]:
+        with open(self.ruta_local(url), "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, CHUNK_BYTES):
+                yield chunk
+
+    async def eliminar(self, url: str) -> None:
+        ruta = self.ruta_local(url)
+        if ruta is not None:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+    def _recorrer(self):
+        for directorio, _, archivos in os.walk(self.raiz):
+            for archivo in archivos:
+                if not archivo.endswith(".pdf"):
+                    continue
+                ruta = os.path.join(directorio, archivo)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                relativa = os.path.relpath(ruta, self.raiz).replace(os.sep, "/")
+                yield ObjetoPdf(
+                    self.PREFIJO + relativa,
+                    info.st_size,
+                    datetime.datetime.fromtimestamp(info.st_mtime, datetime.timezone.utc)
+                )
+
+    async def listar(self) -> AsyncIterator[ObjetoPdf]:
+        recorrido = self._recorrer()
+        while objeto := await asyncio.to_thread(next, recorrido, None):
+            yield objeto
+
+
+class AlmacenS3(PdfStorage):
+    """
+    S3-compatible bucket (AWS, MinIO...), url s3://<bucket>/<prefix>ab/cd/<clave>.pdf.
+    The sha256 of each PDF is kept in the object metadata. boto3 is blocking, so
+    every call runs in a thread; uploads are multipart and streamed from the file.
+    """
+
+    def __init__(self, bucket: str, prefijo: str = "", endpoint_url: str = "", region: str = ""):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("PDF_STORAGE_BACKEND=s3 requires boto3")
+        if not bucket:
+            raise RuntimeError("PDF_STORAGE_BACKEND=s3 requires PDF_STORAGE_S3_BUCKET")
+        self.bucket = bucket
+        self.prefijo = prefijo
+        self._s3 = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def _key(self, url: str) -> str:
+        return url[len(f"s3://{self.bucket}/"):]
+
+    def url(self, clave: str) -> str:
+        return f"s3://{self.bucket}/{self.prefijo}{_shard(clave)}"
+
+    def es_propia(self, url: Optional[str]) -> bool:
+        return bool(url) and url.startswith(f"s3://{self.bucket}/{self.prefijo}")
+
+    async def guardar(self, clave: str, ruta_origen: str, pdf_hash: str) -> str:
+        url = self.url(clave)
+        await asyncio.to_thread(
+            self._s3.upload_file, ruta_origen, self.bucket, self._key(url),
+            ExtraArgs={"ContentType": "application/pdf", "Metadata": {"sha256": pdf_hash}}
+        )
+        os.remove(ruta_origen)
+        return url
+
+    async def _head(self, url: str) -> Optional[dict]:
+        try:
+            return await asyncio.to_thread(self._s3.head_object, Bucket=self.bucket, Key=self._key(url))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def buscar(self, clave: str) -> Optional[Tuple[str, str, int]]:
+        url = self.url(clave)
+        head = await self._head(url)
+        pdf_hash = (head or {}).get("Metadata", {}).get("sha256")
+        if pdf_hash is None:
+            return None
+        return url, pdf_hash, head["ContentLength"]
+
+    async def existe(self, url: str) -> bool:
+        return await self._head(url) is not None
+
+    async def leer(self, url: str) -> AsyncIterator[bytes]:
+        respuesta = await asyncio.to_thread(self._s3.get_object, Bucket=self.bucket, Key=self._key(url))
+        chunks = respuesta["Body"].iter_chunks(CHUNK_BYTES)
+        try:
+            while chunk := await asyncio.to_thread(next, chunks, b""):
+                yield chunk
+        finally:
+            respuesta["Body"].close()
+
+    async def eliminar(self, url: str) -> None:
+        await asyncio.to_thread(self._s3.delete_object, Bucket=self.bucket, Key=self._key(url))
+
+    async def listar(self) -> AsyncIterator[ObjetoPdf]:
+        paginas = iter(self._s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefijo))
+        while pagina := await asyncio.to_thread(next, paginas, None):
+            for objeto in pagina.get("Contents", []):
+                if objeto["Key"].endswith(".pdf"):
+                    yield ObjetoPdf(f"s3://{self.bucket}/{objeto['Key']}", objeto["Size"], objeto["LastModified"])
+
+
+def crear_almacen() -> PdfStorage:
+    if settings.PDF_STORAGE_BACKEND == "s3":
+        return AlmacenS3(
+            settings.PDF_STORAGE_S3_BUCKET,
+            settings.PDF_STORAGE_S3_PREFIX,
+            settings.PDF_STORAGE_S3_ENDPOINT_URL,
+            settings.PDF_STORAGE_S3_REGION
+        )
+    if settings.PDF_STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unknown PDF_STORAGE_BACKEND: {settings.PDF_STORAGE_BACKEND}")
+    return AlmacenLocal(settings.PDF_STORAGE_DIR or os.path.join(BASE_DIR, "storage", "pdfs"))
+
+
+almacen_pdf = crear_almacen()
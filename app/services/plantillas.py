@@ -0,0 +1,90 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterable
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from app.core.config import settings
+
+# Jinja environments shared by every template (PDF report and dashboard)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "app", "templates")
+FRAGMENTOS_DIR = os.path.join(TEMPLATES_DIR, "fragmentos")
+
+# Compiled templates on disk, shared by every API/renderer/job worker process
+BYTECODE_CACHE_DIR = settings.TEMPLATE_BYTECODE_CACHE_DIR or os.path.join(BASE_DIR, "storage", "jinja_cache")
+os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+
+
+def _crear_entorno(enable_async: bool) -> Environment:
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        # Async templates compile to different code: keep their bytecode apart
+        bytecode_cache=FileSystemBytecodeCache(
+            BYTECODE_CACHE_DIR, "__jinja2_async_%s.cache" if enable_async else "__jinja2_%s.cache"
+        ),
+        # Templates only change with a deploy; no mtime check per render
+        auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+        autoescape=select_autoescape(["html"]),
+        enable_async=enable_async
+    )
+
+
+# Sync for the renderer processes (no event loop there, and about twice as fast);
+# async for pages rendered inside request handlers
+entorno = _crear_entorno(enable_async=False)
+entorno_async = _crear_entorno(enable_async=True)
+
+
+def precompilar() -> None:
+    """
+    Compiles every template once (at startup), filling the in-process caches
+    and the bytecode cache, and loads the static fragments.
+    """
+    for env in (entorno, entorno_async):
+        for nombre in env.list_templates(filter_func=lambda n: not n.startswith("fragmentos/")):
+            env.get_template(nombre)
+    fragmentos_estaticos()
+
+
+@lru_cache(maxsize=1)
+def fragmentos_estaticos() -> Dict[str, Markup]:
+    """
+    Static parts of the report (styles, legal footer) under fragmentos/: plain
+    HTML read once and passed to the template as-is, so a render only
+    evaluates the per-VIN sections.
+    """
+    fragmentos = {}
+    for archivo in sorted(os.listdir(FRAGMENTOS_DIR)):
+        nombre, extension = os.path.splitext(archivo)
+        if extension == ".html":
+            with open(os.path.join(FRAGMENTOS_DIR, archivo), "r", encoding="utf-8") as f:
+                fragmentos[nombre] = Markup(f.read().strip())
+    return fragmentos
+
+
+def version_plantillas(nombres: Iterable[str]) -> str:
+    """
+    Version id of a set of templates: hash of their sources plus the static
+    fragments. Any template edit changes it.
+    """
+    digest = hashlib.sha256()
+    fuentes = [os.path.join(TEMPLATES_DIR, n) for n in nombres]
+    fuentes += [os.path.join(FRAGMENTOS_DIR, f) for f in sorted(os.listdir(FRAGMENTOS_DIR))]
+    for ruta in fuentes:
+        with open(ruta, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+async def render_async(nombre: str, contexto: Dict[str, Any]) -> str:
+    return await entorno_async.get_template(nombre).render_async(contexto)
+
+
+def render(nombre: str, contexto: Dict[str, Any]) -> str:
+    """
+    Synchronous render, for renderer processes (blocking; never on the event loop).
+    """
+    return entorno.get_template(nombre).render(contexto)
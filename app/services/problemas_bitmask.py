@@ -0,0 +1,65 @@
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from app.schemas.vehiculo import ComprobacionProblemas
+
+# Bit i is the i-th ComprobacionProblemas field, in declaration order. Stored
+# masks depend on it: never reorder or remove fields, only append new ones
+# (up to 63, the BigInteger sign bit is not used).
+BITS_PROBLEMAS = tuple(ComprobacionProblemas.model_fields)
+_BIT = {nombre: 1 << i for i, nombre in enumerate(BITS_PROBLEMAS)}
+
+assert len(BITS_PROBLEMAS) <= 63, "ComprobacionProblemas no longer fits in a BigInteger mask"
+
+
+def bit(nombre: str) -> int:
+    """
+    Mask of one flag. Raises KeyError for unknown flag names.
+    """
+    return _BIT[nombre]
+
+
+def mascara(nombres: Iterable[str]) -> int:
+    resultado = 0
+    for nombre in nombres:
+        resultado |= _BIT[nombre]
+    return resultado
+
+
+def a_bitmask(comprobacion: Union[ComprobacionProblemas, Dict[str, Any], None]) -> Optional[int]:
+    """
+    Packs the flags set to True. None stays None (no check data, not "all clear").
+    """
+    if comprobacion is None:
+        return None
+    if isinstance(comprobacion, ComprobacionProblemas):
+        comprobacion = comprobacion.model_dump()
+    resultado = 0
+    for nombre, valor in comprobacion.items():
+        if valor is True and nombre in _BIT:
+            resultado |= _BIT[nombre]
+    return resultado
+
+
+def desde_bitmask(mask: Optional[int]) -> Optional[Dict[str, bool]]:
+    """
+    Unpacks a mask into the ComprobacionProblemas model_dump() shape.
+    """
+    if mask is None:
+        return None
+    return {nombre: bool(mask & b) for nombre, b in _BIT.items()}
+
+
+def nombres_activos(mask: Optional[int]) -> List[str]:
+    if not mask:
+        return []
+    return [nombre for nombre, b in _BIT.items() if mask & b]
+
+
+def detalle_con_problemas(detalle: Optional[Dict[str, Any]], mask: Optional[int]) -> Optional[Dict[str, Any]]:
+    """
+    detalle_estudio as stored (flags stripped, they live in problemas_bitmask)
+    with comprobacionDeProblemas restored for clients of the verbose form.
+    """
+    if detalle is None or mask is None:
+        return detalle
+    return {**detalle, "comprobacionDeProblemas": desde_bitmask(mask)}
@@ -1,22 +1,190 @@
 import httpx
 import asyncio
-from typing import Dict, Any, Tuple
+import re
+import time
+from typing import Awaitable, Callable, Dict, Any, Iterable, Optional, Tuple, Union
 from app.core.config import settings
-from app.services.wmi_detector import get_vehicle_origin_from_vin
+from app.services.wmi_detector import get_provider_for_vin
+from app.services.http_clients import get_provider_client
+from app.services.resilience import guards, RetryableError
+from app.services.quota_scheduler import schedulers, deadline_por_defecto, Prioridad, PrioridadCompartida
+from app.services.normalizer import VINAUDIT_CLAVES_USADAS
+from app.core.exceptions import ProviderConfigError, ProviderError, ProviderNotFoundError, ProviderPayloadTooLargeError
 
 import json
 import os
 import hashlib
 
-async def fetch_vinaudit_data(vin: str) -> Dict[str, Any]:
+# Optional: orjson decodes straight from bytes several times faster than json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# VinAudit "error" values that mean the VIN has no report (not a request problem)
+VINAUDIT_SIN_REGISTROS = frozenset({"no_records", "invalid_vin", "vin_not_found"})
+
+# Top-level keys kept by the incremental VinAudit decoder: the normalizer's
+# sections plus the status fields checked here
+VINAUDIT_CLAVES = frozenset(VINAUDIT_CLAVES_USADAS) | {"vin", "success", "error", "error_message"}
+
+
+def _loads(buf) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(buf)
+    return json.loads(bytes(buf))
+
+
+_ESPACIO = re.compile(rb"[ \t\n\r]*")
+_ESCALAR = re.compile(rb"[^,}\]\s]+")
+# Inside an object/array: runs of non-bracket bytes, strings (which may contain brackets) consumed whole
+_RELLENO = re.compile(rb'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+def _fin_cadena(buf: bytes, pos: int) -> int:
+    """
+    Index just past the string opening at pos (memchr-speed for long strings).
+    """
+    while True:
+        pos = buf.find(b'"', pos + 1)
+        if pos < 0:
+            raise ValueError("Unterminated string")
+        barras = pos - 1
+        while buf[barras] == 0x5C: # backslash
+            barras -= 1
+        if (pos - 1 - barras) % 2 == 0:
+            return pos + 1
+
+
+def _fin_valor(buf: bytes, pos: int) -> int:
+    """
+    Index just past the JSON value starting at pos, found by scanning
+    brackets and strings only (no objects are built).
+    """
+    inicio = buf[pos:pos + 1]
+    if inicio == b'"':
+        return _fin_cadena(buf, pos)
+    if inicio not in (b"{", b"["):
+        m = _ESCALAR.match(buf, pos)
+        if m is None:
+            raise ValueError(f"Expected a value at {pos}")
+        return m.end()
+    profundidad = 0
+    while pos < len(buf):
+        token = buf[pos:pos + 1]
+        if token in (b"{", b"["):
+            profundidad += 1
+        elif token in (b"}", b"]"):
+            profundidad -= 1
+            if profundidad == 0:
+                return pos + 1
+        else:
+            break
+        pos = _RELLENO.match(buf, pos + 1).end()
+    raise ValueError("Unterminated object/array")
+
+
+def extraer_secciones(buf: bytes, claves: Iterable[str]) -> Dict[str, Any]:
+    """
+    Decodes only the listed top-level keys of a JSON object. The other values
+    are skipped without being materialized, so large unused sections (or
+    padding) never become Python objects. Trades CPU (a Python-level bracket
+    scan) for peak memory. Raises ValueError on malformed JSON.
+    """
+    claves = frozenset(claves)
+    vista = memoryview(buf)
+    resultado: Dict[str, Any] = {}
+    pos = _ESPACIO.match(buf, 0).end()
+    if buf[pos:pos + 1] != b"{":
+        raise ValueError("Expected a JSON object")
+    pos = _ESPACIO.match(buf, pos + 1).end()
+    if buf[pos:pos + 1] == b"}":
+        return resultado
+
+    while True:
+        if buf[pos:pos + 1] != b'"':
+            raise ValueError(f"Expected a key at {pos}")
+        fin = _fin_cadena(buf, pos)
+        clave = _loads(vista[pos:fin])
+        pos = _ESPACIO.match(buf, fin).end()
+        if buf[pos:pos + 1] != b":":
+            raise ValueError(f"Expected ':' at {pos}")
+        pos = _ESPACIO.match(buf, pos + 1).end()
+        fin = _fin_valor(buf, pos)
+        if clave in claves:
+            resultado[clave] = _loads(vista[pos:fin])
+        pos = _ESPACIO.match(buf, fin).end()
+        separador = buf[pos:pos + 1]
+        if separador == b"}":
+            return resultado
+        if separador != b",":
+            raise ValueError(f"Expected ',' or '}}' at {pos}")
+        pos = _ESPACIO.match(buf, pos + 1).end()
+
+
+def decodificar_cuerpo(buf: bytes, claves: Optional[Iterable[str]] = None) -> Any:
+    """
+    Decodes a provider body: whole document, or only `claves` (incremental mode).
+    """
+    if claves is None:
+        return _loads(buf)
+    return extraer_secciones(buf, claves)
+
+
+async def _get_limitado(client: httpx.AsyncClient, proveedor: str, url: str, **kwargs) -> Tuple[httpx.Response, bytes]:
+    """
+    GET that streams the body into one buffer and aborts once it passes
+    PROVIDER_MAX_BODY_BYTES (checked against Content-Length first).
+    """
+    limite = settings.PROVIDER_MAX_BODY_BYTES
+    async with client.stream("GET", url, **kwargs) as response:
+        declarado = response.headers.get("content-length")
+        if declarado and declarado.isdigit() and int(declarado) > limite:
+            raise ProviderPayloadTooLargeError(f"Content-Length {declarado} > {limite} bytes", proveedor=proveedor)
+        buf = bytearray()
+        async for chunk in response.aiter_bytes():
+            buf += chunk
+            if len(buf) > limite:
+                raise ProviderPayloadTooLargeError(f"Body exceeded {limite} bytes", proveedor=proveedor)
+    return response, bytes(buf)
+
+
+def _check_http_error(response: httpx.Response, proveedor: str) -> None:
+    """
+    Remaining 4xx answers are definitive; their bodies are not decoded.
+    """
+    if response.status_code == 404:
+        raise ProviderNotFoundError(f"HTTP 404 from {response.url.host}", proveedor=proveedor)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise ProviderError(str(e), proveedor=proveedor) from e
+
+
+def _request_timeout(timeout: float, connect_timeout: float) -> httpx.Timeout:
+    return httpx.Timeout(timeout, connect=min(connect_timeout, timeout))
+
+
+def _check_retryable(response: httpx.Response) -> None:
+    """
+    5xx and 429 are transient provider trouble: retried and counted by the breaker.
+    """
+    if response.status_code >= 500 or response.status_code == 429:
+        raise RetryableError(f"HTTP {response.status_code} from {response.url.host}")
+
+
+async def fetch_vinaudit_data(vin: str, cuota: Optional[Callable[[bool], Awaitable[None]]] = None) -> Dict[str, Any]:
     """
     Integration for VinAudit API (United States).
+    Raises ProviderError on failure (ProviderUnavailableError while the breaker is open).
+    cuota is awaited before each attempt (see ProviderGuard.call).
     """
-    api_key = settings.VINAUDIT_API_KEY
+    api_key = settings.VINAUDIT_API_KEY or ("simulator" if settings.PROVIDER_SIMULATOR_URL else "")
     if not api_key:
-        return {"status": "error_fallback", "error": "API Key not configured", "data": {}}
+        raise ProviderConfigError("API Key not configured", proveedor="VinAudit")
 
-    url = f"https://api.vinaudit.com/v2/pullreport"
+    url = "/v2/pullreport"
     params = {
         "key": api_key,
         "vin": vin,
@@ -26,26 +194,45 @@ async def fetch_vinaudit_data(vin: str) -> Dict[str, Any]:
         "mode": "prod"
     }
 
-    async with httpx.AsyncClient() as client:
+    client = get_provider_client("VinAudit")
+
+    async def pull(timeout: float) -> Dict[str, Any]:
         try:
-            response = await client.get(url, params=params, timeout=15.0)
-            response.raise_for_status()
-            data = response.json()
-            if not data.get("success"):
-                return {"status": "error_fallback", "error": data.get("error_message", "Unknown error"), "data": {}}
-            return {"status": "success", "data": data}
-        except httpx.HTTPError as e:
-            # Fallback to empty context on error for testing purposes
-            return {"status": "error_fallback", "error": str(e), "data": {}}
+            response, body = await _get_limitado(
+                client, "VinAudit", url, params=params,
+                timeout=_request_timeout(timeout, settings.VINAUDIT_CONNECT_TIMEOUT)
+            )
+        except httpx.TransportError as e:
+            # Timeouts, refused/reset connections
+            raise RetryableError(str(e) or type(e).__name__) from e
+        _check_retryable(response)
+        _check_http_error(response, "VinAudit")
+        try:
+            return decodificar_cuerpo(body, VINAUDIT_CLAVES if settings.PROVIDER_DECODE_INCREMENTAL else None)
+        except ValueError as e:
+            raise RetryableError(f"Invalid JSON body: {e}") from e
+
+    try:
+        data = await guards["VinAudit"].call(pull, cuota)
+    except RetryableError as e:
+        raise ProviderError(str(e), proveedor="VinAudit") from e
 
+    if not data.get("success"):
+        error_cls = ProviderNotFoundError if data.get("error") in VINAUDIT_SIN_REGISTROS else ProviderError
+        raise error_cls(data.get("error_message", "Unknown error"), proveedor="VinAudit")
+    return {"status": "success", "data": data}
 
 
-async def fetch_vincario_data(vin: str) -> Dict[str, Any]:
+async def fetch_vincario_data(vin: str, cuota: Optional[Callable[[bool], Awaitable[None]]] = None) -> Dict[str, Any]:
     """
     Integration for Vincario API (International/Korea).
+    Raises ProviderError on failure (ProviderUnavailableError while the breaker is open).
+    cuota is awaited before each attempt (see ProviderGuard.call).
     """
     api_key = settings.VINCARIO_API_KEY
     secret_key = settings.VINCARIO_SECRET_KEY
+    if settings.PROVIDER_SIMULATOR_URL and not (api_key and secret_key):
+        api_key, secret_key = "simulator", "simulator"
     
     if not api_key or not secret_key or api_key.startswith("dummy"):
         # Not configured properly, fallback to mock
@@ -60,37 +247,61 @@ async def fetch_vincario_data(vin: str) -> Dict[str, Any]:
     raw_string = f"{vin_upper}|{endpoint_id}|{api_key}|{secret_key}"
     control_sum = hashlib.sha1(raw_string.encode('utf-8')).hexdigest()[:10]
 
-    url = f"https://api.vincario.com/3.2/{api_key}/{control_sum}/{endpoint_id}/{vin_upper}.json"
+    url = f"/3.2/{api_key}/{control_sum}/{endpoint_id}/{vin_upper}.json"
 
-    async with httpx.AsyncClient() as client:
+    client = get_provider_client("Vincario")
+
+    async def decode(timeout: float) -> Dict[str, Any]:
+        try:
+            response, body = await _get_limitado(
+                client, "Vincario", url, timeout=_request_timeout(timeout, settings.VINCARIO_CONNECT_TIMEOUT)
+            )
+        except httpx.TransportError as e:
+            raise RetryableError(str(e) or type(e).__name__) from e
+        _check_retryable(response)
+        _check_http_error(response, "Vincario")
         try:
-            response = await client.get(url, timeout=30.0)
-            data = response.json()
-            
-            # Vincario returns "error": true or false
-            if data.get("error"):
-                # Bad VIN or validation failure
-                return {"status": "error_fallback", "error": str(data), "data": {}}
-                
-            response.raise_for_status()
-            return {"status": "success", "data": data}
-            
-        except httpx.HTTPError as e:
-            # Fallback to mock data on HTTP failure
-            return {"status": "error_fallback", "error": str(e), "data": {}}
-
-
-async def orchestrate_vin_search(vin: str) -> Tuple[Dict[str, Any], str]:
-    """
-    Routes the VIN to the appropriate provider based on its origin (e.g. 1st char).
-    """
-    # Ex: 1, 4, 5 = USA; K = Korea
-    # If the VIN starts with K, route to Vincario (Korea)
-    # If it starts with 1, 4, 5, route to VinAudit (USA)
-    if vin.upper().startswith("K"):
-        data = await fetch_vincario_data(vin)
-        return data, "Vincario"
+            data = decodificar_cuerpo(body)
+        except ValueError as e:
+            raise RetryableError(f"Invalid JSON body: {e}") from e
+
+        # Vincario returns "error": true or false
+        if data.get("error"):
+            # Bad VIN or validation failure
+            raise ProviderNotFoundError(str(data.get("message") or data), proveedor="Vincario")
+        return data
+
+    try:
+        data = await guards["Vincario"].call(decode, cuota)
+    except RetryableError as e:
+        raise ProviderError(str(e), proveedor="Vincario") from e
+
+    return {"status": "success", "data": data}
+
+
+async def orchestrate_vin_search(
+    vin: str,
+    prioridad: Union[Prioridad, PrioridadCompartida] = Prioridad.INTERACTIVA,
+    deadline: Optional[float] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Routes the VIN to its provider using the WMI registry's routing table
+    (app/data/wmi_registry.json: South Korea -> Vincario, everything else VinAudit).
+    Every attempt (retries included) waits for a slot in the provider's quota
+    scheduler first; retries only wait for what is left of the deadline.
+    """
+    proveedor = get_provider_for_vin(vin)
+    scheduler = schedulers[proveedor]
+    if deadline is None:
+        actual = prioridad.prioridad if isinstance(prioridad, PrioridadCompartida) else prioridad
+        deadline = deadline_por_defecto(actual)
+    limite = time.monotonic() + deadline
+
+    async def cuota(reintento: bool) -> None:
+        await scheduler.acquire(prioridad, max(0.0, limite - time.monotonic()), reintento=reintento)
+
+    if proveedor == "Vincario":
+        data = await fetch_vincario_data(vin, cuota)
     else:
-        # Defaulting to VinAudit for USA and others for this business case
-        data = await fetch_vinaudit_data(vin)
-        return data, "VinAudit"
+        data = await fetch_vinaudit_data(vin, cuota)
+    return data, proveedor
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.exceptions import ProviderQuotaError
+
+
+class Prioridad(IntEnum):
+    """
+    Lower value is served first.
+    """
+    INTERACTIVA = 0 # GET /vehiculos/estudios
+    JOB = 1 # asynchronous study jobs
+    LOTE = 2 # batch / background work
+
+
+def deadline_por_defecto(prioridad: Prioridad) -> float:
+    return {
+        Prioridad.INTERACTIVA: settings.PROVIDER_DEADLINE_INTERACTIVA_SECONDS,
+        Prioridad.JOB: settings.PROVIDER_DEADLINE_JOB_SECONDS,
+        Prioridad.LOTE: settings.PROVIDER_DEADLINE_LOTE_SECONDS,
+    }[prioridad]
+
+
+class PrioridadCompartida:
+    """
+    Priority of a lookup several callers wait on (single-flight). A follower of
+    a more urgent class raises it, also while the call is queued for quota, so
+    an interactive request that joins a batch lookup is not served at batch
+    priority.
+    """
+
+    def __init__(self, prioridad: Prioridad):
+        self.prioridad = prioridad
+        self._en_cola: Optional[Tuple["ProviderScheduler", asyncio.Future]] = None
+
+    def elevar(self, prioridad: Prioridad) -> None:
+        if prioridad >= self.prioridad:
+            return
+        self.prioridad = prioridad
+        if self._en_cola is not None:
+            scheduler, future = self._en_cola
+            scheduler._reordenar(future, prioridad)
+
+
+class ProviderScheduler:
+    """
+    Token bucket (rate/burst) in front of one provider, with a bounded priority
+    queue for callers that arrive while the bucket is empty. Callers whose
+    estimated wait exceeds their deadline are rejected up front.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_queue: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queue: List[tuple] = [] # (prioridad, seq, future)
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._waits = deque(maxlen=500)
+        self._granted = 0
+        self._retries = 0
+        self._rejected = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _waiting(self) -> int:
+        return sum(1 for _, _, f in self._queue if not f.done())
+
+    def _estimated_wait(self, prioridad: Prioridad) -> float:
+        ahead = sum(1 for p, _, f in self._queue if p <= prioridad and not f.done())
+        return max(0.0, (ahead + 1 - self._tokens) / self.rate)
+
+    def _reordenar(self, future: asyncio.Future, prioridad: Prioridad) -> None:
+        # Keeps its sequence number: among equals it is still served in arrival order
+        for i, (_, seq, f) in enumerate(self._queue):
+            if f is future:
+                self._queue[i] = (int(prioridad), seq, f)
+                heapq.heapify(self._queue)
+                return
+
+    def _reject(self, motivo: str) -> ProviderQuotaError:
+        self._rejected += 1
+        return ProviderQuotaError(motivo, proveedor=self.name, retry_after=self._estimated_wait(Prioridad.INTERACTIVA))
+
+    async def acquire(
+        self,
+        prioridad: Union[Prioridad, PrioridadCompartida] = Prioridad.INTERACTIVA,
+        deadline: Optional[float] = None,
+        reintento: bool = False
+    ) -> None:
+        """
+        Waits for a provider call slot. Raises ProviderQuotaError when the slot
+        would arrive after `deadline` seconds or the queue is full.
+        A PrioridadCompartida can be raised while the caller is queued.
+        reintento marks the slot of a retried attempt (counted in stats).
+        """
+        compartida = prioridad if isinstance(prioridad, PrioridadCompartida) else None
+        if compartida is not None:
+            prioridad = compartida.prioridad
+        deadline = deadline_por_defecto(prioridad) if deadline is None else deadline
+        self._refill()
+
+        if not self._waiting() and self._tokens >= 1:
+            self._tokens -= 1
+            self._granted += 1
+            if reintento:
+                self._retries += 1
+            self._waits.append(0.0)
+            return
+
+        if self._estimated_wait(prioridad) > deadline:
+            raise self._reject(f"Cuota de {self.name} no disponible antes de {deadline:g}s")
+        if self._waiting() >= self.max_queue:
+            raise self._reject(f"Cola de {self.name} llena ({self.max_queue})")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(prioridad), next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        start = time.monotonic()
+        if compartida is not None:
+            compartida._en_cola = (self, future)
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            raise self._reject(f"Tiempo de espera de cuota de {self.name} agotado")
+        finally:
+            if compartida is not None:
+                compartida._en_cola = None
+        if reintento:
+            self._retries += 1
+        self._waits.append(time.monotonic() - start)
+
+    async def _dispatch(self) -> None:
+        """
+        Hands out tokens to queued callers, highest priority first, as the bucket refills.
+        """
+        while self._queue:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                # Caller gave up (deadline/cancel): its slot goes to the next one
+                continue
+            self._tokens -= 1
+            self._granted += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        waits = sorted(self._waits)
+        por_prioridad = {p.name.lower(): 0 for p in Prioridad}
+        for p, _, f in self._queue:
+            if not f.done():
+                por_prioridad[Prioridad(p).name.lower()] += 1
+        return {
+            "queue_depth": sum(por_prioridad.values()),
+            "queue_by_priority": por_prioridad,
+            "tokens_available": round(self._tokens, 2),
+            "rate_per_second": self.rate,
+            "granted": self._granted,
+            # Of granted: slots taken by retried attempts of the same lookup
+            "retries": self._retries,
+            "rejected": self._rejected,
+            "wait_avg_seconds": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95_seconds": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+        }
+
+
+schedulers: Dict[str, ProviderScheduler] = {
+    "VinAudit": ProviderScheduler(
+        "VinAudit", settings.VINAUDIT_RATE_PER_SECOND, settings.VINAUDIT_BURST, settings.VINAUDIT_QUEUE_MAX
+    ),
+    "Vincario": ProviderScheduler(
+        "Vincario", settings.VINCARIO_RATE_PER_SECOND, settings.VINCARIO_BURST, settings.VINCARIO_QUEUE_MAX
+    ),
+}
+
+
+def get_queue_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
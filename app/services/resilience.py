@@ -0,0 +1,244 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.core.exceptions import ProviderUnavailableError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies. The request timeout follows the
+    observed p99 (times a safety multiplier), clamped to [minimum, maximum].
+    """
+
+    def __init__(self, maximum: float, window: int, minimum: float, multiplier: float):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.multiplier = multiplier
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout(self) -> float:
+        # Not enough history yet: use the configured ceiling
+        if len(self._samples) < 20:
+            return self.maximum
+        p99 = self.percentile(99)
+        return max(self.minimum, min(self.maximum, p99 * self.multiplier))
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent traffic (plus a small floor), so a degraded
+    provider is not hit with a retry storm.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, ttl: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.ttl = ttl
+        self._requests = deque()
+        self._retries = deque()
+
+    def _trim(self, now: float) -> None:
+        for q in (self._requests, self._retries):
+            while q and now - q[0] > self.ttl:
+                q.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_withdraw(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        allowed = self.min_per_second * self.ttl + self.ratio * len(self._requests)
+        if len(self._retries) < allowed:
+            self._retries.append(now)
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open after N consecutive failures; open -> half_open after reset_timeout;
+    half_open lets a few probes through and closes on success / reopens on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._half_open_calls = 0
+        # Bumped on every open -> half_open, so a late release cannot free a later probe's slot
+        self._half_open_round = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_round += 1
+            logger.info(f"Circuit breaker {self.name}: half-open, probing provider")
+        if self.state == HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                return False
+            self._half_open_calls += 1
+        return True
+
+    def probe_round(self) -> Optional[int]:
+        """
+        Right after allow(): the half-open round whose probe slot the call took, or None.
+        """
+        return self._half_open_round if self.state == HALF_OPEN else None
+
+    def release_probe(self, round_: Optional[int]) -> None:
+        """
+        Gives back a probe slot whose call ended without a verdict (cancelled).
+        No-op once the probe's outcome has closed or reopened the breaker.
+        """
+        if round_ is not None and self.state == HALF_OPEN and round_ == self._half_open_round:
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def on_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"Circuit breaker {self.name}: closed")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+
+    def on_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit breaker {self.name}: open after {self.consecutive_failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryableError(Exception):
+    """
+    Raised by a provider call for failures worth retrying (timeouts, 5xx, connection errors).
+    """
+
+
+class ProviderGuard:
+    """
+    Breaker + retry budget + adaptive timeout for one provider.
+    """
+
+    def __init__(self, name: str, max_timeout: float):
+        self.name = name
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.PROVIDER_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.PROVIDER_BREAKER_RESET_SECONDS,
+            half_open_max_calls=settings.PROVIDER_BREAKER_HALF_OPEN_CALLS,
+        )
+        self.budget = RetryBudget(
+            ratio=settings.PROVIDER_RETRY_BUDGET_RATIO,
+            min_per_second=settings.PROVIDER_RETRY_BUDGET_MIN_PER_SECOND,
+        )
+        self.latency = LatencyTracker(
+            maximum=max_timeout,
+            window=settings.PROVIDER_LATENCY_WINDOW,
+            minimum=settings.PROVIDER_TIMEOUT_MIN_SECONDS,
+            multiplier=settings.PROVIDER_TIMEOUT_P99_MULTIPLIER,
+        )
+
+    async def call(
+        self,
+        fn: Callable[[float], Awaitable[Any]],
+        cuota: Optional[Callable[[bool], Awaitable[None]]] = None
+    ) -> Any:
+        """
+        Runs fn(timeout) with jittered exponential backoff between attempts.
+        RetryableError counts against the breaker; any other exception is a
+        definitive provider answer and is re-raised as is.
+        cuota(reintento) is awaited before every attempt (the quota scheduler's
+        slot), so retries are paced by the provider's rate limit like first
+        calls; whatever it raises (ProviderQuotaError) ends the call.
+        """
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            if cuota is not None:
+                await cuota(attempt > 0)
+            if not self.breaker.allow():
+                raise ProviderUnavailableError(
+                    f"Circuit breaker abierto para {self.name}",
+                    proveedor=self.name,
+                    retry_after=self.breaker.retry_after()
+                )
+            probe = self.breaker.probe_round()
+            attempt += 1
+            start = time.monotonic()
+            try:
+                try:
+                    result = await fn(self.latency.timeout())
+                finally:
+                    # A cancelled probe (client disconnect, single-flight cancel,
+                    # deadline) gives no verdict: free its slot for the next one
+                    self.breaker.release_probe(probe)
+            except RetryableError as e:
+                self.breaker.on_failure()
+                if (attempt >= settings.PROVIDER_RETRY_MAX_ATTEMPTS
+                        or self.breaker.state == OPEN
+                        or not self.budget.try_withdraw()):
+                    raise
+                # Full jitter: sleep U(0, min(cap, base * 2^attempt))
+                delay = random.uniform(0, min(settings.PROVIDER_RETRY_MAX_DELAY, settings.PROVIDER_RETRY_BASE_DELAY * 2 ** attempt))
+                logger.warning(f"{self.name} attempt {attempt} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                # The provider answered (e.g. 4xx / unknown VIN): it is healthy
+                self.breaker.on_success()
+                raise
+            self.latency.record(time.monotonic() - start)
+            self.breaker.on_success()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        p99 = self.latency.percentile(99)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "retry_after_seconds": round(self.breaker.retry_after(), 1) if self.breaker.state == OPEN else 0,
+            "p99_latency_seconds": round(p99, 3) if p99 is not None else None,
+            "timeout_seconds": round(self.latency.timeout(), 3),
+        }
+
+
+guards: Dict[str, ProviderGuard] = {
+    "VinAudit": ProviderGuard("VinAudit", settings.VINAUDIT_TIMEOUT),
+    "Vincario": ProviderGuard("Vincario", settings.VINCARIO_TIMEOUT),
+}
+
+
+def get_breaker_states() -> Dict[str, Dict[str, Any]]:
+    return {name: guard.snapshot() for name, guard in guards.items()}
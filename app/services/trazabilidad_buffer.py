@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.vehiculo import Trazabilidad
+
+ESPERAR = "esperar"
+DESCARTAR = "descartar"
+
+# Every queued row carries all the columns, so each batch is one executemany
+_COLUMNAS = [c.name for c in Trazabilidad.__table__.columns if c.name != "id"]
+
+
+class BufferTrazabilidad:
+    """
+    Write-behind buffer for Trazabilidad rows. Requests only append the event;
+    a background task writes them with one bulk INSERT per batch, when `lote`
+    rows are waiting or `intervalo` seconds after the first one arrived.
+    When `maximo` rows are pending, registrar() waits for the next flush
+    (desborde="esperar") or drops the row and counts it (desborde="descartar").
+    stop() writes whatever is left.
+    """
+
+    def __init__(self, maximo: int, lote: int, intervalo: float, desborde: str = ESPERAR):
+        self.maximo = max(1, maximo)
+        self.lote = max(1, min(lote, self.maximo))
+        self.intervalo = intervalo
+        self.desborde = desborde
+        self._pendientes: Deque[Dict[str, Any]] = deque()
+        self._hay_datos = asyncio.Event()
+        self._lote_listo = asyncio.Event()
+        self._espacio = asyncio.Event()
+        self._espacio.set()
+        self._task: Optional[asyncio.Task] = None
+        self._detener = False
+        self._flushes = deque(maxlen=500)
+        self._registrados = 0
+        self._escritos = 0
+        self._descartados = 0
+        self._esperas = 0
+        self._errores = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._detener = False
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        """
+        Stops the flusher and writes the pending rows (called on shutdown).
+        """
+        if self._task is not None:
+            # Not cancelled: a batch being inserted must not be lost half way
+            task, self._task = self._task, None
+            self._detener = True
+            self._hay_datos.set()
+            self._lote_listo.set()
+            await asyncio.gather(task, return_exceptions=True)
+        while self._pendientes:
+            if not await self._flush():
+                logger.error(f"Trazabilidad buffer: {len(self._pendientes)} rows lost on shutdown")
+                self._descartados += len(self._pendientes)
+                self._pendientes.clear()
+
+    async def registrar(self, **campos: Any) -> None:
+        """
+        Queues one Trazabilidad row (column name -> value). fecha_consulta is
+        taken now, not at flush time.
+        """
+        await self.registrar_muchos([campos])
+
+    async def registrar_muchos(self, filas: List[Dict[str, Any]]) -> None:
+        # Started lazily for scripts that run without the API lifespan
+        self.start()
+        ahora = datetime.datetime.now(datetime.timezone.utc)
+        for campos in filas:
+            fila = {columna: campos.get(columna) for columna in _COLUMNAS}
+            fila["fecha_consulta"] = campos.get("fecha_consulta") or ahora
+            fila["llamada_externa"] = bool(campos.get("llamada_externa"))
+            while len(self._pendientes) >= self.maximo:
+                if self.desborde == DESCARTAR:
+                    self._descartados += 1
+                    break
+                self._esperas += 1
+                self._espacio.clear()
+                self._hay_datos.set()
+                self._lote_listo.set()
+                await self._espacio.wait()
+            else:
+                self._pendientes.append(fila)
+                self._registrados += 1
+        self._hay_datos.set()
+        if len(self._pendientes) >= self.lote:
+            self._lote_listo.set()
+
+    async def _loop(self) -> None:
+        while not self._detener:
+            await self._hay_datos.wait()
+            try:
+                await asyncio.wait_for(self._lote_listo.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            while self._pendientes:
+                if not await self._flush():
+                    # Keep the rows and retry on the next interval
+                    await asyncio.sleep(self.intervalo)
+                    break
+                if len(self._pendientes) < self.lote:
+                    break
+            if not self._pendientes:
+                self._hay_datos.clear()
+            if len(self._pendientes) < self.lote:
+                self._lote_listo.clear()
+
+    async def _flush(self) -> bool:
+        filas = [self._pendientes.popleft() for _ in range(min(self.lote, len(self._pendientes)))]
+        inicio = time.monotonic()
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(Trazabilidad), filas)
+                await session.commit()
+        except Exception as e:
+            self._errores += 1
+            logger.error(f"Trazabilidad buffer: flush of {len(filas)} rows failed: {e}")
+            self._pendientes.extendleft(reversed(filas))
+            return False
+        finally:
+            if len(self._pendientes) < self.maximo:
+                self._espacio.set()
+        self._flushes.append((time.monotonic() - inicio, len(filas)))
+        self._escritos += len(filas)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        duraciones = sorted(d for d, _ in self._flushes)
+        return {
+            "pending": len(self._pendientes),
+            "max_pending": self.maximo,
+            "batch_size": self.lote,
+            "flush_interval_seconds": self.intervalo,
+            "overflow": self.desborde,
+            "queued": self._registrados,
+            "written": self._escritos,
+            "dropped": self._descartados,
+            "overflow_waits": self._esperas,
+            "flush_errors": self._errores,
+            "rows_per_flush_avg": round(sum(n for _, n in self._flushes) / len(self._flushes), 1) if self._flushes else 0.0,
+            "flush_avg_seconds": round(sum(duraciones) / len(duraciones), 4) if duraciones else 0.0,
+            "flush_p95_seconds": round(duraciones[int(0.95 * (len(duraciones) - 1))], 4) if duraciones else 0.0,
+        }
+
+
+trazabilidad_buffer = BufferTrazabilidad(
+    settings.TRAZABILIDAD_BUFFER_MAX,
+    settings.TRAZABILIDAD_FLUSH_LOTE,
+    settings.TRAZABILIDAD_FLUSH_SEGUNDOS,
+    settings.TRAZABILIDAD_DESBORDE
+)
@@ -0,0 +1,61 @@
+import re
+from typing import Optional
+
+from app.core.exceptions import InvalidVinError
+
+# 17 characters, letters I, O and Q are never used (ISO 3779)
+_VIN_RE = re.compile(r"[A-HJ-NPR-Z0-9]{17}")
+# Separators users paste along with the VIN
+_SEPARADORES = str.maketrans("", "", " -\t")
+
+_PESOS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+_VALORES = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+# The check digit (position 9) is mandatory for North American VINs only
+_REGIONES_CON_DIGITO = frozenset("12345")
+
+
+def canonicalizar(tipo_identificacion: str, identificacion: str) -> str:
+    """
+    Canonical form used as cache/DB key: VINs are upper-cased without separators,
+    chassis/serial numbers are only trimmed.
+    """
+    if tipo_identificacion == "VIN":
+        return identificacion.translate(_SEPARADORES).upper()
+    return identificacion.strip()
+
+
+def digito_verificador(vin: str) -> str:
+    total = sum(_VALORES[c] * p for c, p in zip(vin, _PESOS))
+    resto = total % 11
+    return "X" if resto == 10 else str(resto)
+
+
+def motivo_vin_invalido(vin: str) -> Optional[str]:
+    """
+    Why a canonical VIN is malformed, or None when it is valid.
+    """
+    if len(vin) != 17:
+        return f"Un VIN tiene 17 caracteres (recibidos {len(vin)})"
+    if not _VIN_RE.fullmatch(vin):
+        return "Un VIN solo contiene A-Z (sin I, O, Q) y 0-9"
+    if vin[0] in _REGIONES_CON_DIGITO and vin[8] != digito_verificador(vin):
+        return f"Digito verificador invalido (posicion 9 es {vin[8]}, esperado {digito_verificador(vin)})"
+    return None
+
+
+def preparar_identificacion(tipo_identificacion: str, identificacion: str) -> str:
+    """
+    Canonicalizes the identifier and, for VINs, validates it.
+    Raises InvalidVinError so malformed VINs never reach a provider.
+    """
+    canonica = canonicalizar(tipo_identificacion, identificacion)
+    if tipo_identificacion == "VIN":
+        motivo = motivo_vin_invalido(canonica)
+        if motivo:
+            raise InvalidVinError(motivo)
+    return canonica
@@ -1,24 +1,119 @@
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# ISO 3780 registry (regions, country ranges, known manufacturers) and provider routing.
+REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "wmi_registry.json")
+
+# Order of the second WMI character inside a country range (I, O, Q are never used)
+ORDEN_ISO_3780 = "ABCDEFGHJKLMNPRSTUVWXYZ1234567890"
+
+
+class WmiInfo(NamedTuple):
+    wmi: str
+    fabricante: Optional[str]
+    pais: str
+    region: str
+    proveedor: str
+
+
+DESCONOCIDO = WmiInfo(wmi="", fabricante=None, pais="Unknown", region="Unknown", proveedor="VinAudit")
+
+
+class WmiIndex:
+    """
+    WMI registry flattened into dicts at load time: every valid 2-character prefix
+    maps to its (country, region, provider) and every known 3-character WMI to its
+    manufacturer, so a lookup is two dict hits. Resolved WMIs are memoized
+    (at most 33^3 entries).
+    """
+
+    def __init__(self, registro: dict):
+        proveedores = registro["proveedores"]
+        self.proveedor_defecto: str = proveedores["defecto"]
+        por_region: Dict[str, str] = proveedores.get("por_region", {})
+        por_pais: Dict[str, str] = proveedores.get("por_pais", {})
+        continentes: Dict[str, str] = registro["continentes"]
+
+        pos = {c: i for i, c in enumerate(ORDEN_ISO_3780)}
+        paises: Dict[str, str] = {}
+        for desde, hasta, pais in registro["regiones"]:
+            if desde[0] != hasta[0]:
+                raise ValueError(f"WMI range {desde}-{hasta} spans two regions")
+            for c in ORDEN_ISO_3780[pos[desde[1]]:pos[hasta[1]] + 1]:
+                paises[desde[0] + c] = pais
+
+        self._prefijos: Dict[str, tuple] = {}
+        for primero in ORDEN_ISO_3780:
+            region = continentes.get(primero, "Unknown")
+            for segundo in ORDEN_ISO_3780:
+                prefijo = primero + segundo
+                pais = paises.get(prefijo, "Unknown")
+                proveedor = por_pais.get(pais) or por_region.get(region) or self.proveedor_defecto
+                self._prefijos[prefijo] = (pais, region, proveedor)
+
+        self._fabricantes: Dict[str, str] = dict(registro["fabricantes"])
+        self._cache: Dict[str, WmiInfo] = {}
+
+    def lookup(self, vin: str) -> WmiInfo:
+        """
+        Manufacturer, country, region and routing provider of a VIN (or bare WMI).
+        """
+        if not vin or len(vin) < 3:
+            return DESCONOCIDO
+        wmi = vin[:3].upper()
+        info = self._cache.get(wmi)
+        if info is not None:
+            return info
+        prefijo = self._prefijos.get(wmi[:2])
+        if prefijo is None:
+            info = DESCONOCIDO._replace(wmi=wmi, proveedor=self.proveedor_defecto)
+        else:
+            pais, region, proveedor = prefijo
+            info = WmiInfo(wmi, self._fabricantes.get(wmi), pais, region, proveedor)
+        self._cache[wmi] = info
+        return info
+
+    def lookup_many(self, vins: Iterable[str]) -> List[WmiInfo]:
+        lookup = self.lookup
+        return [lookup(vin) for vin in vins]
+
+    def routing_counts(self, vins: Iterable[str]) -> Dict[str, int]:
+        """
+        How many VINs of a batch go to each provider (quota planning for batch work).
+        """
+        conteo: Dict[str, int] = {}
+        for info in self.lookup_many(vins):
+            conteo[info.proveedor] = conteo.get(info.proveedor, 0) + 1
+        return conteo
+
+
+def _cargar_indice(path: str = REGISTRY_PATH) -> WmiIndex:
+    with open(path, "r", encoding="utf-8") as f:
+        return WmiIndex(json.load(f))
+
+
+wmi_index = _cargar_indice()
+
+
+def detect_wmi(vin: str) -> WmiInfo:
+    return wmi_index.lookup(vin)
+
+
+def detect_wmi_batch(vins: Iterable[str]) -> List[WmiInfo]:
+    return wmi_index.lookup_many(vins)
+
+
+def get_provider_for_vin(vin: str) -> str:
+    """
+    Provider the VIN is routed to, taken from the registry's routing table.
+    """
+    return wmi_index.lookup(vin).proveedor
+
+
 def get_vehicle_origin_from_vin(vin: str) -> str:
     """
-    Identifies if a vehicle is from US or South Korea based on the World Manufacturer Identifier (WMI).
-    WMI is the first 3 characters of the VIN.
+    Country of manufacture based on the World Manufacturer Identifier (WMI),
+    the first 3 characters of the VIN. "Unknown" when it cannot be resolved.
     """
-    if not vin or len(vin) < 3:
-        return "Unknown"
-        
-    wmi = vin[0:3].upper()
-    first_char = wmi[0]
-    first_two_chars = wmi[0:2]
-    
-    # 1, 4, 5 are United States
-    # 2 is Canada, 3 is Mexico - Often batched into US history reports as North America
-    if first_char in ('1', '4', '5'):
-        return "United States"
-        
-    # K is for Korea (e.g. KMH Hyundai, KNA Kia)
-    if first_char == 'K':
-        if first_two_chars in ('KA', 'KB', 'KC', 'KD', 'KE', 'KF', 'KG', 'KH', 'KJ', 'KK', 'KL', 'KM', 'KN', 'KP', 'KR'):
-            return "South Korea"
-            
-    # J is Japan, W is Germany, etc...
-    return "Other"
+    return wmi_index.lookup(vin).pais
@@ -0,0 +1,10 @@
+import argparse
+import uvicorn
+
+parser = argparse.ArgumentParser(description="Run the local VinAudit/Vincario simulator")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8090)
+parser.add_argument("--workers", type=int, default=1)
+args = parser.parse_args()
+
+uvicorn.run("app.simulator.server:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
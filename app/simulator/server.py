@@ -0,0 +1,216 @@
+"""
+Local stand-in for the VinAudit and Vincario APIs, for load and latency testing
+without network access or provider credits.
+
+Run:   python -m app.simulator --port 8090
+Point the API at it:   PROVIDER_SIMULATOR_URL=http://127.0.0.1:8090
+"""
+import asyncio
+import copy
+import datetime
+import hashlib
+import json
+import math
+import os
+import random
+from functools import lru_cache
+from typing import Any, Dict, List
+from fastapi import FastAPI, Query, Response
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MOCK_VINAUDIT_PATH = os.path.join(BASE_DIR, "mock_vinaudit.json")
+
+# Sections of a VinAudit report that scale with SIM_PAYLOAD_RECORDS
+HISTORY_SECTIONS = ("titles", "jsi", "lien", "thefts", "accidents", "salvage", "sales", "checks")
+
+
+class SimulatorSettings(BaseSettings):
+    """
+    Behaviour knobs, read from SIM_* env vars and adjustable live via PUT /_sim/config.
+    """
+    LATENCY_DISTRIBUTION: str = "lognormal" # fixed, uniform, exponential, lognormal
+    LATENCY_MEDIAN_MS: float = 300.0
+    LATENCY_SIGMA: float = 0.5 # lognormal shape
+    LATENCY_MIN_MS: float = 0.0
+    LATENCY_MAX_MS: float = 10000.0
+    ERROR_RATE: float = 0.0 # share of HTTP 5xx answers
+    TIMEOUT_RATE: float = 0.0 # share of requests that hang for TIMEOUT_SECONDS
+    TIMEOUT_SECONDS: float = 120.0
+    NOT_FOUND_RATE: float = 0.0 # share of "success": false / "error": true answers
+    PAYLOAD_RECORDS: int = 0 # records per history section; 0 keeps mock_vinaudit.json as is
+    PAYLOAD_PADDING_BYTES: int = 0 # extra bytes per report, to test large bodies
+    SEED: int = 0
+
+    model_config = SettingsConfigDict(env_prefix="SIM_", extra="ignore")
+
+
+class SimulatorConfigUpdate(BaseModel):
+    LATENCY_DISTRIBUTION: str | None = None
+    LATENCY_MEDIAN_MS: float | None = None
+    LATENCY_SIGMA: float | None = None
+    LATENCY_MIN_MS: float | None = None
+    LATENCY_MAX_MS: float | None = None
+    ERROR_RATE: float | None = None
+    TIMEOUT_RATE: float | None = None
+    TIMEOUT_SECONDS: float | None = None
+    NOT_FOUND_RATE: float | None = None
+    PAYLOAD_RECORDS: int | None = None
+    PAYLOAD_PADDING_BYTES: int | None = None
+
+
+sim_settings = SimulatorSettings()
+_rng = random.Random(sim_settings.SEED or None)
+_stats = {"requests": 0, "errors": 0, "timeouts": 0, "not_found": 0, "bytes_sent": 0}
+
+app = FastAPI(title="GlobalVIN Provider Simulator", docs_url="/_sim/docs", openapi_url="/_sim/openapi.json")
+
+
+def sample_latency_seconds() -> float:
+    cfg = sim_settings
+    median = cfg.LATENCY_MEDIAN_MS
+    if cfg.LATENCY_DISTRIBUTION == "fixed":
+        ms = median
+    elif cfg.LATENCY_DISTRIBUTION == "uniform":
+        ms = _rng.uniform(cfg.LATENCY_MIN_MS, cfg.LATENCY_MAX_MS)
+    elif cfg.LATENCY_DISTRIBUTION == "exponential":
+        ms = _rng.expovariate(math.log(2) / median) if median > 0 else 0.0
+    else:
+        ms = median * math.exp(cfg.LATENCY_SIGMA * _rng.gauss(0, 1))
+    return max(cfg.LATENCY_MIN_MS, min(cfg.LATENCY_MAX_MS, ms)) / 1000
+
+
+@lru_cache(maxsize=1)
+def _mock_report() -> Dict[str, Any]:
+    with open(MOCK_VINAUDIT_PATH, encoding="utf-8") as f:
+        report = json.load(f)
+    # The real API names the sales section "sales" (see docs/vinaudit_reference.md)
+    report["sales"] = report.pop("sale", [])
+    return report
+
+
+def _expand_section(rows: List[Dict[str, Any]], count: int, vin: str, rng: random.Random) -> List[Dict[str, Any]]:
+    if not rows:
+        return []
+    out = []
+    base_date = datetime.date(2024, 12, 31)
+    for i in range(count):
+        row = dict(rows[i % len(rows)])
+        if "vin" in row:
+            row["vin"] = vin
+        if "date" in row:
+            row["date"] = (base_date - datetime.timedelta(days=30 * i + rng.randint(0, 29))).isoformat()
+        if "meter" in row:
+            row["meter"] = str(max(0, 150000 - i * rng.randint(500, 5000)))
+        if "vehicle_mileage" in row or "listing_price" in row:
+            row["vehicle_mileage"] = str(max(0, 150000 - i * rng.randint(500, 5000)))
+            row["listing_price"] = f"${rng.randint(3000, 40000):,}"
+        out.append(row)
+    return out
+
+
+@lru_cache(maxsize=4096)
+def build_vinaudit_report(vin: str, records: int, padding: int) -> bytes:
+    """
+    Synthetic pullreport for a VIN, derived from mock_vinaudit.json. Deterministic per VIN.
+    """
+    rng = random.Random(hashlib.sha1(vin.encode()).hexdigest())
+    report = copy.deepcopy(_mock_report())
+    report["vin"] = vin
+    report["attributes"]["vin"] = vin
+    report["id"] = str(rng.randint(10 ** 13, 10 ** 14 - 1))
+    if records > 0:
+        for section in HISTORY_SECTIONS:
+            report[section] = _expand_section(report.get(section, []), records, vin, rng)
+    if padding > 0:
+        report["_padding"] = "x" * padding
+    return json.dumps(report).encode("utf-8")
+
+
+@lru_cache(maxsize=4096)
+def build_vincario_decode(vin: str, padding: int) -> bytes:
+    rng = random.Random(hashlib.sha1(vin.encode()).hexdigest())
+    decode = [
+        {"label": "VIN", "value": vin},
+        {"label": "Make", "value": rng.choice(["Kia", "Hyundai", "Genesis", "SsangYong"])},
+        {"label": "Model", "value": rng.choice(["Sorento", "Sportage", "Tucson", "Elantra", "G80"])},
+        {"label": "Model Year", "value": rng.randint(2010, 2024)},
+        {"label": "Plant Country", "value": "South Korea"},
+        {"label": "Body", "value": rng.choice(["SUV", "Sedan", "Hatchback"])},
+        {"label": "Engine Displacement (ccm)", "value": rng.choice([1598, 1999, 2497, 3342])},
+        {"label": "Fuel Type - Primary", "value": rng.choice(["Gasoline", "Diesel", "Hybrid"])},
+        {"label": "Transmission", "value": rng.choice(["6-Speed Automatic", "8-Speed Automatic", "Manual"])},
+    ]
+    body: Dict[str, Any] = {"price": 0.0, "price_currency": "EUR", "balance": {}, "decode": decode}
+    if padding > 0:
+        body["_padding"] = "x" * padding
+    return json.dumps(body).encode("utf-8")
+
+
+async def _simulate_network() -> Response | None:
+    """
+    Applies latency and fault injection. Returns an error response, or None to answer normally.
+    """
+    _stats["requests"] += 1
+    roll = _rng.random()
+    if roll < sim_settings.TIMEOUT_RATE:
+        _stats["timeouts"] += 1
+        await asyncio.sleep(sim_settings.TIMEOUT_SECONDS)
+        return Response(status_code=504)
+    await asyncio.sleep(sample_latency_seconds())
+    if roll < sim_settings.TIMEOUT_RATE + sim_settings.ERROR_RATE:
+        _stats["errors"] += 1
+        return Response(status_code=_rng.choice([500, 502, 503]), content=b"simulated upstream error")
+    return None
+
+
+def _json(body: bytes) -> Response:
+    _stats["bytes_sent"] += len(body)
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/v2/pullreport")
+async def vinaudit_pullreport(vin: str = Query(...), key: str = "", format: str = "json"):
+    error = await _simulate_network()
+    if error is not None:
+        return error
+    if _rng.random() < sim_settings.NOT_FOUND_RATE:
+        _stats["not_found"] += 1
+        return _json(json.dumps({"vin": vin, "success": False, "error": "no_records", "error_message": "No records found"}).encode())
+    return _json(build_vinaudit_report(vin.upper(), sim_settings.PAYLOAD_RECORDS, sim_settings.PAYLOAD_PADDING_BYTES))
+
+
+@app.get("/3.2/{api_key}/{control_sum}/{endpoint_id}/{vin_json}")
+async def vincario_decode(api_key: str, control_sum: str, endpoint_id: str, vin_json: str):
+    error = await _simulate_network()
+    if error is not None:
+        return error
+    vin = vin_json.removesuffix(".json").upper()
+    if _rng.random() < sim_settings.NOT_FOUND_RATE:
+        _stats["not_found"] += 1
+        return _json(json.dumps({"error": True, "message": "Invalid VIN"}).encode())
+    return _json(build_vincario_decode(vin, sim_settings.PAYLOAD_PADDING_BYTES))
+
+
+@app.get("/")
+async def root():
+    # Health pings from /dashboard/health land here
+    return {"simulator": True}
+
+
+@app.get("/_sim/stats")
+async def get_stats():
+    return _stats
+
+
+@app.get("/_sim/config")
+async def get_config():
+    return sim_settings.model_dump()
+
+
+@app.put("/_sim/config")
+async def update_config(update: SimulatorConfigUpdate):
+    for field, value in update.model_dump(exclude_none=True).items():
+        setattr(sim_settings, field, value)
+    return sim_settings.model_dump()
@@ -0,0 +1,49 @@
+"""
+Standalone study job worker, for running job processing outside the API processes.
+
+Usage: python -m app.worker [--workers 4]
+(set JOBS_WORKERS_EN_PROCESO=0 on the API to leave all jobs to these workers)
+"""
+import argparse
+import asyncio
+import signal
+from loguru import logger
+
+from app.db.migraciones import actualizar_esquema
+from app.db.session import engine, Base
+from app.services.http_clients import init_provider_clients, close_provider_clients
+from app.services.job_worker import JobWorkerPool
+from app.services.pdf_renderer import renderer_pool
+from app.services.trazabilidad_buffer import trazabilidad_buffer
+
+
+async def main(workers: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await actualizar_esquema(conn)
+    await init_provider_clients()
+    await renderer_pool.start()
+    trazabilidad_buffer.start()
+
+    pool = JobWorkerPool(workers)
+    pool.start()
+
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, detener.set)
+
+    await detener.wait()
+    logger.info("Stopping study job worker")
+    await pool.stop()
+    await renderer_pool.stop()
+    await trazabilidad_buffer.stop()
+    await close_provider_clients()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process asynchronous study jobs")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers))
@@ -0,0 +1,52 @@
+"""
+Provider body decoding benchmark: python -m benchmarks.bench_decoding [--sizes 10,100,1000,10000]
+Synthetic VinAudit reports of N history records (plus unused padding) decoded with
+stdlib json, orjson (when installed) and the incremental section decoder.
+Reports decode time and the tracemalloc peak of one decode (memory per request
+on top of the buffered body).
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from app.services.provider_client import ORJSON_AVAILABLE, VINAUDIT_CLAVES, decodificar_cuerpo
+from app.simulator.server import HISTORY_SECTIONS, build_vinaudit_report
+
+
+def _medir(fn, body: bytes, min_seconds: float = 0.5):
+    iteraciones, start = 0, time.perf_counter()
+    while True:
+        fn(body)
+        iteraciones += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iteraciones, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--padding", type=int, default=256 * 1024, help="bytes of unused data in each report")
+    args = parser.parse_args()
+
+    variantes = [("json.loads (full)", lambda b: json.loads(b))]
+    if ORJSON_AVAILABLE:
+        variantes.append(("orjson (full)", decodificar_cuerpo))
+    variantes.append(("incremental sections", lambda b: decodificar_cuerpo(b, VINAUDIT_CLAVES)))
+
+    print(f"{'records':>8} {'body KiB':>9} {'variant':<22} {'ms/decode':>10} {'peak KiB':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        body = build_vinaudit_report("1HGCM82633A004352", max(1, size // len(HISTORY_SECTIONS)), args.padding)
+        for nombre, fn in variantes:
+            segundos, peak = _medir(fn, body)
+            print(f"{size:>8} {len(body) / 1024:>9,.0f} {nombre:<22} {segundos * 1000:>10,.2f} {peak / 1024:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Normalizer throughput benchmark: python -m benchmarks.bench_normalizer [--sizes 10,100,1000,10000]
+Synthetic VinAudit reports (simulator builder) of N history records, normalized by
+the compiled extractors vs. the same output validated through the Pydantic models.
+Reports records/s and the tracemalloc peak of one normalization.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from app.schemas.vehiculo import DetalleEstudio, EspecificacionesVehiculo
+from app.services.normalizer import normalize_vinaudit_dicts, normalize_vinaudit_response
+from app.simulator.server import HISTORY_SECTIONS, build_vinaudit_report
+
+
+def _validado(raw: dict):
+    # Baseline (previous miss path): validated models, then dumped back to dicts
+    meta, detalle, es_sin_registros = normalize_vinaudit_dicts(raw)
+    return (
+        EspecificacionesVehiculo.model_validate(meta).model_dump(),
+        DetalleEstudio.model_validate(detalle).model_dump(),
+        es_sin_registros,
+    )
+
+
+def _modelos(raw: dict):
+    return normalize_vinaudit_response(raw)
+
+
+def _report(records: int) -> dict:
+    por_seccion = max(1, records // len(HISTORY_SECTIONS))
+    data = json.loads(build_vinaudit_report("1HGCM82633A004352", por_seccion, 0))
+    return {"status": "success", "data": data}
+
+
+def _contar(raw: dict) -> int:
+    return sum(len(raw["data"].get(s, [])) for s in HISTORY_SECTIONS)
+
+
+def _medir(fn, raw: dict, registros: int, min_seconds: float = 0.5):
+    iteraciones, start = 0, time.perf_counter()
+    while True:
+        fn(raw)
+        iteraciones += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    tracemalloc.start()
+    fn(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return registros * iteraciones / elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    args = parser.parse_args()
+
+    variantes = [
+        ("compiled dicts", normalize_vinaudit_dicts),
+        ("compiled + batched models", _modelos),
+        ("pydantic validated", _validado),
+    ]
+    print(f"{'records':>8} {'variant':<28} {'records/s':>14} {'peak KiB':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        raw = _report(size)
+        registros = _contar(raw)
+        for nombre, fn in variantes:
+            rate, peak = _medir(fn, raw, registros)
+            print(f"{registros:>8} {nombre:<28} {rate:>14,.0f} {peak / 1024:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
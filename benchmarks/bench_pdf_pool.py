@@ -0,0 +1,176 @@
+"""
+PDF renderer pool load test: python -m benchmarks.bench_pdf_pool [--renders 40] [--render-ms 200]
+While a burst of PDF renders is in flight, cache-hit requests
+(GET /api/v1/vehiculos/estudios for a stored study, in process against a
+scratch SQLite file) run back to back on the same event loop and their
+latency is recorded. Compares rendering inline on the loop (previous
+behaviour) with the renderer pool, plus a pool run where the first renders
+hang past their timeout: timed-out renders keep their worker until they
+finish, so the renders behind them wait for a slot (visible as queue depth)
+instead of queueing unseen in the executor and timing out in turn.
+--render-ms emulates the wkhtmltopdf subprocess, which is not needed to run
+the benchmark.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+_DB = os.path.join(tempfile.mkdtemp(prefix="bench_pdf_pool_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB}"
+os.environ["PROVIDER_SIMULATOR_URL"] = "http://simulator"
+
+import httpx  # noqa: E402
+
+from app.api.v1.endpoints.auth import create_access_token  # noqa: E402
+from app.core.limiter import limiter  # noqa: E402
+from app.db.session import Base, engine  # noqa: E402
+from app.services import http_clients  # noqa: E402
+from app.services.pdf_generator import generar_pdf_en_worker  # noqa: E402
+from app.services.pdf_renderer import PdfRendererPool  # noqa: E402
+from app.services.trazabilidad_buffer import trazabilidad_buffer  # noqa: E402
+from app.simulator.server import app as simulador, sim_settings  # noqa: E402
+from main import app  # noqa: E402
+
+VIN = "1HGCM82633A004352"
+CABECERAS = {"Authorization": f"Bearer {create_access_token({'sub': 'bench', 'scopes': []})}"}
+PARAMS = {"tipoIdentificacion": "VIN", "identificacion": VIN, "campos": "especificaciones"}
+
+
+def _render_lento(render_ms: int, *args):
+    # Blocking, like pdfkit waiting on wkhtmltopdf
+    time.sleep(render_ms / 1000)
+    return generar_pdf_en_worker(*args)
+
+
+def _argumentos(i: int):
+    return (f"BENCH{i:012d}", {"marca": "Honda", "modelo": "Accord"}, {}, True, f"bench-{time.time_ns()}-{i}")
+
+
+async def _cache_hits(cliente: httpx.AsyncClient, detener: asyncio.Event, latencias: List[float]) -> None:
+    """
+    Cache-hit requests for the stored study, one after another.
+    """
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        respuesta = await cliente.get("/api/v1/vehiculos/estudios", params=PARAMS, headers=CABECERAS)
+        assert respuesta.status_code == 200, respuesta.status_code
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def _escenario(
+    cliente: httpx.AsyncClient,
+    nombre: str,
+    renders: int,
+    render_ms: int,
+    pool: PdfRendererPool = None,
+    lentos: int = 0
+) -> None:
+    latencias: List[float] = []
+    rutas: List[str] = []
+    detener = asyncio.Event()
+    sonda = asyncio.create_task(_cache_hits(cliente, detener, latencias))
+    await asyncio.sleep(0.05)
+
+    async def inline(i: int) -> None:
+        # The old generate_racsa_pdf: declared async, blocking inside
+        rutas.append(_render_lento(render_ms, *_argumentos(i))[0])
+
+    async def en_pool(i: int) -> None:
+        # The first `lentos` renders take 10x as long
+        ms = render_ms * 10 if i < lentos else render_ms
+        rutas.append((await pool.render(_render_lento, ms, *_argumentos(i)))[0])
+
+    inicio = time.perf_counter()
+    max_rendering = 0
+    if renders:
+        tareas = asyncio.gather(*((en_pool if pool else inline)(i) for i in range(renders)), return_exceptions=True)
+        while not tareas.done():
+            if pool:
+                max_rendering = max(max_rendering, pool.stats()["rendering"])
+            await asyncio.sleep(0.01)
+        errores = sum(isinstance(r, BaseException) for r in tareas.result())
+    else:
+        errores = 0
+        await asyncio.sleep(1.0)
+    total = time.perf_counter() - inicio
+    detener.set()
+    await sonda
+    for ruta in rutas:
+        os.remove(ruta)
+
+    latencias.sort()
+    p = lambda q: latencias[int(q * (len(latencias) - 1))] * 1000
+    print(
+        f"{nombre:<28} {len(rutas):>7} {errores:>6} {total:>7.2f} {len(latencias):>5} "
+        f"{p(0.5):>8.2f} {p(0.99):>8.2f} {latencias[-1] * 1000:>8.2f} {max_rendering if pool else '-':>9}"
+    )
+
+
+async def _main(args) -> None:
+    limiter.enabled = False
+    sim_settings.LATENCY_DISTRIBUTION = "fixed"
+    sim_settings.LATENCY_MEDIAN_MS = 0
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    for proveedor in ("VinAudit", "Vincario"):
+        http_clients._clients[proveedor] = httpx.AsyncClient(
+            base_url="http://simulator", transport=httpx.ASGITransport(app=simulador)
+        )
+    trazabilidad_buffer.start()
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://globalvin") as cliente:
+            # First request stores the study; every later one is a cache hit
+            await cliente.get("/api/v1/vehiculos/estudios", params=PARAMS, headers=CABECERAS)
+
+            print(
+                f"{'scenario':<28} {'renders':>7} {'errors':>6} {'wall s':>7} {'hits':>5} "
+                f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rendering':>9}"
+            )
+            await _escenario(cliente, "idle", 0, args.render_ms)
+            await _escenario(cliente, "inline on the loop", args.renders, args.render_ms)
+
+            pool = PdfRendererPool(args.workers, args.renders, timeout=60.0)
+            await pool.start()
+            try:
+                await _escenario(cliente, f"pool ({args.workers} workers)", args.renders, args.render_ms, pool)
+            finally:
+                await pool.stop()
+            stats = pool.stats()
+            print(
+                f"pool: queue wait avg {stats['queue_wait_avg_seconds']}s p95 {stats['queue_wait_p95_seconds']}s, "
+                f"render avg {stats['render_avg_seconds']}s p95 {stats['render_p95_seconds']}s"
+            )
+
+            # One hung render per worker, timeout at twice the normal render time:
+            # only the hung ones may time out
+            pool = PdfRendererPool(args.workers, args.renders, timeout=args.render_ms * 2 / 1000)
+            await pool.start()
+            try:
+                await _escenario(
+                    cliente, "pool, hung renders", args.workers * 3, args.render_ms, pool, lentos=args.workers
+                )
+            finally:
+                await pool.stop()
+            print(f"timeouts: {pool.stats()['timeouts']} (expected {args.workers}), completed: {pool.stats()['completed']}")
+    finally:
+        await trazabilidad_buffer.stop()
+        await http_clients.close_provider_clients()
+        await engine.dispose()
+        os.remove(_DB)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renders", type=int, default=40)
+    parser.add_argument("--render-ms", type=int, default=200, help="emulated wkhtmltopdf time per render")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+WMI lookup microbenchmark: python -m benchmarks.bench_wmi [--n 200000]
+Compares the registry index against the previous if-chain detector.
+"""
+import argparse
+import random
+import time
+
+from app.services.wmi_detector import ORDEN_ISO_3780, wmi_index
+
+
+def _if_chain(vin: str) -> str:
+    # Detector before the registry, kept here as the baseline
+    if not vin or len(vin) < 3:
+        return "Unknown"
+    wmi = vin[0:3].upper()
+    if wmi[0] in ("1", "4", "5"):
+        return "United States"
+    if wmi[0] == "K" and wmi[0:2] in ("KA", "KB", "KC", "KD", "KE", "KF", "KG", "KH", "KJ", "KK", "KL", "KM", "KN", "KP", "KR"):
+        return "South Korea"
+    return "Other"
+
+
+def _vins(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    conocidos = list(wmi_index._fabricantes)
+    vins = []
+    for _ in range(n):
+        wmi = rnd.choice(conocidos) if rnd.random() < 0.8 else "".join(rnd.choices(ORDEN_ISO_3780, k=3))
+        vins.append(wmi + "".join(rnd.choices(ORDEN_ISO_3780, k=14)))
+    return vins
+
+
+def _medir(nombre: str, fn, vins: list) -> None:
+    start = time.perf_counter()
+    fn(vins)
+    elapsed = time.perf_counter() - start
+    print(f"{nombre:<28} {len(vins) / elapsed:>14,.0f} lookups/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    vins = _vins(args.n)
+    _medir("if-chain (baseline)", lambda vs: [_if_chain(v) for v in vs], vins)
+    _medir("index lookup (cold)", lambda vs: [wmi_index.lookup(v) for v in vs], vins)
+    _medir("index lookup (warm)", lambda vs: [wmi_index.lookup(v) for v in vs], vins)
+    _medir("index lookup_many", wmi_index.lookup_many, vins)
+    print("routing:", wmi_index.routing_counts(vins))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,14 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.db.session import engine, Base
+from app.db.migraciones import actualizar_esquema
+from app.db.particiones import asegurar_particiones
 from app.core.middleware import CorrelationIDMiddleware, setup_exception_handlers
+from app.services.http_clients import init_provider_clients, close_provider_clients
+from app.services.job_worker import job_pool
+from app.services.pdf_renderer import renderer_pool
+from app.services.plantillas import precompilar
+from app.services.trazabilidad_buffer import trazabilidad_buffer
 
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -17,8 +24,28 @@ async def lifespan(app: FastAPI):
     # Startup: Create tables in SQLite/Postgres (development only)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # Columns/indexes added to existing tables since the database was created
+        await actualizar_esquema(conn)
+        # Coming months' trazabilidad partitions (Postgres, once partitioned by app.jobs.particionar_trazabilidad)
+        await asegurar_particiones(conn, settings.TRAZABILIDAD_PARTICIONES_ADELANTE)
+    # Pooled HTTP clients for the external providers (keep-alive across lookups)
+    await init_provider_clients()
+    # Compile every template once (bytecode cache on disk is shared with the other workers)
+    precompilar()
+    # Warm PDF renderer processes (rendering never blocks the event loop)
+    await renderer_pool.start()
+    # Background writer for Trazabilidad audit rows
+    trazabilidad_buffer.start()
+    # In-process study job workers (0 = jobs are left to python -m app.worker)
+    if settings.JOBS_WORKERS_EN_PROCESO > 0:
+        job_pool.start()
     yield
     # Shutdown
+    await job_pool.stop()
+    await renderer_pool.stop()
+    # After everything that logs: pending audit rows are written before the engine closes
+    await trazabilidad_buffer.stop()
+    await close_provider_clients()
     await engine.dispose()
 
 app = FastAPI(
@@ -0,0 +1,70 @@
+"""
+Shared fixtures. The app reads its settings at import time, so the scratch
+database, PDF directory and simulator URL are set here, before any app import.
+"""
+import os
+import shutil
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="globalvin_tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["PDF_STORAGE_DIR"] = os.path.join(_TMP, "pdfs")
+os.environ["PROVIDER_SIMULATOR_URL"] = "http://simulator"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.api.v1.endpoints.auth import create_access_token  # noqa: E402
+from app.core.limiter import limiter  # noqa: E402
+from app.db.session import Base, engine  # noqa: E402
+from app.services import http_clients  # noqa: E402
+from app.services.pdf_renderer import renderer_pool  # noqa: E402
+from app.services.trazabilidad_buffer import trazabilidad_buffer  # noqa: E402
+from app.simulator.server import _stats, app as simulador, sim_settings  # noqa: E402
+from main import app  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _limpiar_tmp():
+    yield
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def cabeceras():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'tests', 'scopes': []})}"}
+
+
+@pytest.fixture
+async def cliente():
+    """
+    The API in process on fresh tables, providers routed to the simulator
+    (in process too). Simulator counters start at zero.
+    """
+    limiter.enabled = False
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    for proveedor in ("VinAudit", "Vincario"):
+        http_clients._clients[proveedor] = httpx.AsyncClient(
+            base_url="http://simulator", transport=httpx.ASGITransport(app=simulador)
+        )
+    for clave in _stats:
+        _stats[clave] = 0
+    trazabilidad_buffer.start()
+    await renderer_pool.start()
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://globalvin", timeout=120.0
+        ) as c:
+            yield c
+    finally:
+        await renderer_pool.stop()
+        await trazabilidad_buffer.stop()
+        await http_clients.close_provider_clients()
+        await engine.dispose()
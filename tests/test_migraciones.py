@@ -0,0 +1,57 @@
+"""
+Upgrade of a database created before the vehiculo_estudio columns added later.
+"""
+import json
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.migraciones import actualizar_esquema, ddl_pendiente
+from app.db.session import Base
+
+# vehiculo_estudio as the first release created it
+TABLA_ANTIGUA = """
+CREATE TABLE vehiculo_estudio (
+    id INTEGER PRIMARY KEY,
+    tipo_identificacion VARCHAR(20),
+    identificacion VARCHAR(50),
+    tiene_estudios BOOLEAN,
+    es_estudio_sin_registros BOOLEAN,
+    especificaciones_vehiculo JSON,
+    detalle_estudio JSON,
+    url_pdf VARCHAR(500),
+    pdf_hash VARCHAR(100),
+    pdf_size_bytes INTEGER,
+    ultima_fecha_estudio DATETIME,
+    ya_facturado_previamente BOOLEAN
+)
+"""
+
+
+@pytest.mark.anyio
+async def test_actualizar_esquema_agrega_columnas_y_rellena_bitmask():
+    motor = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'antigua.db')}")
+    try:
+        async with motor.begin() as conn:
+            await conn.execute(text(TABLA_ANTIGUA))
+            detalle = {"comprobacionDeProblemas": {"registroDeDanosPorInundacion": True}}
+            await conn.execute(
+                text("INSERT INTO vehiculo_estudio (id, identificacion, detalle_estudio) VALUES (1, 'VIN1', :d)"),
+                {"d": json.dumps(detalle)}
+            )
+
+        async with motor.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await actualizar_esquema(conn)
+
+        async with motor.connect() as conn:
+            columnas = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("vehiculo_estudio")})
+            assert {"problemas_bitmask", "version_normalizador", "respuesta_serializada", "version_plantilla_pdf"} <= columnas
+            assert await conn.scalar(text("SELECT problemas_bitmask FROM vehiculo_estudio WHERE id = 1")) == 1
+            # A second run has nothing left to do
+            assert await conn.run_sync(ddl_pendiente) == []
+    finally:
+        await motor.dispose()
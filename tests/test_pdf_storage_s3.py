@@ -0,0 +1,95 @@
+"""
+AlmacenS3 against moto's in-memory S3 (no network, no bucket): every backend
+path plus the GC job's listing and deletes.
+"""
+import os
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from app.db.session import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.jobs import gc_pdfs as gc  # noqa: E402
+from app.models.vehiculo import VehiculoEstudio  # noqa: E402
+from app.services.pdf_storage import AlmacenS3, CHUNK_BYTES  # noqa: E402
+
+BUCKET = "globalvin-test"
+CLAVE = "ab" * 32
+# More than one read chunk, so leer() has to stream
+CONTENIDO = b"%PDF-1.4\n" + os.urandom(CHUNK_BYTES * 2 + 10)
+
+
+@pytest.fixture
+def almacen(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield AlmacenS3(BUCKET, prefijo="pdfs/", region="us-east-1")
+
+
+def _render(tmp_path, nombre: str = "render.pdf") -> str:
+    ruta = tmp_path / nombre
+    ruta.write_bytes(CONTENIDO)
+    return str(ruta)
+
+
+@pytest.mark.anyio
+async def test_guardar_buscar_leer_eliminar(almacen, tmp_path):
+    assert await almacen.buscar(CLAVE) is None
+
+    url = await almacen.guardar(CLAVE, _render(tmp_path), "sha256:abc")
+    assert url == f"s3://{BUCKET}/pdfs/ab/ab/{CLAVE}.pdf"
+    assert almacen.es_propia(url)
+    assert not almacen.es_propia(f"s3://otro-bucket/pdfs/ab/ab/{CLAVE}.pdf")
+    # The rendered file is consumed
+    assert not (tmp_path / "render.pdf").exists()
+
+    assert await almacen.buscar(CLAVE) == (url, "sha256:abc", len(CONTENIDO))
+    assert await almacen.existe(url)
+    assert b"".join([chunk async for chunk in almacen.leer(url)]) == CONTENIDO
+
+    await almacen.eliminar(url)
+    assert not await almacen.existe(url)
+    assert await almacen.buscar(CLAVE) is None
+
+
+@pytest.mark.anyio
+async def test_listar_solo_pdfs_del_prefijo(almacen, tmp_path):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.put_object(Bucket=BUCKET, Key="otros/x.pdf", Body=b"x")
+    s3.put_object(Bucket=BUCKET, Key="pdfs/notas.txt", Body=b"x")
+    urls = {await almacen.guardar(f"{i:02d}" * 32, _render(tmp_path, f"{i}.pdf"), f"sha256:{i}") for i in range(3)}
+
+    objetos = [objeto async for objeto in almacen.listar()]
+    assert {o.url for o in objetos} == urls
+    assert all(o.tamaño_bytes == len(CONTENIDO) and o.modificado.tzinfo is not None for o in objetos)
+
+
+@pytest.mark.anyio
+async def test_gc_elimina_solo_los_no_referenciados(almacen, tmp_path, monkeypatch):
+    monkeypatch.setattr(gc, "almacen_pdf", almacen)
+    monkeypatch.setattr(gc, "DIRECTORIO_RENDER", str(tmp_path / "render_tmp"))
+    (tmp_path / "render_tmp").mkdir()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    referenciada = await almacen.guardar("01" * 32, _render(tmp_path, "a.pdf"), "sha256:a")
+    huerfana = await almacen.guardar("02" * 32, _render(tmp_path, "b.pdf"), "sha256:b")
+    async with AsyncSessionLocal() as db:
+        db.add(VehiculoEstudio(tipo_identificacion="VIN", identificacion="VIN1", url_pdf=referenciada))
+        await db.commit()
+
+    try:
+        # Negative grace period: everything counts as old enough
+        contadores = await gc.gc_pdfs(gracia_horas=-1)
+    finally:
+        await engine.dispose()
+
+    assert contadores["eliminados"] == 1 and contadores["conservados"] == 1
+    assert contadores["bytes_liberados"] == len(CONTENIDO)
+    assert await almacen.existe(referenciada)
+    assert not await almacen.existe(huerfana)
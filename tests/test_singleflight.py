@@ -0,0 +1,37 @@
+"""
+Concurrent first requests for one VIN: one provider call, one PDF render, and
+no request starved of a DB connection while it waits on the leader.
+"""
+import asyncio
+import collections
+
+import pytest
+
+from app.services.pdf_renderer import renderer_pool
+from app.simulator.server import _stats, sim_settings
+
+VIN = "1HGCM82633A004352"
+PETICIONES = 100
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("campos", [None, "especificaciones"], ids=["completo", "especificaciones"])
+async def test_peticiones_concurrentes_una_llamada_al_proveedor(cliente, cabeceras, campos, monkeypatch):
+    monkeypatch.setattr(sim_settings, "LATENCY_DISTRIBUTION", "fixed")
+    monkeypatch.setattr(sim_settings, "LATENCY_MEDIAN_MS", 300)
+    params = {"tipoIdentificacion": "VIN", "identificacion": VIN}
+    if campos:
+        params["campos"] = campos
+    renders_antes = renderer_pool.stats()["completed"]
+
+    respuestas = await asyncio.gather(*(
+        cliente.get("/api/v1/vehiculos/estudios", params=params, headers=cabeceras)
+        for _ in range(PETICIONES)
+    ))
+
+    assert collections.Counter(r.status_code for r in respuestas) == {200: PETICIONES}
+    assert _stats["requests"] == 1
+    if campos is None:
+        # The full answer carries the PDF: rendered once, the same artifact for everyone
+        assert renderer_pool.stats()["completed"] - renders_antes == 1
+        assert len({r.json()["pdf"]["hash"] for r in respuestas}) == 1